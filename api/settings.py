@@ -6,6 +6,7 @@ Uses .env files for all configuration.
 """
 import os
 from pathlib import Path
+from django.conf import global_settings
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -70,6 +71,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.MemberMiddleware',  # request.member (cacheado)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -199,6 +201,60 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Cache: respaldo de sesiones, rate limiting de login, estado de combate de las raids, etc.
+# Con REDIS_URL es compartida por todos los workers; sin ella es local a cada proceso.
+REDIS_URL = os.getenv('REDIS_URL', '').strip()
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'runraids-default',
+            'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000'))},
+        }
+    }
+
+# El estado de combate de las raids (efectos, ira) vive en la caché entre snapshots, así que
+# necesita una caché compartida. RAID_SHARED_CACHE=1 lo declara a mano (p.ej. un único worker).
+_raid_shared_cache = os.getenv('RAID_SHARED_CACHE', '').strip().lower()
+RAID_SHARED_CACHE = _raid_shared_cache in ('1', 'true', 'yes') if _raid_shared_cache else bool(REDIS_URL)
+
+# Sessions
+# SESSION_BACKEND: 'cached_db' (por defecto: lecturas desde caché, escritura en BD),
+#                  'signed_cookies' (sin BD: la sesión viaja firmada en la cookie), 'cache' o 'db'.
+_SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = _SESSION_ENGINES.get(os.getenv('SESSION_BACKEND', 'cached_db').strip().lower(),
+                                      _SESSION_ENGINES['cached_db'])
+SESSION_CACHE_ALIAS = 'default'
+
+# Password hashing: la lista por defecto de Django. PASSWORD_HASHER (solo si está definido)
+# antepone otro hasher, p.ej. uno más barato para pruebas de carga:
+#   PASSWORD_HASHER=django.contrib.auth.hashers.MD5PasswordHasher
+# Los hashes existentes se re-hashean al hacer login (ver core/services/auth_service.py).
+PASSWORD_HASHERS = list(global_settings.PASSWORD_HASHERS)
+_preferred_hasher = os.getenv('PASSWORD_HASHER', '').strip()
+if _preferred_hasher:
+    PASSWORD_HASHERS = [_preferred_hasher] + [h for h in PASSWORD_HASHERS if h != _preferred_hasher]
+
+# Caché en proceso del Member autenticado (core.middleware.MemberMiddleware)
+MEMBER_CACHE_TTL = int(os.getenv('MEMBER_CACHE_TTL', '60'))  # segundos
+MEMBER_CACHE_SIZE = int(os.getenv('MEMBER_CACHE_SIZE', '2048'))
+
+# Login rate limiting (intentos fallidos por teléfono, en caché)
+LOGIN_RATE_LIMIT_ATTEMPTS = int(os.getenv('LOGIN_RATE_LIMIT_ATTEMPTS', '5'))
+LOGIN_RATE_LIMIT_WINDOW = int(os.getenv('LOGIN_RATE_LIMIT_WINDOW', '300'))  # segundos
+
 # Internationalization
 LANGUAGE_CODE = 'es-es'
 TIME_ZONE = 'Europe/Madrid'
@@ -50,14 +50,20 @@ if core_available:
         path('api/pull/<int:banner_id>/multi/', lambda request, banner_id: api_pull_multi(request, banner_id), name="api_pull_multi"),
         path('api/raid/matchmaking/join/', api_raid_matchmaking_join, name="api_raid_matchmaking_join"),
         path('api/raid/state/<int:room_id>/', api_raid_state, name="api_raid_state"),
+        path('api/raid/spectate/<int:room_id>/', core_views.api_raid_spectate, name="api_raid_spectate"),
+        path('api/raid/history/<int:room_id>/', core_views.api_raid_history, name="api_raid_history"),
+        path('api/raid/replay/<int:room_id>/', core_views.api_raid_replay, name="api_raid_replay"),
         path('api/raid/solo/start/', core_views.api_raid_solo_start, name="api_raid_solo_start"),
+        path('api/raid/sweep/', core_views.api_raid_sweep, name="api_raid_sweep"),
         path('api/raid/decision/', api_raid_decision, name="api_raid_decision"),
+        path('api/raid/decision/batch/', core_views.api_raid_decision_batch, name="api_raid_decision_batch"),
         path('api/raid/start/<int:room_id>/', core_views.api_raid_start, name="api_raid_start"),
         path('api/hero/heal/', core_views.api_hero_heal, name="api_hero_heal"),
         path('api/hero/heal/all/', core_views.api_hero_heal_all, name="api_hero_heal_all"),
         path('api/team/', core_views.api_team_get, name="api_team_get"),
         path('api/team/create/', core_views.api_team_create, name="api_team_create"),
         path('api/team/update/', api_team_update, name="api_team_update"),
+        path('api/team/edit/', core_views.api_team_edit, name="api_team_edit"),
         path('api/team/add/', core_views.api_team_add, name="api_team_add"),
         path('api/team/remove/', core_views.api_team_remove, name="api_team_remove"),
         path('api/raids/available/', api_raids_available, name="api_raids_available"),
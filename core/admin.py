@@ -24,6 +24,9 @@ from core.models import (
     Raid,
     RaidWave,
     RaidEnemy,
+    RaidReward,
+    RaidClear,
+    RaidRewardLedger,
     RaidRoom,
     Team
 )
@@ -175,6 +178,25 @@ class RaidEnemyAdmin(admin.ModelAdmin):
     list_filter = ("wave__raid", "enemy")
 
 
+@admin.register(RaidReward)
+class RaidRewardAdmin(admin.ModelAdmin):
+    list_display = ("raid", "resource_type", "min_amount", "max_amount", "chance")
+    list_filter = ("raid",)
+
+
+@admin.register(RaidClear)
+class RaidClearAdmin(admin.ModelAdmin):
+    list_display = ("member", "raid", "clears", "sweeps", "first_cleared_at")
+    list_filter = ("raid",)
+    search_fields = ("member__name",)
+
+
+@admin.register(RaidRewardLedger)
+class RaidRewardLedgerAdmin(admin.ModelAdmin):
+    list_display = ("room", "member", "xp_per_hero", "created_at")
+    search_fields = ("member__name",)
+
+
 @admin.register(RaidRoom)
 class RaidRoomAdmin(admin.ModelAdmin):
     list_display = ("id", "name", "raid", "owner", "state", "max_players", "created_at")
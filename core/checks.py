@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches)
+def raid_cache_check(app_configs, **kwargs):
+    """El estado de combate de las raids vive en la caché entre snapshots: tiene que ser compartida."""
+    from core.services.battle_state import cache_is_shared
+
+    if cache_is_shared() or settings.DEBUG:
+        return []
+    return [Warning(
+        "El estado de combate de las raids está en una caché local a cada proceso.",
+        hint="Configura REDIS_URL, o RAID_SHARED_CACHE=1 si se sirve con un único worker.",
+        id="core.W001",
+    )]
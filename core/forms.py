@@ -1,7 +1,7 @@
 from django import forms
-from django.contrib.auth.hashers import check_password
 from django.core.exceptions import ValidationError
-from core.models import BuildingLevelCost, PlayerResource, PlayerBuilding, Banner, Member
+from core.models import BuildingLevelCost, PlayerResource, PlayerBuilding, Banner, Ability
+from core.services.auth_service import authenticate_member, LoginError
 
 
 class MemberLoginForm(forms.Form):
@@ -17,18 +17,37 @@ class MemberLoginForm(forms.Form):
         phone = cleaned_data.get("phone")
         password = cleaned_data.get("password_member")
 
+        if phone is None or not password:
+            return cleaned_data
+
         try:
-            member = Member.objects.get(phone=phone)
-            if not check_password(password, member.password_member):
-                raise forms.ValidationError("Contraseña incorrecta")
-        except Member.DoesNotExist:
-            raise forms.ValidationError("No se encuentra el número")
+            cleaned_data['member'] = authenticate_member(phone, password)
+        except LoginError as e:
+            raise forms.ValidationError(str(e))
 
         return cleaned_data
 
 
 class CombatActionForm(forms.Form):
-    pass
+    ability_id = forms.IntegerField(widget=forms.HiddenInput())
+
+    def __init__(self, *args, **kwargs):
+        self.hero = kwargs.pop('hero', None)
+        super().__init__(*args, **kwargs)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        ability_id = cleaned_data.get("ability_id")
+        if ability_id is None or not self.hero:
+            return cleaned_data
+
+        # Solo habilidades asignadas al héroe base
+        ability = Ability.objects.filter(pk=ability_id, heroes=self.hero.hero_id).first()
+        if not ability:
+            raise forms.ValidationError("Habilidad no disponible para este héroe.")
+
+        cleaned_data['ability'] = ability
+        return cleaned_data
 
 
 # forms.py
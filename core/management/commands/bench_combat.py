@@ -0,0 +1,120 @@
+"""
+Benchmark del núcleo de combate (combat_core.resolve_action): golpe a un objetivo, habilidad de
+área, curación de equipo, buffs y un combate completo en memoria. Sin base de datos.
+
+core.tests.CombatBenchTests ejecuta estos escenarios en la suite; los tiempos dependen de la
+máquina, así que no se comprueban ahí y este comando es donde se miden.
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import DamageProfile, SkillEffectType, SkillSlot, SkillTarget
+from core.services.battle_state import STAT_ATK_PHY, STAT_DEF_PHY, BattleState, enemy_actor, hero_actor
+from core.services.combat_core import (
+    NUMPY_AVAILABLE, Action, CombatState, Fighter, attack_spec, resolve_action,
+)
+
+
+def _skill(effect, target, amount=0.0, percent=0.0, stats=()):
+    return {"id": 1, "name": effect, "slot": SkillSlot.BASIC, "effect": effect, "target": target,
+            "profile": DamageProfile.MIXED, "amount": amount, "percent": percent,
+            "power_stat": STAT_ATK_PHY, "stats": list(stats)}
+
+
+def _team(n_heroes, n_enemies, with_mods):
+    heroes = [Fighter(hero_actor(i), 5000, 5000, 120, 90, 0.15, 1.5) for i in range(1, n_heroes + 1)]
+    enemies = [Fighter(enemy_actor(i), 10 ** 9, 10 ** 9, 150, 150) for i in range(1, n_enemies + 1)]
+    mods = BattleState(0) if with_mods else None
+    if mods is not None:
+        for f in enemies:
+            mods.add_effect(f.actor, STAT_DEF_PHY, -0.2, turns=10 ** 6)
+    return CombatState(heroes + enemies, mods=mods, rng=random.Random(1)), heroes, enemies
+
+
+def _per_call(fn, n, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            fn()
+        best = min(best, time.perf_counter() - t0)
+    return best / n
+
+
+def _fight(rng, n_heroes, n_enemies):
+    """Raid sintética hasta que cae un bando: cada héroe golpea, cada enemigo ataca. Devuelve acciones."""
+    heroes = [Fighter(hero_actor(i), 3000, 3000, 120, 90, 0.15, 1.5) for i in range(1, n_heroes + 1)]
+    enemies = [Fighter(enemy_actor(i), 4000, 4000, 150, 150) for i in range(1, n_enemies + 1)]
+    state = CombatState(heroes + enemies, mods=BattleState(0), rng=rng)
+    basic = _skill(SkillEffectType.DAMAGE, SkillTarget.ENEMY_SINGLE, amount=450)
+    strike = attack_spec("Golpe", 180, variance=0.2)
+    actions = 0
+    while True:
+        for hero in heroes:
+            alive = [e.actor for e in enemies if e.hp > 0]
+            if not alive or hero.hp <= 0:
+                continue
+            resolve_action(state, Action(hero.actor, basic, alive[:1]))
+            actions += 1
+        for enemy in enemies:
+            alive = [h.actor for h in heroes if h.hp > 0]
+            if not alive or enemy.hp <= 0:
+                continue
+            resolve_action(state, Action(enemy.actor, strike, [rng.choice(alive)]))
+            actions += 1
+        if all(e.hp <= 0 for e in enemies) or all(h.hp <= 0 for h in heroes):
+            return actions
+
+
+class Command(BaseCommand):
+    help = 'Benchmark combat_core.resolve_action (single target, AoE, heal, buffs, full fight)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--targets', type=int, nargs='+', default=[4, 16, 64])
+        parser.add_argument('--iterations', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        n, repeat = options['iterations'], options['repeat']
+        self.stdout.write(f"numpy: {'sí' if NUMPY_AVAILABLE else 'no'}")
+
+        single = _skill(SkillEffectType.DAMAGE, SkillTarget.ENEMY_SINGLE, amount=400)
+        for with_mods in (False, True):
+            state, heroes, enemies = _team(1, 1, with_mods)
+            action = Action(heroes[0].actor, single, [enemies[0].actor])
+            t = _per_call(lambda: resolve_action(state, action), n, repeat)
+            name = "Golpe a un objetivo" + (" (con buffs)" if with_mods else "")
+            self.stdout.write(f"{name:32} {t * 1e6:8.2f} µs")
+
+        strike = attack_spec("Golpe", 180, variance=0.2)
+        state, heroes, enemies = _team(1, 1, True)
+        action = Action(enemies[0].actor, strike, [heroes[0].actor])
+        t = _per_call(lambda: resolve_action(state, action), n, repeat)
+        self.stdout.write(f"{'Ataque enemigo (variación)':32} {t * 1e6:8.2f} µs")
+
+        aoe = _skill(SkillEffectType.DAMAGE, SkillTarget.ENEMY_TEAM, amount=300)
+        heal = _skill(SkillEffectType.HEAL, SkillTarget.ALLY_TEAM, amount=200)
+        buff = _skill(SkillEffectType.BUFF, SkillTarget.ALLY_TEAM, percent=0.1, stats=[STAT_ATK_PHY])
+        for targets in options['targets']:
+            state, heroes, enemies = _team(targets, targets, True)
+            caster = heroes[0].actor
+            rows = [
+                ("Área", Action(caster, aoe, [e.actor for e in enemies])),
+                ("Curación de equipo", Action(caster, heal, [h.actor for h in heroes])),
+                ("Buff de equipo", Action(caster, buff, [h.actor for h in heroes], 1)),
+            ]
+            for name, action in rows:
+                def run(action=action):
+                    resolve_action(state, action)
+                    state.mods.advance()  # caduca los buffs del bucle anterior
+                t = _per_call(run, max(1, n // targets), repeat)
+                self.stdout.write(f"{name:20} x{targets:<4} {t * 1e6:8.2f} µs  ({t / targets * 1e6:.2f} µs/objetivo)")
+
+        rng = random.Random(7)
+        t0 = time.perf_counter()
+        actions = sum(_fight(rng, 16, 12) for _ in range(repeat))
+        elapsed = time.perf_counter() - t0
+        self.stdout.write(f"Combate completo 16 vs 12: {elapsed / repeat * 1000:.2f} ms por combate, "
+                          f"{elapsed / actions * 1e6:.2f} µs por acción")
@@ -0,0 +1,121 @@
+"""
+Benchmark del formato de replay: tamaño, codificación, decodificación y fast-forward completo.
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.replay import (
+    ACTION_CODES, CODEC_JSON, CODEC_MSGPACK, MSGPACK_AVAILABLE, REPLAY_VERSION, ReplayEngine,
+    decode_replay, encode_replay,
+)
+
+
+def synthetic_replay(players=4, heroes_per_player=4, waves=3, enemies_per_wave=6, seed=1) -> dict:
+    """Raid completa sintética: oleadas con enemigos, ataques de héroes y enemigos, final."""
+    rng = random.Random(seed)
+    ts = 1_700_000_000_000
+    seq = 0
+    actions = []
+
+    def add(action, payload, actor=""):
+        nonlocal seq, ts
+        seq += 1
+        ts += rng.randint(200, 1500)
+        actions.append([seq, ts, ACTION_CODES.get(action, action), actor, payload, None, None])
+
+    participants = [[p, 100 + p, f"player{p}", 1000 + p * 10, "Hero", p % 4 + 1] for p in range(players)]
+    heroes = [[1000 + p * 10 + h, 100 + p, f"Hero{h}", 600, 600, 10 + h]
+              for p in range(players) for h in range(heroes_per_player)]
+    hero_hp = {h[0]: h[3] for h in heroes}
+
+    for p in participants:
+        add("join", {"member_id": p[1]})
+    next_enemy = 1
+    for w in range(1, waves + 1):
+        enemies = [[next_enemy + i, 7, f"Enemy{i}", 900, 900, 9] for i in range(enemies_per_wave)]
+        next_enemy += enemies_per_wave
+        add("wave_start", {"wave_number": w, "wave_name": f"W{w}", "enemies": enemies})
+        if w == 1:
+            add("start", {"raid_id": 1, "wave_index": 0, "heroes": heroes})
+        enemy_hp = {e[0]: e[3] for e in enemies}
+        while any(hp > 0 for hp in enemy_hp.values()):
+            for h in heroes:
+                alive = [eid for eid, hp in enemy_hp.items() if hp > 0]
+                if not alive:
+                    break
+                target = rng.choice(alive)
+                dmg = rng.randint(20, 60)
+                enemy_hp[target] = max(0, enemy_hp[target] - dmg)
+                add("hero_attack", {"enemy_id": target, "dmg": dmg, "hero_id": h[0],
+                                    "enemy_remaining_hp": enemy_hp[target]}, actor=h[2])
+            for eid, hp in enemy_hp.items():
+                if hp <= 0:
+                    continue
+                target = rng.choice(heroes)[0]
+                dmg = rng.randint(1, 8)
+                hero_hp[target] = max(1, hero_hp[target] - dmg)
+                add("enemy_attack", {"target_hero_id": target, "dmg": dmg,
+                                     "remaining_hp": hero_hp[target]}, actor="Enemy")
+    add("finish", {"winner": "heroes"})
+
+    return {"v": REPLAY_VERSION, "room": {"id": 0, "name": "bench", "raid_id": 1, "created_at": None},
+            "seed": seed, "participants": participants, "actions": actions}
+
+
+def _timeit(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+class Command(BaseCommand):
+    help = 'Benchmark replay encode/decode size and full-raid fast-forward speed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--room', type=int, help='Usar el replay de una sala real en vez del sintético')
+        parser.add_argument('--waves', type=int, default=3)
+        parser.add_argument('--players', type=int, default=4)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if options['room']:
+            from core.models import RaidRoom
+            from core.services.raid_archive import load_replay
+            room = RaidRoom.objects.filter(pk=options['room']).first()
+            if not room:
+                raise CommandError("Sala no encontrada")
+            body = load_replay(room)
+        else:
+            body = synthetic_replay(players=options['players'], waves=options['waves'])
+
+        n = len(body["actions"])
+        repeat = options['repeat']
+        self.stdout.write(f"Acciones: {n}")
+
+        codecs = [("json", CODEC_JSON)] + ([("msgpack", CODEC_MSGPACK)] if MSGPACK_AVAILABLE else [])
+        for name, codec in codecs:
+            blob = encode_replay(body, codec=codec)
+            t_enc = _timeit(lambda: encode_replay(body, codec=codec), repeat)
+            t_dec = _timeit(lambda: decode_replay(blob), repeat)
+            self.stdout.write(f"  {name:8} {len(blob):>8} bytes  encode {t_enc * 1000:7.2f} ms  "
+                              f"decode {t_dec * 1000:7.2f} ms")
+        if not MSGPACK_AVAILABLE:
+            self.stdout.write("  (msgpack no instalado: solo JSON)")
+
+        engine = ReplayEngine(body)
+        t_full = _timeit(engine.final_state, repeat)
+        self.stdout.write(f"Fast-forward completo: {t_full * 1000:.2f} ms "
+                          f"({n / t_full:,.0f} acciones/s)")
+
+        # Saltos aleatorios (spectator / post-mortem) apoyados en keyframes
+        rng = random.Random(0)
+        seqs = [rng.randint(1, body["actions"][-1][0]) for _ in range(200)] if n else []
+        engine.state_at_index(n)  # genera keyframes
+        t_seek = _timeit(lambda: [engine.state_at(s) for s in seqs], repeat)
+        if seqs:
+            self.stdout.write(f"Salto a seq aleatorio: {t_seek / len(seqs) * 1e6:.1f} µs de media")
@@ -0,0 +1,25 @@
+"""
+Compacta salas de raid terminadas: historial a un blob comprimido y borrado de filas por sala.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.services.raid_archive import ARCHIVE_AFTER, compact_finished_rooms
+
+
+class Command(BaseCommand):
+    help = 'Archive finished raid rooms into compressed replay blobs and delete their per-row data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=500, help='Máximo de salas por ejecución')
+        parser.add_argument('--older-than-minutes', type=float,
+                            default=ARCHIVE_AFTER.total_seconds() / 60,
+                            help='Solo salas terminadas hace más de estos minutos')
+
+    def handle(self, *args, **options):
+        archived = compact_finished_rooms(
+            limit=options['limit'],
+            older_than=timedelta(minutes=options['older_than_minutes']),
+        )
+        self.stdout.write(self.style.SUCCESS(f'✅ {archived} salas archivadas'))
@@ -0,0 +1,156 @@
+"""
+Comprueba con EXPLAIN que las consultas calientes de raids usan índices.
+
+Siembra un dataset sintético (por defecto 100k salas) dentro de una transacción que se
+deshace al terminar, ejecuta EXPLAIN sobre cada consulta y falla si alguna hace un
+recorrido secuencial de la tabla. core.tests.RaidQueryPlanTests hace la misma comprobación
+con un dataset pequeño; el comando sirve para repetirla a escala sobre la base de datos real.
+"""
+import re
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils.timezone import now
+
+from core.models import (
+    Enemy, Member, Raid, RaidDecisionLog, RaidEnemyInstance, RaidParticipant, RaidRoom,
+    RaidTurn, Team,
+)
+from core.services.matchmaking import open_room_band_filter
+from core.services.raid_service import LOBBY_STATES
+
+BATCH = 5000
+N_RAIDS = 20
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _uses_index(plan: str, vendor: str) -> bool:
+    if vendor == "postgresql":
+        return bool(re.search(r"Index (Only )?Scan|Bitmap Index Scan", plan)) and "Seq Scan" not in plan
+    if vendor == "sqlite":
+        # "SEARCH t USING INDEX ..." / "USING COVERING INDEX" / "USING INTEGER PRIMARY KEY"
+        return "USING " in plan and not re.search(r"\bSCAN \w+(?! USING)", plan.replace("SCAN CONSTANT ROW", ""))
+    return "index" in plan.lower()
+
+
+class Command(BaseCommand):
+    help = 'Seed a synthetic raid dataset (rolled back) and assert hot raid queries use index scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=100_000)
+        parser.add_argument('--verbose-plans', action='store_true', help='Mostrar el plan completo de cada consulta')
+
+    def handle(self, *args, **options):
+        failures = []
+        try:
+            with transaction.atomic():
+                ctx = self._seed(options['rooms'])
+                failures = self._check(ctx, options['verbose_plans'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        if failures:
+            raise CommandError(f"Consultas sin índice: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS('✅ Todas las consultas usan índices'))
+
+    # ---------- dataset ----------
+    def _seed(self, n_rooms):
+        t0 = time.monotonic()
+        ts = now()
+        raids = Raid.objects.bulk_create([Raid(name=f"explain-raid{r}") for r in range(N_RAIDS)])
+        enemy = Enemy.objects.create(name="explain-enemy", base_hp=100, attack=10, defense=5, speed=10)
+
+        n_members = max(1, n_rooms // 20)
+        Member.objects.bulk_create(
+            [Member(name=f"explain{i}", firstname="x", password_member="!", email="x@x.com", phone=900_000_000 + i)
+             for i in range(n_members)],
+            batch_size=BATCH,
+        )
+        member_ids = list(Member.objects.filter(name__startswith="explain").values_list("id", flat=True))
+        Team.objects.bulk_create([Team(owner_id=mid) for mid in member_ids], batch_size=BATCH)
+
+        # ~90% terminadas, ~5% en curso, ~5% en lobby
+        def state_of(i):
+            r = i % 20
+            return "in_progress" if r == 0 else ("waiting" if r == 1 else "finished")
+
+        RaidRoom.objects.bulk_create([
+            RaidRoom(
+                raid=raids[(i // 7) % N_RAIDS], state=state_of(i), closed=state_of(i) == "finished",
+                open_seats=3 if state_of(i) == "waiting" else 0, power_band=i % 30,
+                created_at=ts - timedelta(seconds=n_rooms - i),
+                expires_at=ts + timedelta(minutes=30) if state_of(i) == "in_progress" else None,
+            )
+            for i in range(n_rooms)
+        ], batch_size=BATCH)
+        room_ids = list(RaidRoom.objects.filter(raid__in=raids).order_by("id").values_list("id", flat=True))
+
+        # Hijos por sala: 1 participante, 2 enemigos, 4 turnos (resueltos salvo en salas en curso), 2 logs
+        for start in range(0, len(room_ids), BATCH):
+            chunk = room_ids[start:start + BATCH]
+            RaidParticipant.objects.bulk_create([
+                RaidParticipant(room_id=rid, member_id=member_ids[(start + k) % n_members],
+                                is_alive=(start + k) % 20 == 0)
+                for k, rid in enumerate(chunk)
+            ])
+            RaidEnemyInstance.objects.bulk_create([
+                RaidEnemyInstance(room_id=rid, enemy=enemy, current_hp=100, max_hp=100,
+                                  is_alive=(start + k) % 20 == 0)
+                for k, rid in enumerate(chunk) for _ in range(2)
+            ])
+            RaidTurn.objects.bulk_create([
+                RaidTurn(room_id=rid, index=t, actor_type="hero", resolved=(start + k) % 20 != 0 or t < 2)
+                for k, rid in enumerate(chunk) for t in range(4)
+            ])
+            RaidDecisionLog.objects.bulk_create([
+                RaidDecisionLog(room_id=rid, action_type="join", payload={}, seq=seq)
+                for rid in chunk for seq in (1, 2)
+            ])
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.stdout.write(f"Dataset: {n_rooms} salas sembradas en {time.monotonic() - t0:.1f}s")
+
+        active = room_ids[len(room_ids) // 2 // 20 * 20]  # una sala en curso a mitad de tabla
+        return {"raid": raids[0], "room_id": active, "member_id": member_ids[len(member_ids) // 2]}
+
+    # ---------- consultas ----------
+    def _queries(self, ctx):
+        room_id, raid = ctx["room_id"], ctx["raid"]
+        at = now()
+        return {
+            "turno actual": RaidTurn.objects.filter(room_id=room_id, resolved=False).order_by("index")[:1],
+            "enemigos vivos": RaidEnemyInstance.objects.filter(room_id=room_id, is_alive=True),
+            "participantes vivos": RaidParticipant.objects.filter(room_id=room_id, is_alive=True),
+            "últimos logs": RaidDecisionLog.objects.filter(room_id=room_id).order_by("-seq")[:30],
+            "logs desde seq": RaidDecisionLog.objects.filter(room_id=room_id, seq__gt=1).order_by("seq")[:100],
+            "sala abierta (matchmaking)": (RaidRoom.objects
+                                           .filter(raid=raid, state__in=LOBBY_STATES, open_seats__gt=0)
+                                           .filter(open_room_band_filter(7, at))
+                                           .order_by("created_at")[:1]),
+            "salas disponibles": (RaidRoom.objects
+                                  .filter(state__in=LOBBY_STATES, closed=False)
+                                  .order_by("created_at")),
+            "salas activas": RaidRoom.objects.filter(state="in_progress", closed=False),
+            "salas caducadas": RaidRoom.objects.filter(state="in_progress", closed=False, expires_at__lte=at),
+            "equipo activo": Team.objects.filter(owner_id=ctx["member_id"], is_active=True)[:1],
+        }
+
+    def _check(self, ctx, verbose):
+        vendor = connection.vendor
+        failures = []
+        for label, qs in self._queries(ctx).items():
+            plan = qs.explain()
+            ok = _uses_index(plan, vendor)
+            mark = self.style.SUCCESS("index") if ok else self.style.ERROR("SEQ  ")
+            summary = plan if verbose else " | ".join(line.strip() for line in plan.splitlines()[:2])
+            self.stdout.write(f"[{mark}] {label}: {summary}")
+            if not ok:
+                failures.append(label)
+        return failures
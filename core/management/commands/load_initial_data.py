@@ -331,13 +331,14 @@ class Command(BaseCommand):
             else:
                 # Create new member
                 try:
-                    member = Member.objects.create(
+                    member = Member(
                         name=user_data['name'],
                         firstname=user_data['firstname'],
                         email=user_data['email'],
                         phone=user_data['phone'],
-                        password_member=user_data['password']
                     )
+                    member.set_password(user_data['password'])
+                    member.save()
                     self.stdout.write(f'Created new member: {member.name}')
 
                     # Create default buildings for new member
@@ -0,0 +1,93 @@
+"""
+Simula el matchmaking por bandas de poder (sin base de datos) y reporta tiempos de espera.
+"""
+import heapq
+import random
+
+from django.core.management.base import BaseCommand
+
+from core.services.matchmaking import PowerBandQueue, power_band
+
+
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+class Command(BaseCommand):
+    help = 'Simulate power-band matchmaking with Poisson arrivals and report wait percentiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rates', default='0.05,0.2,1,5',
+                            help='Llegadas por segundo a simular (separadas por comas)')
+        parser.add_argument('--players', type=int, default=5000, help='Jugadores por escenario')
+        parser.add_argument('--room-size', type=int, default=4)
+        parser.add_argument('--max-wait', type=float, default=240.0,
+                            help='Segundos hasta el auto-start de una sala incompleta')
+        parser.add_argument('--power-mean', type=float, default=1500.0)
+        parser.add_argument('--power-stddev', type=float, default=400.0)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rates = [float(r) for r in options['rates'].split(',') if r.strip()]
+        self.stdout.write(f"{'rate/s':>8} {'rooms':>7} {'full%':>6} {'p50':>7} {'p90':>7} {'p99':>7} {'spread':>7}")
+        for rate in rates:
+            row = self._simulate(rate, options)
+            self.stdout.write(
+                f"{rate:>8.2f} {row['rooms']:>7} {row['full_pct']:>5.1f}% "
+                f"{row['p50']:>6.1f}s {row['p90']:>6.1f}s {row['p99']:>6.1f}s {row['spread']:>7.2f}"
+            )
+
+    def _simulate(self, rate, options):
+        rng = random.Random(options['seed'])
+        queue = PowerBandQueue(options['room_size'])
+        max_wait = options['max_wait']
+
+        # Llegadas de Poisson: tiempos entre llegadas exponenciales
+        t = 0.0
+        arrivals = []
+        for _ in range(options['players']):
+            t += rng.expovariate(rate)
+            power = max(0.0, rng.gauss(options['power_mean'], options['power_stddev']))
+            arrivals.append((t, power_band(power)))
+
+        waits, spreads, full_rooms, rooms = [], [], 0, 0
+        bands_of = {}  # id(room) -> bandas de sus jugadores
+
+        def close(room, at, full):
+            nonlocal full_rooms, rooms
+            rooms += 1
+            full_rooms += int(full)
+            waits.extend(at - a for a in room.arrivals)
+            bands = bands_of.pop(id(room), [room.band])
+            spreads.append(max(bands) - min(bands))
+
+        # Cola de eventos de timeout (auto-start) para procesarlos en orden junto a las llegadas
+        timeouts = []
+        for at, band in arrivals:
+            while timeouts and timeouts[0][0] <= at:
+                deadline = heapq.heappop(timeouts)[0]
+                for room in queue.expire(deadline, max_wait):
+                    close(room, deadline, full=False)
+            room, full = queue.join(band, at)
+            bands_of.setdefault(id(room), []).append(band)
+            if len(room.arrivals) == 1:
+                heapq.heappush(timeouts, (room.created_at + max_wait, id(room)))
+            if full:
+                close(room, at, full=True)
+
+        end = arrivals[-1][0] + max_wait if arrivals else 0.0
+        for room in queue.expire(end, max_wait):
+            close(room, end, full=False)
+
+        return {
+            'rooms': rooms,
+            'full_pct': 100.0 * full_rooms / rooms if rooms else 0.0,
+            'p50': _percentile(waits, 50),
+            'p90': _percentile(waits, 90),
+            'p99': _percentile(waits, 99),
+            'spread': sum(spreads) / len(spreads) if spreads else 0.0,
+        }
@@ -0,0 +1,50 @@
+"""
+Simula barridos de raid con auto-batallas repartidas en un pool de procesos y reporta la tasa de
+victorias. Con --grant concede además las victorias simuladas (como api/raid/sweep/).
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Member, Raid
+from core.services.raid_rewards import MAX_SWEEP, simulate_clears, sweep_pool, sweep_raid, sweep_workers
+from core.services.raid_service import RaidError
+
+
+class Command(BaseCommand):
+    help = 'Simulate raid sweeps for a member in a process pool and report the win rate'
+
+    def add_arguments(self, parser):
+        parser.add_argument('member_id', type=int)
+        parser.add_argument('raid_id', type=int)
+        parser.add_argument('--times', type=int, default=MAX_SWEEP, help='Auto-batallas a simular')
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Procesos del pool (por defecto RAID_SWEEP_WORKERS)')
+        parser.add_argument('--grant', action='store_true',
+                            help=f'Conceder las victorias simuladas (máximo {MAX_SWEEP})')
+
+    def handle(self, *args, **options):
+        try:
+            member = Member.objects.get(pk=options['member_id'])
+            raid = Raid.objects.get(pk=options['raid_id'])
+        except (Member.DoesNotExist, Raid.DoesNotExist) as e:
+            raise CommandError(str(e))
+        times = options['times']
+        workers = options['workers'] or sweep_workers()
+
+        started = time.perf_counter()
+        with sweep_pool(workers) as pool:
+            if options['grant']:
+                try:
+                    result = sweep_raid(member, raid, times, simulated=True, executor=pool)
+                except RaidError as e:
+                    raise CommandError(str(e))
+                wins = result['wins']
+            else:
+                wins = simulate_clears(member, raid, times, executor=pool)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f'{wins}/{times} victorias ({100 * wins / max(1, times):.1f}%) '
+                          f'en {elapsed:.2f}s con {workers} procesos')
+        if options['grant']:
+            self.stdout.write(self.style.SUCCESS(f'✅ {wins} victorias concedidas'))
@@ -0,0 +1,28 @@
+"""
+Barrido periódico de salas de raid: auto-ready, auto-start, salas abandonadas y caducadas.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.services.raid_service import sweep_rooms
+
+
+class Command(BaseCommand):
+    help = 'Advance or close raid rooms in bulk (waiting→ready, auto-start, abandoned, expired)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Repetir el barrido indefinidamente')
+        parser.add_argument('--interval', type=float, default=5.0, help='Segundos entre barridos con --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = sweep_rooms()
+            if any(stats.values()) or not options['loop']:
+                self.stdout.write(
+                    f"ready={stats['ready']} started={stats['started']} "
+                    f"abandoned={stats['abandoned']} expired={stats['expired']}"
+                )
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
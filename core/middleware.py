@@ -0,0 +1,95 @@
+# core/middleware.py
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from core.models import Member
+
+# Campos que se cachean del Member autenticado. El resto (password_member...) queda diferido:
+# si alguna vista lo necesita, Django lo carga bajo demanda.
+MEMBER_CACHE_FIELDS = ("id", "name", "firstname", "email", "phone", "created_at", "updated_at")
+
+
+class _MemberLRU:
+    """LRU en proceso con TTL: member_id -> (expira_en, tupla de valores)."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[int, tuple[float, tuple]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, member_id: int):
+        with self._lock:
+            hit = self._data.get(member_id)
+            if hit is None:
+                return None
+            expires_at, values = hit
+            if expires_at < time.monotonic():
+                del self._data[member_id]
+                return None
+            self._data.move_to_end(member_id)
+            return values
+
+    def set(self, member_id: int, values: tuple) -> None:
+        with self._lock:
+            self._data[member_id] = (time.monotonic() + self.ttl, values)
+            self._data.move_to_end(member_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, member_id: int) -> None:
+        with self._lock:
+            self._data.pop(member_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+member_cache = _MemberLRU(
+    maxsize=int(getattr(settings, "MEMBER_CACHE_SIZE", 2048)),
+    ttl=float(getattr(settings, "MEMBER_CACHE_TTL", 60)),
+)
+
+
+def get_member(request):
+    """
+    Member autenticado de la petición (o None). Se resuelve como mucho una vez por petición
+    y, entre peticiones, desde la LRU en proceso: un hit no hace ninguna consulta.
+    Cada petición recibe su propia instancia (no se comparten objetos entre hilos).
+    """
+    if hasattr(request, "_cached_member"):
+        return request._cached_member
+
+    member = None
+    member_id = request.session.get("member_id")
+    if member_id:
+        values = member_cache.get(member_id)
+        if values is None:
+            row = Member.objects.filter(pk=member_id).values_list(*MEMBER_CACHE_FIELDS).first()
+            if row is None:
+                request.session.flush()
+            else:
+                values = tuple(row)
+                member_cache.set(member_id, values)
+        if values is not None:
+            member = Member.from_db("default", MEMBER_CACHE_FIELDS, values)
+
+    request._cached_member = member
+    return member
+
+
+class MemberMiddleware:
+    """Expone request.member (perezoso): evita repetir Member.objects.get(pk=session['member_id'])."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.member = SimpleLazyObject(lambda: get_member(request))
+        return self.get_response(request)
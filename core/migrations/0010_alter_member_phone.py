@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_raidparticipant_player_color'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='member',
+            name='phone',
+            field=models.IntegerField(db_index=True),
+        ),
+    ]
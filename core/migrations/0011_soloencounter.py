@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_alter_member_phone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SoloEncounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hero_hp', models.IntegerField(default=0)),
+                ('enemy_hp', models.IntegerField(default=0)),
+                ('turn', models.CharField(choices=[('hero', 'Hero'), ('enemy', 'Enemy')], default='hero', max_length=10)),
+                ('log', models.JSONField(blank=True, default=list)),
+                ('log_head', models.PositiveSmallIntegerField(default=0, help_text='Posición de la próxima escritura en el log')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('enemy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.enemy')),
+                ('member', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='solo_encounter', to='core.member')),
+                ('player_hero', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.playerhero')),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:12
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Estados de lobby (core.services.raid_service.LOBBY_STATES), copiados: una migración no
+# debe importar código de la app que puede cambiar.
+LOBBY_STATES = ('waiting', 'ready')
+
+
+def backfill_open_seats(apps, schema_editor):
+    """Asientos libres de todas las salas que aún admiten jugadores; el resto se queda en 0."""
+    RaidRoom = apps.get_model('core', 'RaidRoom')
+    rooms = RaidRoom.objects.filter(state__in=LOBBY_STATES, closed=False).annotate(n=Count('participants'))
+    for room in rooms:
+        RaidRoom.objects.filter(pk=room.pk).update(open_seats=max(0, room.max_players - room.n))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_soloencounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='raidroom',
+            name='open_seats',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_open_seats, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='raidroom',
+            index=models.Index(condition=models.Q(('open_seats__gt', 0), ('state', 'waiting')), fields=['raid', 'created_at'], name='raidroom_open_seats_idx'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:13
+
+from django.db import migrations, models
+
+
+def backfill_log_seq(apps, schema_editor):
+    """Numera los logs existentes de cada sala por orden de creación y deja log_seq al final."""
+    RaidRoom = apps.get_model('core', 'RaidRoom')
+    RaidDecisionLog = apps.get_model('core', 'RaidDecisionLog')
+    room_ids = RaidDecisionLog.objects.values_list('room_id', flat=True).distinct()
+    for room_id in room_ids.iterator():
+        logs = list(RaidDecisionLog.objects.filter(room_id=room_id).order_by('created_at', 'id').only('id'))
+        for i, log in enumerate(logs, start=1):
+            log.seq = i
+        RaidDecisionLog.objects.bulk_update(logs, ['seq'], batch_size=1000)
+        RaidRoom.objects.filter(pk=room_id).update(log_seq=len(logs))
+
+
+class Migration(migrations.Migration):
+
+    replaces = [
+        ('core', '0013_raidroom_power_band'),
+        ('core', '0014_raidroom_sweeper_indexes'),
+        ('core', '0015_raid_hot_path_indexes'),
+        ('core', '0016_raid_log_seq'),
+    ]
+
+    dependencies = [
+        ('core', '0012_raidroom_open_seats'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='raidroom',
+            name='raidroom_open_seats_idx',
+        ),
+        migrations.AddField(
+            model_name='raidroom',
+            name='power_band',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='raidroom',
+            name='log_seq',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='raiddecisionlog',
+            name='seq',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_log_seq, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='raiddecisionlog',
+            constraint=models.UniqueConstraint(fields=('room', 'seq'), name='raidlog_room_seq_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='raidroom',
+            index=models.Index(condition=models.Q(('open_seats__gt', 0)), fields=['raid', 'power_band', 'created_at'], name='raidroom_open_band_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='raidroom',
+            index=models.Index(condition=models.Q(('state__in', ['waiting', 'ready'])), fields=['state', 'created_at'], name='raidroom_lobby_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='raidroom',
+            index=models.Index(condition=models.Q(('closed', False), ('state', 'in_progress')), fields=['expires_at'], name='raidroom_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='raidroom',
+            index=models.Index(fields=['state', 'raid', 'created_at'], name='raidroom_state_raid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='raidroom',
+            index=models.Index(fields=['state', 'closed'], name='raidroom_state_closed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='raidenemyinstance',
+            index=models.Index(condition=models.Q(('is_alive', True)), fields=['room'], name='raidenemy_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='raidparticipant',
+            index=models.Index(condition=models.Q(('is_alive', True)), fields=['room'], name='raidpart_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='raidturn',
+            index=models.Index(condition=models.Q(('resolved', False)), fields=['room', 'index'], name='raidturn_pending_idx'),
+        ),
+    ]
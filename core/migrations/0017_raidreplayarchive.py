@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:26
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_raidroom_power_band_indexes_log_seq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RaidReplayArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format_version', models.PositiveSmallIntegerField(default=1)),
+                ('blob', models.BinaryField()),
+                ('log_count', models.PositiveIntegerField(default=0)),
+                ('turn_count', models.PositiveIntegerField(default=0)),
+                ('enemy_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('room', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='archive', to='core.raidroom')),
+            ],
+        ),
+    ]
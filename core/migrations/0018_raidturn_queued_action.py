@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_raidreplayarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='raidturn',
+            name='queued_action',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
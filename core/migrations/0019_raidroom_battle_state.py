@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_raidturn_queued_action'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='raidroom',
+            name='battle_state',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
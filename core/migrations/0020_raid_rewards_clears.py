@@ -0,0 +1,49 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:51
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_raidroom_battle_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='raid',
+            name='hero_xp',
+            field=models.PositiveIntegerField(default=10, help_text='XP para cada héroe del equipo al completar la raid'),
+        ),
+        migrations.CreateModel(
+            name='RaidClear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_cleared_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('clears', models.PositiveIntegerField(default=0, help_text='Victorias jugadas (en vivo o auto-batalla)')),
+                ('sweeps', models.PositiveIntegerField(default=0, help_text='Victorias concedidas por barrido')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='raid_clears', to='core.member')),
+                ('raid', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clears', to='core.raid')),
+            ],
+            options={
+                'unique_together': {('member', 'raid')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RaidReward',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_amount', models.PositiveIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)])),
+                ('max_amount', models.PositiveIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)])),
+                ('chance', models.FloatField(default=1.0, help_text='Probabilidad de caer por raid completada (1.0 = siempre)')),
+                ('raid', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rewards', to='core.raid')),
+                ('resource_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.resourcetype')),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(condition=models.Q(('min_amount__gt', 0), ('max_amount__gte', models.F('min_amount'))), name='raid_reward_min_le_max')],
+            },
+        ),
+    ]
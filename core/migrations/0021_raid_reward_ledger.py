@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_raid_rewards_clears'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='raidroom',
+            name='rewards_granted',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='RaidRewardLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('xp_per_hero', models.PositiveIntegerField(default=0)),
+                ('heroes', models.JSONField(blank=True, default=list, help_text='[[player_hero_id, nivel_antes, nivel_después], ...]')),
+                ('resources', models.JSONField(blank=True, default=dict, help_text='{resource_type_id: cantidad}')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='raid_rewards', to='core.member')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reward_ledger', to='core.raidroom')),
+            ],
+            options={
+                'unique_together': {('room', 'member')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:58
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_raid_reward_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playerhero',
+            name='hp_updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_playerhero_hp_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='raidreplayarchive',
+            name='format_version',
+            field=models.PositiveSmallIntegerField(default=2),
+        ),
+    ]
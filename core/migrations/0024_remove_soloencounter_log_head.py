@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-19 19:14
+
+from django.db import migrations
+
+
+def unroll_logs(apps, schema_editor):
+    SoloEncounter = apps.get_model('core', 'SoloEncounter')
+    for encounter in SoloEncounter.objects.exclude(log_head=0):
+        log = encounter.log
+        SoloEncounter.objects.filter(pk=encounter.pk).update(
+            log=log[encounter.log_head:] + log[:encounter.log_head])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_raidreplayarchive_format_v2'),
+    ]
+
+    operations = [
+        migrations.RunPython(unroll_logs, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='soloencounter',
+            name='log_head',
+        ),
+    ]
@@ -1,9 +1,10 @@
 from django.db import models
 from django.db.models import Q
-from django.contrib.auth.hashers import make_password
+from django.contrib.auth.hashers import make_password, identify_hasher
 from django.utils.timezone import now
 from django.db.models import F, Value
 import math
+from bisect import bisect_right
 
 
 # =============================================================
@@ -144,13 +145,26 @@ class Member(models.Model):
     firstname = models.CharField(max_length=255)
     password_member = models.CharField(max_length=128)
     email = models.EmailField(max_length=255)
-    phone = models.IntegerField()
+    phone = models.IntegerField(db_index=True)
     created_at = models.DateTimeField(default=now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def set_password(self, raw_password: str) -> None:
+        """Guarda la contraseña hasheada con el hasher preferido (no llama a save)."""
+        self.password_member = make_password(raw_password)
+
+    def has_password_hash(self) -> bool:
+        """True si password_member es un hash bien formado de un hasher de PASSWORD_HASHERS."""
+        try:
+            identify_hasher(self.password_member).decode(self.password_member)
+        except (ValueError, TypeError, AssertionError):
+            return False
+        return True
+
     def save(self, *args, **kwargs):
-        if not self.password_member.startswith("pbkdf2_sha256$"):
-            self.password_member = make_password(self.password_member)
+        # Red de seguridad para altas con la contraseña en claro: el camino normal es set_password()
+        if not self.has_password_hash():
+            self.set_password(self.password_member)
         super().save(*args, **kwargs)
 
     def create_default_buildings(self):
@@ -488,19 +502,19 @@ class ExperienceCurve:
         val = 100.0 + k * ((level - 4) ** cls._p)
         return int(val)
 
+    @classmethod
+    def thresholds(cls) -> list:
+        """XP acumulada de cada nivel (índice 0 = nivel 1), calculada una sola vez por proceso."""
+        table = cls.__dict__.get("_thresholds")
+        if table is None:
+            table = [cls.cumulative_xp_for_level(level) for level in range(1, cls.MAX_LEVEL + 1)]
+            cls._thresholds = table
+        return table
+
     @classmethod
     def level_from_xp(cls, xp: int) -> int:
-        """Nivel derivado a partir de XP acumulada (cap en MAX_LEVEL)."""
-        xp = max(0, int(xp))
-        lo, hi = 1, cls.MAX_LEVEL
-        # búsqueda binaria
-        while lo < hi:
-            mid = (lo + hi + 1) // 2
-            if cls.cumulative_xp_for_level(mid) <= xp:
-                lo = mid
-            else:
-                hi = mid - 1
-        return lo
+        """Nivel derivado a partir de XP acumulada (cap en MAX_LEVEL); búsqueda binaria en la curva cacheada."""
+        return max(1, bisect_right(cls.thresholds(), max(0, int(xp))))
 
     @classmethod
     def next_level_xp(cls, level: int) -> int:
@@ -519,6 +533,8 @@ class PlayerHero(models.Model):
 
     # Vida persistente (modo extracción): si no está definida, por defecto 0
     current_hp = models.IntegerField(default=0)
+    # Momento en que se fijó current_hp: la regeneración se calcula desde aquí al leer (services.hero_hp)
+    hp_updated_at = models.DateTimeField(default=now)
 
     created_at = models.DateTimeField(default=now)
 
@@ -536,11 +552,26 @@ class PlayerHero(models.Model):
 
     @property
     def max_level_cap(self) -> int:
-        hq = PlayerBuilding.objects.filter(
-            member=self.member,
-            building_type__type=BuildingTypeChoices.HQ
-        ).first()
-        return hq.level * 5 + 5 if hq else 10
+        cap = self.__dict__.get("_level_cap")
+        if cap is None:
+            hq = PlayerBuilding.objects.filter(
+                member=self.member,
+                building_type__type=BuildingTypeChoices.HQ
+            ).first()
+            cap = self._level_cap = hq.level * 5 + 5 if hq else 10
+        return cap
+
+    @staticmethod
+    def prime_level_caps(player_heroes) -> None:
+        """Precalcula max_level_cap de varios héroes con una sola consulta (evita N+1 en s_*())."""
+        player_heroes = list(player_heroes)
+        member_ids = {ph.member_id for ph in player_heroes}
+        hq_levels = dict(PlayerBuilding.objects
+                         .filter(member_id__in=member_ids, building_type__type=BuildingTypeChoices.HQ)
+                         .values_list("member_id", "level"))
+        for ph in player_heroes:
+            hq = hq_levels.get(ph.member_id)
+            ph._level_cap = hq * 5 + 5 if hq else 10
 
     @property
     def next_level_required_xp(self) -> int:
@@ -677,15 +708,30 @@ class Enemy(models.Model):
     skills = models.ManyToManyField("Skill", blank=True)
     created_at = models.DateTimeField(default=now)
 
-    # Compat: algunos módulos usan enemy.abilities
-    @property
-    def abilities(self):
-        return self.skills
-
     def __str__(self):
         return f'{self.name} (lvl {self.level})'
 
 
+class SoloEncounter(models.Model):
+    """
+    Combate en solitario (CombatView). Estado compacto en servidor, una fila por member:
+    el log conserva como mucho las últimas COMBAT_LOG_MAX líneas (combat_service.append_combat_log),
+    así la fila no crece con el combate.
+    """
+    member = models.OneToOneField(Member, on_delete=models.CASCADE, related_name='solo_encounter')
+    player_hero = models.ForeignKey(PlayerHero, on_delete=models.CASCADE)
+    enemy = models.ForeignKey(Enemy, on_delete=models.CASCADE)
+    hero_hp = models.IntegerField(default=0)
+    enemy_hp = models.IntegerField(default=0)
+    turn = models.CharField(max_length=10, default='hero', choices=[('hero', 'Hero'), ('enemy', 'Enemy')])
+    log = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(default=now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.member.name}: {self.player_hero.hero.name} vs {self.enemy.name}"
+
+
 # =============================================================
 #  PULLS / BANNERS — pools compartidos y recompensas compuestas
 # =============================================================
@@ -883,6 +929,7 @@ class Raid(models.Model):
     ], default='normal')
     min_players = models.PositiveIntegerField(default=1)
     max_players = models.PositiveIntegerField(default=4)
+    hero_xp = models.PositiveIntegerField(default=10, help_text="XP para cada héroe del equipo al completar la raid")
     created_at = models.DateTimeField(default=now)
 
     def __str__(self):
@@ -914,6 +961,26 @@ class RaidEnemy(models.Model):
         return f"{self.wave} - {self.quantity}x {self.enemy.name}"
 
 
+class RaidReward(models.Model):
+    """Botín por raid completada: un tipo de recurso con rango de cantidad y probabilidad de caer."""
+    raid = models.ForeignKey(Raid, on_delete=models.CASCADE, related_name="rewards")
+    resource_type = models.ForeignKey("ResourceType", on_delete=models.CASCADE)
+    min_amount = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
+    max_amount = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
+    chance = models.FloatField(default=1.0, help_text="Probabilidad de caer por raid completada (1.0 = siempre)")
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                name="raid_reward_min_le_max",
+                check=models.Q(min_amount__gt=0) & models.Q(max_amount__gte=models.F('min_amount'))
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.raid.name} · {self.resource_type.name} [{self.min_amount}-{self.max_amount}] {self.chance:.0%}"
+
+
 # =============================================================
 #  RAIDS MULTIJUGADOR (mínimo viable asíncrono)
 # =============================================================
@@ -937,6 +1004,43 @@ class RaidRoom(models.Model):
     # Timeout / closure
     closed = models.BooleanField(default=False)
     expires_at = models.DateTimeField(null=True, blank=True)
+    # Matchmaking: asientos libres (se decrementa al asignar, bajo select_for_update).
+    # Solo las salas en lobby tienen open_seats > 0: se pone a 0 al empezar o cerrar la sala.
+    open_seats = models.PositiveIntegerField(default=0)
+    # Banda de poder de equipo de la sala (ver core.services.matchmaking.power_band)
+    power_band = models.IntegerField(default=0)
+    # Último número de secuencia de RaidDecisionLog asignado en la sala (core.services.raid_log)
+    log_seq = models.PositiveIntegerField(default=0)
+    # Snapshot del estado de combate (core.services.battle_state); se escribe al cambiar de ciclo
+    battle_state = models.JSONField(default=dict, blank=True)
+    # Recompensas repartidas (core.services.raid_rewards.distribute_room_rewards): se reclama una vez
+    rewards_granted = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Salas abiertas de una raid por banda de poder y orden de llegada (matchmaking)
+            models.Index(
+                fields=["raid", "power_band", "created_at"],
+                condition=models.Q(open_seats__gt=0),
+                name="raidroom_open_band_idx",
+            ),
+            # Barrido de salas en lobby por antigüedad (sweep_rooms)
+            models.Index(
+                fields=["state", "created_at"],
+                condition=models.Q(state__in=["waiting", "ready"]),
+                name="raidroom_lobby_idx",
+            ),
+            # Salas en curso por caducidad (sweep_rooms)
+            models.Index(
+                fields=["expires_at"],
+                condition=models.Q(state="in_progress", closed=False),
+                name="raidroom_expiry_idx",
+            ),
+            # Salas por estado y raid (historial / listados)
+            models.Index(fields=["state", "raid", "created_at"], name="raidroom_state_raid_idx"),
+            # Salas activas sin cerrar (process_all_active_raids)
+            models.Index(fields=["state", "closed"], name="raidroom_state_closed_idx"),
+        ]
 
     def __str__(self):
         return f"RaidRoom #{self.id} ({self.state})"
@@ -968,11 +1072,11 @@ class TeamSlot(models.Model):
         ]
 
     def clean(self):
-        # Enforce max 4 and no duplicate base Hero within team
-        if self.team.slots.exclude(pk=self.pk).count() >= 4:
+        # Enforce max 4 and no duplicate base Hero within team (una sola consulta)
+        base_ids = list(self.team.slots.exclude(pk=self.pk).values_list("player_hero__hero_id", flat=True))
+        if len(base_ids) >= 4:
             from django.core.exceptions import ValidationError
             raise ValidationError("El equipo ya tiene 4 héroes")
-        base_ids = set(self.team.slots.exclude(pk=self.pk).values_list("player_hero__hero_id", flat=True))
         if self.player_hero and self.player_hero.hero_id in base_ids:
             from django.core.exceptions import ValidationError
             raise ValidationError("No puedes repetir el mismo Hero en el equipo")
@@ -992,6 +1096,10 @@ class RaidParticipant(models.Model):
 
     class Meta:
         unique_together = ("room", "member")
+        indexes = [
+            # "¿queda algún héroe vivo en la sala?"
+            models.Index(fields=["room"], condition=models.Q(is_alive=True), name="raidpart_alive_idx"),
+        ]
 
     def __str__(self):
         return f"{self.member.name} in Room {self.room_id}"
@@ -1005,6 +1113,12 @@ class RaidEnemyInstance(models.Model):
     speed = models.IntegerField(default=100)
     is_alive = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # Enemigos vivos de la sala (objetivos, fin de oleada)
+            models.Index(fields=["room"], condition=models.Q(is_alive=True), name="raidenemy_alive_idx"),
+        ]
+
     def __str__(self):
         return f"Enemy {self.enemy.name} (HP {self.current_hp}/{self.max_hp}) in Room {self.room_id}"
 
@@ -1017,11 +1131,18 @@ class RaidTurn(models.Model):
     enemy_instance = models.ForeignKey(RaidEnemyInstance, on_delete=models.SET_NULL, null=True, blank=True)
     hero_instance = models.ForeignKey("PlayerHero", on_delete=models.SET_NULL, null=True, blank=True, help_text="Héroe específico que tiene el turno")
     resolved = models.BooleanField(default=False)
+    # Acción encolada por el jugador para este turno ({"target_enemy_id", "ability_id"});
+    # se aplica sola al llegar el turno (queue_player_decisions)
+    queued_action = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(default=now)
 
     class Meta:
         unique_together = ("room", "index")
         ordering = ["room_id", "index"]
+        indexes = [
+            # Turno actual: primer turno sin resolver de la sala
+            models.Index(fields=["room", "index"], condition=models.Q(resolved=False), name="raidturn_pending_idx"),
+        ]
 
 
 class RaidDecisionLog(models.Model):
@@ -1032,6 +1153,59 @@ class RaidDecisionLog(models.Model):
     action_type = models.CharField(max_length=30)  # join/start/hero_attack/enemy_attack/skip
     payload = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(default=now)
+    # Posición del evento dentro de la sala (1, 2, 3...); los lectores paginan por seq
+    seq = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["room", "seq"], name="raidlog_room_seq_uniq"),
+        ]
+
+
+class RaidReplayArchive(models.Model):
+    """
+    Historial completo de una sala terminada como fichero de replay (core.services.replay).
+    Lo genera la compactación (core.services.raid_archive) y sustituye a las filas por sala.
+    """
+    room = models.OneToOneField(RaidRoom, on_delete=models.CASCADE, related_name="archive")
+    format_version = models.PositiveSmallIntegerField(default=2)
+    blob = models.BinaryField()
+    log_count = models.PositiveIntegerField(default=0)
+    turn_count = models.PositiveIntegerField(default=0)
+    enemy_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=now)
+
+    def __str__(self):
+        return f"Archive of Room {self.room_id} ({len(self.blob)} bytes)"
+
+
+class RaidRewardLedger(models.Model):
+    """Recompensas concedidas a un miembro al terminar una sala (una fila por sala y miembro)."""
+    room = models.ForeignKey(RaidRoom, on_delete=models.CASCADE, related_name="reward_ledger")
+    member = models.ForeignKey("Member", on_delete=models.CASCADE, related_name="raid_rewards")
+    xp_per_hero = models.PositiveIntegerField(default=0)
+    heroes = models.JSONField(default=list, blank=True, help_text="[[player_hero_id, nivel_antes, nivel_después], ...]")
+    resources = models.JSONField(default=dict, blank=True, help_text="{resource_type_id: cantidad}")
+    created_at = models.DateTimeField(default=now)
+
+    class Meta:
+        unique_together = ("room", "member")
+
+    def __str__(self):
+        return f"Room {self.room_id} · {self.member.name}: {self.xp_per_hero} XP"
+
+
+class RaidClear(models.Model):
+    """Raid completada por un miembro (desbloquea el barrido: core.services.raid_rewards.sweep_raid)."""
+    member = models.ForeignKey("Member", on_delete=models.CASCADE, related_name="raid_clears")
+    raid = models.ForeignKey(Raid, on_delete=models.CASCADE, related_name="clears")
+    first_cleared_at = models.DateTimeField(default=now)
+    clears = models.PositiveIntegerField(default=0, help_text="Victorias jugadas (en vivo o auto-batalla)")
+    sweeps = models.PositiveIntegerField(default=0, help_text="Victorias concedidas por barrido")
+
+    class Meta:
+        unique_together = ("member", "raid")
+
+    def __str__(self):
+        return f"{self.member.name} · {self.raid.name} ({self.clears} + {self.sweeps} barridos)"
@@ -0,0 +1,82 @@
+# core/services/auth_service.py
+from __future__ import annotations
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
+
+from core.models import Member
+
+
+class LoginError(Exception):
+    """Error genérico de login."""
+
+class UnknownPhone(LoginError):
+    """No existe ningún Member con ese teléfono."""
+
+class WrongPassword(LoginError):
+    """La contraseña no coincide."""
+
+class LoginRateLimited(LoginError):
+    """Demasiados intentos fallidos para ese teléfono."""
+
+
+def _max_attempts() -> int:
+    return int(getattr(settings, "LOGIN_RATE_LIMIT_ATTEMPTS", 5))
+
+
+def _window_seconds() -> int:
+    return int(getattr(settings, "LOGIN_RATE_LIMIT_WINDOW", 300))
+
+
+def _attempts_key(phone) -> str:
+    return f"login:fails:{phone}"
+
+
+def is_rate_limited(phone) -> bool:
+    return int(cache.get(_attempts_key(phone), 0)) >= _max_attempts()
+
+
+def register_failure(phone) -> None:
+    """Cuenta un intento fallido. La ventana empieza con el primer fallo (no se renueva)."""
+    key = _attempts_key(phone)
+    if not cache.add(key, 1, timeout=_window_seconds()):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # La clave expiró entre add() e incr()
+            cache.set(key, 1, timeout=_window_seconds())
+
+
+def clear_failures(phone) -> None:
+    cache.delete(_attempts_key(phone))
+
+
+def authenticate_member(phone, password: str) -> Member:
+    """
+    Login en una sola consulta (índice sobre Member.phone) y una única verificación de hash.
+      - Si el teléfono supera el límite de intentos fallidos no se toca la BD ni se calcula ningún hash.
+      - Si el hash guardado usa un hasher distinto al preferido (settings.PASSWORD_HASHERS[0]) o
+        parámetros obsoletos, se re-hashea de forma transparente con un UPDATE.
+    Lanza UnknownPhone / WrongPassword / LoginRateLimited.
+    """
+    if is_rate_limited(phone):
+        raise LoginRateLimited("Demasiados intentos. Espera unos minutos.")
+
+    member: Optional[Member] = Member.objects.filter(phone=phone).first()
+    if member is None:
+        register_failure(phone)
+        raise UnknownPhone("No se encuentra el número")
+
+    def _upgrade_hash(raw_password: str) -> None:
+        member.set_password(raw_password)
+        # update() directo: evita Member.save() y no toca updated_at
+        Member.objects.filter(pk=member.pk).update(password_member=member.password_member)
+
+    if not check_password(password, member.password_member, setter=_upgrade_hash):
+        register_failure(phone)
+        raise WrongPassword("Contraseña incorrecta")
+
+    clear_failures(phone)
+    return member
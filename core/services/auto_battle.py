@@ -0,0 +1,332 @@
+# core/services/auto_battle.py
+from __future__ import annotations
+import random
+from typing import Callable, NamedTuple, Optional
+
+from django.db import transaction
+from django.utils.timezone import now
+
+from core.models import (
+    Member, PassiveTrigger, PlayerHero, Raid, RaidEnemy, RaidParticipant, RaidReplayArchive, RaidRoom,
+    SkillEffectType, Team,
+)
+from core.services.battle_state import STAT_SPEED, BattleState, enemy_actor, hero_actor
+from core.services.combat_core import Action, CombatState, Fighter, resolve_action
+from core.services.effects import hero_fighter
+from core.services.hero_hp import regenerated_hp
+from core.services.raid_archive import ARCHIVE_FORMAT_VERSION
+from core.services.raid_rewards import distribute_room_rewards
+from core.services.raid_rules import (
+    enemy_hit_log, enemy_strike_spec, hero_action_log, passive_log, passive_targets, passive_turns, settle_rage,
+    skill_targets, usable_skill,
+)
+from core.services.replay import ACTION_CODES, REPLAY_VERSION, encode_replay
+from core.services.skills import compile_skill_table, hero_skill
+
+# Auto-batalla de raids en solitario: la raid entera se resuelve en memoria en una sola petición
+# con una política de IA para los héroes del jugador, sin turnos, enemigos ni logs en la base de
+# datos. Solo se guarda el resultado (sala terminada), la vida final de los héroes y el replay
+# (RaidReplayArchive, formato v2), que el visor de replays reproduce como cualquier otra sala.
+#
+# HeadlessRaid no toca la base de datos: recibe la tabla de habilidades y los datos iniciales y
+# devuelve el resultado, así puede reutilizarse para simular raids fuera de una petición.
+# Reglas de la raid en vivo: orden por velocidad efectiva en cada ciclo, ira, pasivas (ON_HIT,
+# ON_KILL, ON_DAMAGED, ON_BATTLE_START/ALWAYS) y ataques enemigos a un héroe vivo al azar. Objetivos,
+# ira, ataque enemigo, pasivas y logs salen de raid_rules, igual que en raid_service/passives.
+MAX_ACTIONS = 5000      # red de seguridad: una raid que no termina acaba en "timeout"
+
+
+def default_policy(battle: "HeadlessRaid", hero_id: int) -> tuple[dict, Optional[int]]:
+    """La definitiva en cuanto hay ira, si no la básica; a un objetivo, el enemigo con menos vida."""
+    table = battle.table
+    skill = None
+    ultimate = table["heroes"][hero_id]["ultimate"]
+    if ultimate is not None:
+        skill = hero_skill(table, hero_id, ultimate)
+        if skill and battle.state.rage.get(hero_id, 0) < skill["rage_cost"]:
+            skill = None
+    if skill is None:
+        skill = hero_skill(table, hero_id)
+    alive = battle.alive_enemies()
+    target = min(alive, key=lambda actor: battle.combat.fighters[actor].hp) if alive else None
+    return skill, target
+
+
+class AutoBattleResult(NamedTuple):
+    winner: str                 # "heroes" | "enemies" | "timeout"
+    hero_hp: dict               # player_hero_id → vida final
+    waves_cleared: int
+    actions: list               # acciones en formato de replay
+    state: BattleState
+
+
+class HeadlessRaid:
+    """
+    Una raid resuelta en memoria.
+      heroes: [[player_hero_id, member_id, nombre, hp, max_hp, velocidad], ...]  (como _hero_snapshot)
+      waves:  [(wave_number, nombre, [[enemy_id, nombre, hp, velocidad], ...]), ...]
+    """
+
+    def __init__(self, table: dict, heroes: list, waves: list, rng=None,
+                 policy: Callable = default_policy, raid_id: Optional[int] = None,
+                 participant_id: Optional[int] = None, ts_ms: int = 0):
+        self.table = table
+        self.heroes = heroes
+        self.waves = waves
+        self.rng = rng or random.Random()
+        self.policy = policy
+        self.raid_id = raid_id
+        self.participant_id = participant_id
+        self.ts_ms = ts_ms
+        self.state = BattleState(0)
+        self.combat = CombatState(mods=self.state, rng=self.rng)
+        self.hero_info = {}         # actor → (member_id, nombre, velocidad)
+        self.enemy_info = {}        # actor → (instance_id, enemy_id, nombre, velocidad)
+        self.actions = []
+        self._strikes = {}          # enemy_id → habilidad de ataque
+        self._next_instance = 1
+        self._started = False
+        for ph_id, member_id, name, hp, max_hp, speed in heroes:
+            fighter = self.combat.add(hero_fighter(table, ph_id, hp))
+            fighter.max_hp = max_hp
+            self.hero_info[fighter.actor] = (member_id, name, speed)
+
+    # ---- consultas ----
+    def alive_enemies(self) -> list:
+        fighters = self.combat.fighters
+        return [actor for actor in self.enemy_info if fighters[actor].hp > 0]
+
+    def alive_heroes(self) -> list:
+        fighters = self.combat.fighters
+        return [actor for actor in self.hero_info if fighters[actor].hp > 0]
+
+    # ---- log ----
+    def _log(self, action_type: str, actor: str, payload: dict, by_player: bool = False) -> None:
+        self.actions.append([len(self.actions) + 1, self.ts_ms, ACTION_CODES.get(action_type, action_type), actor,
+                             payload, self.participant_id if by_player else None, None])
+
+    # ---- desarrollo ----
+    def run(self) -> AutoBattleResult:
+        winner, cleared = "heroes", 0
+        for number, name, enemies in self.waves:
+            self._spawn(number, name, enemies)
+            winner = self._fight_wave()
+            if winner != "heroes":
+                break
+            cleared += 1
+        if not self._started:     # raid sin oleadas
+            self._start()
+        self._log("finish", "", {"winner": winner})
+        fighters = self.combat.fighters
+        hero_hp = {actor: fighters[actor].hp for actor in self.hero_info}
+        return AutoBattleResult(winner, hero_hp, cleared, self.actions, self.state)
+
+    def _spawn(self, number: int, name: str, enemies: list) -> None:
+        for actor in list(self.enemy_info):
+            del self.combat.fighters[actor]
+        self.enemy_info = {}
+        snapshot = []
+        for enemy_id, enemy_name, hp, speed in enemies:
+            instance_id = self._next_instance
+            self._next_instance += 1
+            stats = self.table["enemies"].get(enemy_id) or {"attack": 0, "defense": 0}
+            fighter = self.combat.add(Fighter(enemy_actor(instance_id), hp, hp, stats["defense"], stats["defense"]))
+            self.enemy_info[fighter.actor] = (instance_id, enemy_id, enemy_name, speed)
+            snapshot.append([instance_id, enemy_id, enemy_name, hp, hp, speed])
+        self._log("wave_start", "", {"wave_number": number, "wave_name": name, "enemies": snapshot})
+
+    def _start(self) -> None:
+        self._started = True
+        self._log("start", "", {"raid_id": self.raid_id, "wave_index": 0, "heroes": self.heroes})
+        self.state.init_rage(self.table["heroes"])
+        for actor in self.hero_info:
+            self._fire(PassiveTrigger.ON_BATTLE_START, actor)
+
+    def _fight_wave(self) -> str:
+        state = self.state
+        while True:
+            # Nuevo ciclo: caducan los efectos y se ordena a los vivos por velocidad efectiva
+            state.advance()
+            if not self._started:
+                self._start()
+            if not self.alive_enemies():
+                return "heroes"
+            if not self.alive_heroes():
+                return "enemies"
+            fighters = self.combat.fighters
+            order = [(state.effective(actor, STAT_SPEED, info[2]), actor)
+                     for actor, info in self.hero_info.items() if fighters[actor].hp > 0]
+            order += [(state.effective(actor, STAT_SPEED, info[3]), actor)
+                      for actor, info in self.enemy_info.items() if fighters[actor].hp > 0]
+            order.sort(key=lambda x: x[0], reverse=True)
+
+            for _, actor in order:
+                if fighters[actor].hp <= 0:
+                    continue
+                if len(self.actions) >= MAX_ACTIONS:
+                    return "timeout"
+                if actor in self.hero_info:
+                    self._hero_turn(actor)
+                else:
+                    self._enemy_turn(actor)
+                if not self.alive_enemies():
+                    return "heroes"
+                if not self.alive_heroes():
+                    return "enemies"
+
+    def _hp_fraction(self, actor: int) -> float:
+        fighter = self.combat.fighters[actor]
+        return fighter.hp / max(1, fighter.max_hp)
+
+    def _hero_turn(self, hero_id: int) -> None:
+        table, state, fighters = self.table, self.state, self.combat.fighters
+        skill, target = self.policy(self, hero_id)
+        skill = usable_skill(state, hero_id, skill) or hero_skill(table, hero_id)
+
+        enemies, allies = skill_targets(skill, hero_id, target, self.alive_enemies, self.alive_heroes,
+                                        self._hp_fraction)
+        amounts, crit = resolve_action(self.combat, Action(hero_id, skill, enemies + allies))
+        enemy_hits = [[self.enemy_info[a][0], v, fighters[a].hp] for a, v in zip(enemies, amounts)]
+        hero_hits = [[a, v, fighters[a].hp] for a, v in zip(allies, amounts[len(enemies):])]
+
+        hit = bool(enemy_hits) and skill["effect"] == SkillEffectType.DAMAGE
+        rage = settle_rage(state, table, hero_id, skill, hit)
+        action_type, payload = hero_action_log(skill, hero_id, enemy_hits, hero_hits, crit, rage)
+        self._log(action_type, self.hero_info[hero_id][1], payload, by_player=True)
+
+        if hit:
+            self._fire(PassiveTrigger.ON_HIT, hero_id, enemies)
+            killed = [a for a in enemies if fighters[a].hp <= 0]
+            if killed:
+                self._fire(PassiveTrigger.ON_KILL, hero_id, killed)
+
+    def _enemy_turn(self, actor: int) -> None:
+        fighters = self.combat.fighters
+        instance_id, enemy_id, name, _ = self.enemy_info[actor]
+        spec = self._strikes.get(enemy_id)
+        if spec is None:
+            spec = self._strikes[enemy_id] = enemy_strike_spec(self.table, enemy_id, name)
+
+        target = self.rng.choice(self.alive_heroes())
+        old_hp = fighters[target].hp
+        (dmg,), _ = resolve_action(self.combat, Action(actor, spec, [target]))
+        member_id, hero_name, _ = self.hero_info[target]
+        remaining = fighters[target].hp
+        action_type, payload = enemy_hit_log(member_id, target, hero_name, dmg, old_hp, remaining)
+        self._log(action_type, name, payload)
+        if remaining <= 0:
+            if not any(info[0] == member_id for a, info in self.hero_info.items() if fighters[a].hp > 0):
+                self._log("participant_eliminated", name, {"member_id": member_id, "reason": "all_heroes_dead"})
+        else:
+            self._fire(PassiveTrigger.ON_DAMAGED, target, [actor])
+
+    def _fire(self, trigger: str, hero_id: int, related: list = ()) -> None:
+        """Pasivas del héroe para `trigger` (raid_rules, como passives.fire en la raid en vivo)."""
+        listeners = self.table["triggers"].get((hero_actor(hero_id), trigger))
+        if not listeners:
+            return
+        fighters = self.combat.fighters
+        for passive in listeners:
+            targets = passive_targets(passive, hero_id, [a for a in related if fighters[a].hp > 0],
+                                      self.alive_enemies, self.alive_heroes)
+            if targets is None:
+                continue
+            enemies, allies = targets
+            amounts, _ = resolve_action(self.combat, Action(hero_id, passive, enemies + allies, passive_turns(passive)))
+            enemy_hits = [[self.enemy_info[a][0], v, fighters[a].hp] for a, v in zip(enemies, amounts)]
+            hero_hits = [[a, v, fighters[a].hp] for a, v in zip(allies, amounts[len(enemies):])]
+            self._log("passive", self.hero_info[hero_id][1],
+                      passive_log(passive, hero_id, enemy_hits, hero_hits, enemies + allies))
+
+
+def hero_snapshot(table: dict) -> list:
+    """Héroes de la tabla con su vida actual (regeneración incluida), en el formato de HeadlessRaid (una consulta)."""
+    at = now()
+    rows = {ph_id: (hp, since) for ph_id, hp, since in (PlayerHero.objects
+                                                         .filter(id__in=list(table["heroes"]))
+                                                         .values_list("id", "current_hp", "hp_updated_at"))}
+    snapshot = []
+    for ph_id, h in table["heroes"].items():
+        hp, since = rows.get(ph_id, (0, None))
+        snapshot.append([ph_id, h["member_id"], h["name"], regenerated_hp(hp, h["max_hp"], since, at),
+                         h["max_hp"], h["speed"]])
+    return snapshot
+
+
+def raid_waves(raid: Raid) -> list:
+    """Oleadas de la raid en el formato de HeadlessRaid (una consulta). Se para en el primer hueco de numeración."""
+    by_number = {}
+    for re in (RaidEnemy.objects
+               .filter(wave__raid=raid)
+               .select_related("wave", "enemy")
+               .order_by("wave__wave_number", "id")):
+        wave = by_number.setdefault(re.wave.wave_number, (re.wave.wave_number, re.wave.name, []))
+        hp, speed = int(re.enemy.base_hp * re.level_modifier), int(re.enemy.speed * re.level_modifier)
+        wave[2].extend([re.enemy_id, re.enemy.name, hp, speed] for _ in range(re.quantity))
+    waves = []
+    while len(waves) + 1 in by_number:
+        waves.append(by_number[len(waves) + 1])
+    return waves
+
+
+@transaction.atomic
+def auto_battle_solo(member: Member, raid: Raid, team: Optional[Team] = None,
+                     policy: Callable = default_policy) -> tuple[RaidRoom, AutoBattleResult]:
+    """
+    Juega una raid en solitario de principio a fin en memoria. Persiste la sala terminada, la vida
+    final de los héroes y el replay; sin turnos, enemigos ni logs por acción.
+    """
+    from core.services.raid_service import RaidError
+
+    if not team:
+        team = Team.objects.filter(owner=member, is_active=True).first()
+    team_hero = team.slots.select_related("player_hero__hero").first() if team else None
+    if not team_hero:
+        raise RaidError("Tu equipo no tiene héroes asignados")
+
+    seed = random.randint(1, 10_000)
+    room = RaidRoom.objects.create(owner=member, raid=raid, max_players=1, random_seed=seed,
+                                   name=f"Auto: {raid.name}", state="in_progress")
+    part = RaidParticipant.objects.create(room=room, member=member, hero=team_hero.player_hero,
+                                          is_ready=True, is_alive=True)
+
+    table = compile_skill_table(room)
+    heroes = hero_snapshot(table)
+    hero_rows = {ph_id: hp for ph_id, _, _, hp, _, _ in heroes}
+
+    battle = HeadlessRaid(table, heroes, raid_waves(raid), rng=random.Random(seed), policy=policy,
+                          raid_id=raid.id, participant_id=part.id, ts_ms=int(now().timestamp() * 1000))
+    result = battle.run()
+
+    # Vida final (solo los héroes que cambian) y resultado
+    at = now()
+    changed = [PlayerHero(id=ph_id, current_hp=hp, hp_updated_at=at) for ph_id, hp in result.hero_hp.items()
+               if hp != hero_rows.get(ph_id)]
+    if changed:
+        PlayerHero.objects.bulk_update(changed, ["current_hp", "hp_updated_at"])
+    if result.winner != "heroes":
+        part.is_alive = False
+        part.save(update_fields=["is_alive"])
+    room.wave_index = result.waves_cleared
+    rewards = distribute_room_rewards(room, result.winner)
+    if rewards:
+        battle._log("rewards", "", rewards)     # tras "finish", como en finish_room
+    actions = result.actions
+
+    body = {
+        "v": REPLAY_VERSION,
+        "room": {"id": room.id, "name": room.name, "raid_id": raid.id,
+                 "created_at": room.created_at.isoformat() if room.created_at else None},
+        "seed": seed,
+        "participants": [[part.id, member.id, member.name, part.hero_id,
+                          team_hero.player_hero.hero.name, part.player_color]],
+        "actions": actions,
+    }
+    RaidReplayArchive.objects.create(room=room, format_version=ARCHIVE_FORMAT_VERSION, blob=encode_replay(body),
+                                     log_count=len(actions))
+    room.state = "finished"
+    room.closed = True
+    room.log_seq = len(actions)
+    room.battle_state = result.state.to_snapshot()
+    room.save(update_fields=["state", "closed", "log_seq", "wave_index", "battle_state", "updated_at"])
+    return room, result
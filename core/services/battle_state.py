@@ -0,0 +1,203 @@
+# core/services/battle_state.py
+from __future__ import annotations
+import heapq
+from array import array
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from core.models import RaidRoom, ScalingStat
+
+# Estado de combate de la sala que no vive en columnas por acción: efectos de estado (buff/debuff)
+# e ira de cada héroe.
+# Vive en la caché entre acciones y se persiste en RaidRoom.battle_state solo en puntos de snapshot
+# (inicio, nuevo ciclo de turnos, fin de la raid): una acción no escribe el estado en la BD. Por eso
+# la caché tiene que ser compartida entre workers (settings.REDIS_URL); el check core.W001 avisa si
+# no lo es. `version` crece en cada guardado: al cargar gana la copia más nueva (caché o snapshot)
+# y un snapshot nunca pisa a otro más nuevo.
+#
+# Efectos: arrays paralelos (actor, stat, magnitud, expira_en_turno) con huecos reutilizables,
+# un min-heap (expira, hueco) para caducarlos en O(caducados) y la suma de modificadores activos
+# por (actor, stat) en una lista plana, así el stat efectivo es una búsqueda y una multiplicación.
+#
+# "turno" = ciclo de turnos de la sala (todos los actores vivos actúan una vez).
+STAT_ATK_PHY, STAT_ATK_MAG, STAT_DEF_PHY, STAT_DEF_MAG, STAT_SPEED = range(5)
+N_STATS = 5
+STAT_CODES = {
+    ScalingStat.ATK_PHY: STAT_ATK_PHY,
+    ScalingStat.ATK_MAG: STAT_ATK_MAG,
+    ScalingStat.DEF_PHY: STAT_DEF_PHY,
+    ScalingStat.DEF_MAG: STAT_DEF_MAG,
+    ScalingStat.SPEED: STAT_SPEED,
+}
+DEFAULT_EFFECT_TURNS = 2    # el ciclo en curso y el siguiente
+MIN_MULTIPLIER = 0.1        # los debuffs no bajan un stat de su 10 %
+BATTLE_STATE_TTL = 6 * 60 * 60
+_LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def hero_actor(player_hero_id: int) -> int:
+    return player_hero_id
+
+
+def enemy_actor(instance_id: int) -> int:
+    return -instance_id
+
+
+class BattleState:
+    __slots__ = ("room_id", "turn", "version", "_actors", "_mods",
+                 "fx_actor", "fx_stat", "fx_mag", "fx_expires", "_free", "_heap", "rage")
+
+    def __init__(self, room_id: int, turn: int = 0, version: int = 0):
+        self.room_id = room_id
+        self.turn = turn
+        self.version = version                     # +1 en cada guardado (save/snapshot)
+        self._actors: dict[int, int] = {}         # actor → base en _mods
+        self._mods: list[float] = []               # N_STATS modificadores por actor
+        self.fx_actor = array("i")
+        self.fx_stat = array("b")
+        self.fx_mag = array("d")
+        self.fx_expires = array("i")               # -1: hueco libre
+        self._free: list[int] = []
+        self._heap: list[tuple[int, int]] = []
+        self.rage: dict[int, int] = {}             # player_hero_id → ira actual
+
+    # ---- efectos ----
+    def _base(self, actor: int) -> int:
+        base = self._actors.get(actor)
+        if base is None:
+            base = self._actors[actor] = len(self._mods)
+            self._mods.extend([0.0] * N_STATS)
+        return base
+
+    def add_effect(self, actor: int, stat: int, magnitude: float, turns: int = DEFAULT_EFFECT_TURNS,
+                   expires: Optional[int] = None) -> int:
+        """Aplica un efecto (+0.10 = +10 %) que caduca al empezar el turno `expires`."""
+        expires = self.turn + turns if expires is None else expires
+        if self._free:
+            slot = self._free.pop()
+            self.fx_actor[slot], self.fx_stat[slot] = actor, stat
+            self.fx_mag[slot], self.fx_expires[slot] = magnitude, expires
+        else:
+            slot = len(self.fx_actor)
+            self.fx_actor.append(actor)
+            self.fx_stat.append(stat)
+            self.fx_mag.append(magnitude)
+            self.fx_expires.append(expires)
+        self._mods[self._base(actor) + stat] += magnitude
+        heapq.heappush(self._heap, (expires, slot))
+        return slot
+
+    def advance(self, turn: Optional[int] = None) -> int:
+        """Pasa al turno dado (por defecto el siguiente) y caduca los efectos vencidos."""
+        self.turn = self.turn + 1 if turn is None else turn
+        expired = 0
+        heap = self._heap
+        while heap and heap[0][0] <= self.turn:
+            _, slot = heapq.heappop(heap)
+            self._mods[self._actors[self.fx_actor[slot]] + self.fx_stat[slot]] -= self.fx_mag[slot]
+            self.fx_expires[slot] = -1
+            self._free.append(slot)
+            expired += 1
+        return expired
+
+    def modifier(self, actor: int, stat: int) -> float:
+        base = self._actors.get(actor)
+        return 0.0 if base is None else self._mods[base + stat]
+
+    def effective(self, actor: int, stat: int, value: float) -> float:
+        base = self._actors.get(actor)
+        if base is None:
+            return value
+        return value * max(MIN_MULTIPLIER, 1.0 + self._mods[base + stat])
+
+    def active_effects(self) -> list:
+        """[[actor, stat, magnitud, expira], ...] de los efectos activos."""
+        return [[self.fx_actor[i], self.fx_stat[i], self.fx_mag[i], self.fx_expires[i]]
+                for i in range(len(self.fx_actor)) if self.fx_expires[i] >= 0]
+
+    # ---- ira ----
+    def init_rage(self, heroes: dict) -> None:
+        """Ira inicial de cada héroe de la tabla de habilidades (starting_rage + RAGE_START)."""
+        for ph_id, hero in heroes.items():
+            self.rage.setdefault(ph_id, min(hero["rage_max"], hero["starting_rage"]))
+
+    def gain_rage(self, hero_id: int, amount: int, rage_max: int) -> int:
+        self.rage[hero_id] = max(0, min(rage_max, self.rage.get(hero_id, 0) + amount))
+        return self.rage[hero_id]
+
+    def spend_rage(self, hero_id: int, cost: int) -> bool:
+        """Descuenta `cost` si hay ira suficiente."""
+        rage = self.rage.get(hero_id, 0)
+        if rage < cost:
+            return False
+        self.rage[hero_id] = rage - cost
+        return True
+
+    # ---- snapshot ----
+    def to_snapshot(self) -> dict:
+        return {"turn": self.turn, "version": self.version, "effects": self.active_effects(), "rage": self.rage}
+
+    @classmethod
+    def from_snapshot(cls, room_id: int, data: dict) -> "BattleState":
+        state = cls(room_id, turn=data.get("turn", 0), version=data.get("version", 0))
+        state.rage = {int(ph_id): rage for ph_id, rage in data.get("rage", {}).items()}
+        for actor, stat, magnitude, expires in data.get("effects", []):
+            if expires > state.turn:
+                state.add_effect(actor, stat, magnitude, expires=expires)
+        return state
+
+
+def _state_key(room_id: int) -> str:
+    return f"raid:battle:{room_id}"
+
+
+def cache_is_shared() -> bool:
+    """¿La caché por defecto la ven todos los workers? (RAID_SHARED_CACHE la fuerza en un sentido u otro)"""
+    shared = getattr(settings, "RAID_SHARED_CACHE", None)
+    if shared is not None:
+        return bool(shared)
+    return settings.CACHES["default"]["BACKEND"] not in _LOCAL_CACHE_BACKENDS
+
+
+def load_battle_state(room: RaidRoom) -> BattleState:
+    """La copia más nueva entre la caché y el snapshot de la sala (room.battle_state)."""
+    snapshot = room.battle_state or {}
+    state = cache.get(_state_key(room.id))
+    if state is None or state.version < snapshot.get("version", 0):
+        state = BattleState.from_snapshot(room.id, snapshot)
+    return state
+
+
+def _persist(room_id: int, snapshot: dict) -> bool:
+    """Escribe el snapshot salvo que la sala ya tenga uno más nuevo (worker con una copia vieja)."""
+    return bool(RaidRoom.objects
+                .filter(Q(battle_state__version__lt=snapshot["version"]) | Q(battle_state__version__isnull=True),
+                        pk=room_id, state="in_progress")
+                .update(battle_state=snapshot))
+
+
+def save_battle_state(state: BattleState) -> None:
+    """Guarda un cambio del estado entre snapshots (solo en la caché)."""
+    state.version += 1
+    cache.set(_state_key(state.room_id), state, BATTLE_STATE_TTL)
+
+
+def snapshot_battle_state(room: RaidRoom, state: BattleState) -> bool:
+    """Punto de snapshot: guarda el estado en la caché y en RaidRoom.battle_state (solo salas en curso)."""
+    state.version += 1
+    snapshot = state.to_snapshot()
+    if not _persist(room.pk, snapshot):
+        return False
+    cache.set(_state_key(state.room_id), state, BATTLE_STATE_TTL)
+    room.battle_state = snapshot
+    return True
+
+
+def clear_battle_state(room_id: int) -> None:
+    cache.delete(_state_key(room_id))
@@ -0,0 +1,92 @@
+# core/services/catalog.py
+from __future__ import annotations
+import random
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Optional, Type
+
+from django.core.cache import cache
+from django.db import models
+
+# Selección aleatoria de filas de catálogo (Enemy, Hero...) sin ORDER BY RANDOM():
+# se cachea el array de ids (y pesos acumulados) por modelo + filtros, y se elige en memoria.
+CATALOG_CACHE_TTL = 300
+
+
+def _version_key(model: Type[models.Model]) -> str:
+    return f"catalog:ver:{model._meta.label_lower}"
+
+
+def _model_version(model: Type[models.Model]) -> int:
+    key = _version_key(model)
+    cache.add(key, 1, timeout=None)
+    return int(cache.get(key, 1))
+
+
+def invalidate_catalog(model: Type[models.Model]) -> None:
+    """Invalida todos los arrays cacheados del modelo (cualquier combinación de filtros)."""
+    key = _version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def _catalog_key(model, weight_field, filters) -> str:
+    flt = ",".join(f"{k}={filters[k]!r}" for k in sorted(filters))
+    return f"catalog:{model._meta.label_lower}:{_model_version(model)}:{weight_field or ''}:{flt}"
+
+
+def _load_catalog(model, weight_field, filters):
+    """(ids, pesos acumulados | None) para el modelo y filtros dados."""
+    key = _catalog_key(model, weight_field, filters)
+    entry = cache.get(key)
+    if entry is not None:
+        return entry
+
+    qs = model.objects.filter(**filters).order_by("pk")
+    if weight_field:
+        rows = [(pk, w) for pk, w in qs.values_list("pk", weight_field) if w and w > 0]
+        ids = [pk for pk, _ in rows]
+        cum_weights = list(accumulate(float(w) for _, w in rows))
+    else:
+        ids = list(qs.values_list("pk", flat=True))
+        cum_weights = None
+    entry = (ids, cum_weights)
+    cache.set(key, entry, CATALOG_CACHE_TTL)
+    return entry
+
+
+def random_pick_id(model: Type[models.Model], rng: Optional[random.Random] = None,
+                   weight_field: Optional[str] = None, **filters):
+    """
+    Id aleatorio del catálogo en O(1) (O(log n) si es ponderado por `weight_field`).
+    `filters` son lookups normales del ORM, p.ej. level__gte=3, level__lte=7.
+    Pasa el RNG sembrado de la sala (room_rng) para que la elección sea reproducible.
+    """
+    rnd = rng or random
+    ids, cum_weights = _load_catalog(model, weight_field, filters)
+    if not ids:
+        return None
+    if cum_weights:
+        idx = bisect_right(cum_weights, rnd.random() * cum_weights[-1])
+        return ids[min(idx, len(ids) - 1)]
+    return ids[rnd.randrange(len(ids))]
+
+
+def random_pick(model: Type[models.Model], rng: Optional[random.Random] = None,
+                weight_field: Optional[str] = None, **filters):
+    """
+    Como random_pick_id pero devuelve la instancia (una consulta por PK). Si el id ya no existe
+    (array obsoleto: fila borrada sin señal) invalida el catálogo y repite una vez con el array
+    recién cargado; solo devuelve None si el catálogo está vacío.
+    """
+    for _ in range(2):
+        pk = random_pick_id(model, rng=rng, weight_field=weight_field, **filters)
+        if pk is None:
+            return None
+        obj = model.objects.filter(pk=pk).first()
+        if obj is not None:
+            return obj
+        invalidate_catalog(model)
+    return None
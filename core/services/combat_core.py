@@ -0,0 +1,187 @@
+# core/services/combat_core.py
+from __future__ import annotations
+import random
+from typing import NamedTuple, Optional, Sequence
+
+from core.models import DamageProfile, SkillEffectType, SkillSlot, SkillTarget
+from core.services.battle_state import (
+    DEFAULT_EFFECT_TURNS, STAT_ATK_PHY, STAT_DEF_MAG, STAT_DEF_PHY, BattleState,
+)
+
+try:
+    import numpy as np  # opcional: pasada vectorizada para oleadas grandes
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+# Núcleo de combate común a todos los modos (combate en solitario, raids, simulación): una única
+# fórmula de daño, curación, crítico y buffs. resolve_action no toca la base de datos; cada modo
+# construye los Fighter desde sus modelos, resuelve y escribe de vuelta la vida resultante.
+#
+#   daño   = max(MIN_DAMAGE, int(valor - defensa * DEFENSE_FACTOR))
+#   valor  = amount de la habilidad (stat * base / 100) × crítico × buffs del stat × variación
+#
+# Las habilidades son dicts con la forma de las entradas de skills (ver skills.py): "effect",
+# "target", "profile", "amount", "percent", "power_stat", "stats", "slot" y, opcional, "variance".
+DEFENSE_FACTOR = 0.15
+MIN_DAMAGE = 1
+TRUE_DAMAGE = "true"        # perfil interno: ignora la defensa
+CRIT_SLOTS = (SkillSlot.BASIC, SkillSlot.ULTIMATE)   # las pasivas y los enemigos no hacen crítico
+# Por debajo de NUMPY_MIN_BATCH objetivos las listas de Python son más rápidas que crear arrays.
+NUMPY_MIN_BATCH = 16
+
+_PROFILE_DEF = {
+    DamageProfile.PHYSICAL: (STAT_DEF_PHY,),
+    DamageProfile.MAGICAL: (STAT_DEF_MAG,),
+    DamageProfile.MIXED: (STAT_DEF_PHY, STAT_DEF_MAG),
+}
+
+
+def defense_stats(profile: str) -> tuple:
+    """Stats de defensa que mitigan un perfil de daño."""
+    return _PROFILE_DEF.get(profile, ())
+
+
+class Fighter:
+    """Combatiente en memoria. `actor` es su clave de BattleState (battle_state.hero_actor/enemy_actor)."""
+    __slots__ = ("actor", "hp", "max_hp", "def_phy", "def_mag", "crit_chance", "crit_damage")
+
+    def __init__(self, actor: int, hp: int, max_hp: int, def_phy: float = 0, def_mag: float = 0,
+                 crit_chance: float = 0.0, crit_damage: float = 1.0):
+        self.actor = actor
+        self.hp = hp
+        self.max_hp = max_hp
+        self.def_phy = def_phy
+        self.def_mag = def_mag
+        self.crit_chance = crit_chance
+        self.crit_damage = crit_damage
+
+
+class CombatState:
+    """Combatientes por actor, modificadores de estado (opcional) y el generador aleatorio."""
+    __slots__ = ("fighters", "mods", "rng")
+
+    def __init__(self, fighters: Sequence[Fighter] = (), mods: Optional[BattleState] = None, rng=random):
+        self.fighters = {f.actor: f for f in fighters}
+        self.mods = mods
+        self.rng = rng
+
+    def add(self, fighter: Fighter) -> Fighter:
+        self.fighters[fighter.actor] = fighter
+        return fighter
+
+
+class Action(NamedTuple):
+    actor: int
+    skill: dict
+    targets: Sequence[int]                  # actores objetivo
+    turns: int = DEFAULT_EFFECT_TURNS       # duración de los buffs/debuffs
+
+
+class ActionResult(NamedTuple):
+    amounts: list       # daño o curación por objetivo (0 en buffs/debuffs), en el orden de targets
+    crit: bool
+
+
+def damage_pass(hp: Sequence[int], defense: Sequence[float], amount: float, profile: str) -> tuple[list, list]:
+    """(daño, vida restante) por objetivo."""
+    if NUMPY_AVAILABLE and len(hp) >= NUMPY_MIN_BATCH:
+        hp_arr = np.asarray(hp, dtype=np.int64)
+        if profile == TRUE_DAMAGE:
+            dmg = np.full(len(hp), max(MIN_DAMAGE, int(amount)), dtype=np.int64)
+        else:
+            dmg = np.maximum(MIN_DAMAGE,
+                             (amount - np.asarray(defense, dtype=np.float64) * DEFENSE_FACTOR).astype(np.int64))
+        return dmg.tolist(), np.maximum(0, hp_arr - dmg).tolist()
+
+    if profile == TRUE_DAMAGE:
+        dmg = [max(MIN_DAMAGE, int(amount))] * len(hp)
+    else:
+        dmg = [max(MIN_DAMAGE, int(amount - d * DEFENSE_FACTOR)) for d in defense]
+    return dmg, [max(0, h - d) for h, d in zip(hp, dmg)]
+
+
+def heal_pass(hp: Sequence[int], max_hp: Sequence[int], amount: float) -> tuple[list, list]:
+    """(curado, vida resultante) por objetivo, sin pasar de la vida máxima."""
+    heal = int(amount)
+    if NUMPY_AVAILABLE and len(hp) >= NUMPY_MIN_BATCH:
+        hp_arr = np.asarray(hp, dtype=np.int64)
+        new_hp = np.maximum(hp_arr, np.minimum(np.asarray(max_hp, dtype=np.int64), hp_arr + heal))
+        return (new_hp - hp_arr).tolist(), new_hp.tolist()
+
+    new_hp = [max(h, min(m, h + heal)) for h, m in zip(hp, max_hp)]
+    return [n - h for n, h in zip(new_hp, hp)], new_hp
+
+
+def _defense(fighter: Fighter, stats: tuple, mods: Optional[BattleState]) -> float:
+    """Defensa del objetivo contra un perfil: media de sus stats de defensa con buffs/debuffs."""
+    total = 0.0
+    for stat in stats:
+        value = fighter.def_phy if stat == STAT_DEF_PHY else fighter.def_mag
+        total += value if mods is None else mods.effective(fighter.actor, stat, value)
+    return total / len(stats)
+
+
+def resolve_action(state: CombatState, action: Action) -> ActionResult:
+    """
+    Resuelve una acción sobre los combatientes del estado: actualiza su vida (y los efectos de
+    state.mods en buffs/debuffs) y devuelve lo aplicado a cada objetivo. No toca la base de datos.
+    """
+    skill = action.skill
+    effect = skill["effect"]
+    fighters = state.fighters
+    targets = [fighters[actor] for actor in action.targets]
+    mods = state.mods
+
+    if effect in (SkillEffectType.BUFF, SkillEffectType.DEBUFF):
+        if mods is not None:
+            for fighter in targets:
+                for stat in skill["stats"]:
+                    mods.add_effect(fighter.actor, stat, skill["percent"], turns=action.turns)
+        return ActionResult([0] * len(targets), False)
+
+    if not targets:
+        return ActionResult([], False)
+
+    # Valor de la acción: crítico (solo habilidades activas), buffs del stat que escala y variación
+    caster = fighters[action.actor]
+    amount = skill["amount"]
+    crit = skill["slot"] in CRIT_SLOTS and state.rng.random() < caster.crit_chance
+    if crit:
+        amount *= caster.crit_damage
+    if mods is not None and skill["power_stat"] is not None:
+        amount = mods.effective(action.actor, skill["power_stat"], amount)
+    variance = skill.get("variance")
+    if variance:
+        amount *= state.rng.uniform(1 - variance, 1 + variance)
+
+    hp = [f.hp for f in targets]
+    if effect == SkillEffectType.DAMAGE:
+        profile = skill["profile"]
+        stats = defense_stats(profile)
+        defense = [_defense(f, stats, mods) for f in targets] if stats else [0] * len(targets)
+        amounts, new_hp = damage_pass(hp, defense, amount, profile)
+    else:
+        amounts, new_hp = heal_pass(hp, [f.max_hp for f in targets], amount)
+    for fighter, value in zip(targets, new_hp):
+        fighter.hp = value
+    return ActionResult(amounts, crit)
+
+
+def attack_spec(name: str, amount: float, profile: str = TRUE_DAMAGE, power_stat: Optional[int] = STAT_ATK_PHY,
+                slot: Optional[str] = None, variance: float = 0.0, skill_id: int = 0) -> dict:
+    """Habilidad de daño a un objetivo fuera de la tabla de habilidades (enemigos, combate en solitario)."""
+    return {
+        "id": skill_id,
+        "name": name,
+        "slot": slot,
+        "effect": SkillEffectType.DAMAGE,
+        "target": SkillTarget.ENEMY_SINGLE,
+        "profile": profile,
+        "amount": amount,
+        "percent": 0.0,
+        "power_stat": power_stat,
+        "stats": [],
+        "variance": variance,
+    }
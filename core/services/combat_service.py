@@ -1,4 +1,9 @@
-from core.models import PlayerHero, Enemy, Ability
+import random
+
+from core.models import PlayerHero, Enemy, Ability, Member, SoloEncounter, DamageProfile, SkillSlot
+from core.services.catalog import random_pick
+from core.services.combat_core import Action, CombatState, Fighter, attack_spec, resolve_action
+from core.services.hero_hp import hp_now
 
 
 class SimpleCombatResult:
@@ -7,34 +12,141 @@ class SimpleCombatResult:
         self.log = log
 
 
-def calculate_damage(attack_stat, ability_power, defense_stat):
-    raw = (attack_stat * ability_power) / 100
-    dmg = raw - (defense_stat * 0.15)
-    return max(0, int(dmg))
+# Líneas de log que se conservan del combate en solitario (mantiene la fila en pocos KB)
+COMBAT_LOG_MAX = 12
+
+
+def append_combat_log(log: list, line: str) -> list:
+    """Añade una línea al log y descarta las más antiguas por encima de COMBAT_LOG_MAX."""
+    log.append(line)
+    if len(log) > COMBAT_LOG_MAX:
+        del log[:-COMBAT_LOG_MAX]
+    return log
+
+
+# Combatientes del combate en solitario (un héroe contra un enemigo, sin buffs de estado)
+HERO, ENEMY = 1, -1
+MAX_SIMULATED_TURNS = 1000
+
+
+def _hero_fighter(hero: PlayerHero, hp: int) -> Fighter:
+    return Fighter(HERO, hp, hero.s_hp(), hero.s_def_phy(), hero.s_def_mag(),
+                   hero.hero.base_crit_chance, hero.hero.base_crit_damage)
+
+
+def _enemy_fighter(enemy: Enemy, hp: int) -> Fighter:
+    return Fighter(ENEMY, hp, enemy.base_hp, enemy.defense, enemy.defense)
+
+
+def _hero_spec(hero: PlayerHero, ability: Ability) -> dict:
+    return attack_spec(ability.name, hero.s_atk_phy() * ability.power / 100, profile=DamageProfile.PHYSICAL,
+                       slot=SkillSlot.BASIC, skill_id=ability.id)
+
+
+def _enemy_spec(enemy: Enemy, abilities: list) -> dict:
+    ability = random.choice(abilities) if abilities else None
+    power = ability.power if ability else 100.0
+    return attack_spec(ability.name if ability else "Ataque", enemy.attack * power / 100,
+                       profile=DamageProfile.PHYSICAL)
+
+
+def _strike(state: CombatState, actor: int, spec: dict) -> tuple[int, bool]:
+    """Golpe de `actor` al otro combatiente. (daño, crítico)"""
+    (dmg,), crit = resolve_action(state, Action(actor, spec, [ENEMY if actor == HERO else HERO]))
+    return dmg, crit
+
+
+# =============== COMBATE EN SOLITARIO (CombatView) ===============
+def get_or_start_encounter(member: Member, hero: PlayerHero) -> SoloEncounter | None:
+    """Devuelve el combate en curso del member o empieza uno nuevo contra un enemigo aleatorio."""
+    encounter = (SoloEncounter.objects
+                 .select_related("enemy", "player_hero__hero")
+                 .filter(member=member)
+                 .first())
+    if encounter:
+        return encounter
+
+    enemy = random_pick(Enemy)
+    if not enemy:
+        return None
+    encounter = SoloEncounter(
+        member=member,
+        player_hero=hero,
+        enemy=enemy,
+        hero_hp=hp_now(hero),
+        enemy_hp=enemy.base_hp,
+        turn="hero" if hero.s_speed() >= enemy.speed else "enemy",
+    )
+    append_combat_log(encounter.log, f"¡Combate iniciado contra {enemy.name}!")
+    encounter.save()
+    return encounter
+
+
+def _save_turn(encounter: SoloEncounter) -> None:
+    encounter.save(update_fields=["hero_hp", "enemy_hp", "turn", "log", "updated_at"])
+
+
+def enemy_turn(encounter: SoloEncounter) -> str | None:
+    """Resuelve el turno del enemigo. Devuelve 'enemy' si gana (el combate se elimina)."""
+    enemy = encounter.enemy
+    hero = encounter.player_hero
+    state = CombatState([_hero_fighter(hero, encounter.hero_hp), _enemy_fighter(enemy, encounter.enemy_hp)])
+    spec = _enemy_spec(enemy, list(enemy.skills.all()))
+    dmg, _ = _strike(state, ENEMY, spec)
+    encounter.hero_hp = state.fighters[HERO].hp
+    append_combat_log(encounter.log, f"{enemy.name} usa {spec['name']} y hace {dmg} de daño a {hero.hero.name}.")
+
+    if encounter.hero_hp <= 0:
+        encounter.delete()
+        return "enemy"
+    encounter.turn = "hero"
+    _save_turn(encounter)
+    return None
+
+
+def hero_turn(encounter: SoloEncounter, ability: Ability) -> str | None:
+    """Resuelve el turno del héroe. Devuelve 'hero' si gana (el combate se elimina)."""
+    enemy = encounter.enemy
+    hero = encounter.player_hero
+
+    state = CombatState([_hero_fighter(hero, encounter.hero_hp), _enemy_fighter(enemy, encounter.enemy_hp)])
+    dmg, crit = _strike(state, HERO, _hero_spec(hero, ability))
+    encounter.enemy_hp = state.fighters[ENEMY].hp
+    crit_text = " ¡Crítico!" if crit else ""
+    append_combat_log(encounter.log,
+                      f"{hero.hero.name} usa {ability.name} y hace {dmg} de daño a {enemy.name}.{crit_text}")
+
+    if encounter.enemy_hp <= 0:
+        encounter.delete()
+        return "hero"
+    encounter.turn = "enemy"
+    _save_turn(encounter)
+    return None
 
 
 def simulate_combat_with_ability(hero: PlayerHero, enemy: Enemy, ability_id: int) -> SimpleCombatResult:
+    """Combate completo en memoria (sin guardar nada) del héroe usando siempre la misma habilidad."""
     log = []
     ability = Ability.objects.get(id=ability_id)
+    hero_spec = _hero_spec(hero, ability)
+    enemy_abilities = list(enemy.skills.all())
 
-    hero_hp = hero.current_hp
-    enemy_hp = enemy.base_hp
-
-    hero_speed = hero.get_speed()
-    turn = "hero" if hero_speed >= enemy.speed else "enemy"
+    state = CombatState([_hero_fighter(hero, hero.current_hp), _enemy_fighter(enemy, enemy.base_hp)])
+    hero_f, enemy_f = state.fighters[HERO], state.fighters[ENEMY]
+    turn = HERO if hero.s_speed() >= enemy.speed else ENEMY
 
-    while hero_hp > 0 and enemy_hp > 0:
-        if turn == "hero":
-            dmg = calculate_damage(hero.get_attack(), ability.power, enemy.defense)
-            enemy_hp -= dmg
-            log.append(f"{hero.hero.name} (Lvl {hero.get_level()}) usa {ability.name} y hace {dmg} de daño a {enemy.name}.")
-            turn = "enemy"
+    for _ in range(MAX_SIMULATED_TURNS):
+        if hero_f.hp <= 0 or enemy_f.hp <= 0:
+            break
+        if turn == HERO:
+            dmg, _ = _strike(state, HERO, hero_spec)
+            log.append(f"{hero.hero.name} (Lvl {hero.level}) usa {ability.name} y hace {dmg} de daño a {enemy.name}.")
         else:
-            dmg = calculate_damage(enemy.attack, ability.power, hero.get_defense())
-            hero_hp -= dmg
-            log.append(f"{enemy.name} ataca y hace {dmg} de daño a {hero.hero.name}.")
-            turn = "hero"
+            spec = _enemy_spec(enemy, enemy_abilities)
+            dmg, _ = _strike(state, ENEMY, spec)
+            log.append(f"{enemy.name} usa {spec['name']} y hace {dmg} de daño a {hero.hero.name}.")
+        turn = -turn
 
-    winner = "hero" if hero_hp > 0 else "enemy"
+    winner = "hero" if hero_f.hp > 0 else "enemy"
     log.append(f"Gana el {winner.upper()}")
     return SimpleCombatResult(winner, log)
@@ -0,0 +1,74 @@
+# core/services/effects.py
+from __future__ import annotations
+import random
+from typing import Optional, Sequence
+
+from django.utils.timezone import now
+
+from core.models import PlayerHero, RaidEnemyInstance
+from core.services.battle_state import DEFAULT_EFFECT_TURNS, BattleState, enemy_actor, hero_actor
+from core.services.combat_core import Action, CombatState, Fighter, resolve_action
+from core.services.raid_rules import enemy_strike_spec
+
+# Adaptador de las raids sobre combat_core: construye los combatientes desde la tabla de
+# habilidades de la sala y las instancias de modelo, resuelve la acción en memoria y guarda las
+# vidas resultantes con un único bulk_update por modelo (habilidades ENEMY_TEAM / ALLY_TEAM).
+
+
+def hero_fighter(table: dict, hero_id: int, hp: int = 0) -> Fighter:
+    hero = table["heroes"].get(hero_id)
+    if hero is None:  # fuera de la tabla (equipo cambiado): solo cuenta su vida
+        return Fighter(hero_actor(hero_id), hp, hp)
+    return Fighter(hero_actor(hero_id), hp, hero["max_hp"], hero["def_phy"], hero["def_mag"],
+                   hero["crit_chance"], hero["crit_damage"])
+
+
+def enemy_fighter(table: dict, enemy: RaidEnemyInstance) -> Fighter:
+    stats = table["enemies"].get(enemy.enemy_id)
+    defense = stats["defense"] if stats else 0
+    return Fighter(enemy_actor(enemy.id), enemy.current_hp, enemy.max_hp, defense, defense)
+
+
+def apply_skill(state: Optional[BattleState], table: dict, hero_id: int, skill: dict,
+                enemies: Sequence[RaidEnemyInstance] = (), heroes: Sequence[PlayerHero] = (),
+                turns: int = DEFAULT_EFFECT_TURNS, rng=random) -> tuple[list, list, bool]:
+    """
+    Habilidad de un héroe sobre enemigos y/o héroes. Con `state`, se aplican los buffs/debuffs
+    activos y los nuevos efectos. Devuelve ([[id, valor, vida], ...] enemigos, ídem héroes, crítico).
+    """
+    combat = CombatState([hero_fighter(table, hero_id)], mods=state, rng=rng)
+    targets = [combat.add(enemy_fighter(table, e)).actor for e in enemies]
+    targets += [combat.add(hero_fighter(table, ph.id, ph.current_hp)).actor for ph in heroes]
+    amounts, crit = resolve_action(combat, Action(hero_actor(hero_id), skill, targets, turns))
+
+    n = len(enemies)
+    enemy_hits = []
+    for enemy, actor, value in zip(enemies, targets, amounts):
+        enemy.current_hp = combat.fighters[actor].hp
+        enemy.is_alive = enemy.current_hp > 0
+        enemy_hits.append([enemy.id, value, enemy.current_hp])
+    if enemy_hits and any(amounts[:n]):
+        RaidEnemyInstance.objects.bulk_update(enemies, ["current_hp", "is_alive"])
+
+    hero_hits, changed, at = [], [], now()
+    for ph, actor, value in zip(heroes, targets[n:], amounts[n:]):
+        hp = combat.fighters[actor].hp
+        if hp != ph.current_hp:
+            ph.current_hp, ph.hp_updated_at = hp, at
+            changed.append(ph)
+        hero_hits.append([ph.id, value, ph.current_hp])
+    if changed:
+        PlayerHero.objects.bulk_update(changed, ["current_hp", "hp_updated_at"])
+    return enemy_hits, hero_hits, crit
+
+
+def enemy_strike(state: Optional[BattleState], table: dict, enemy: RaidEnemyInstance, hero: PlayerHero,
+                 rng=random) -> int:
+    """Ataque de un enemigo a un héroe (daño verdadero con variación). Actualiza la vida del héroe sin guardar."""
+    attacker = enemy_fighter(table, enemy)
+    target = hero_fighter(table, hero.id, hero.current_hp)
+    spec = enemy_strike_spec(table, enemy.enemy_id, enemy.enemy.name, enemy.enemy.attack)
+    (dmg,), _ = resolve_action(CombatState([attacker, target], mods=state, rng=rng),
+                               Action(attacker.actor, spec, [target.actor]))
+    hero.current_hp, hero.hp_updated_at = target.hp, now()
+    return dmg
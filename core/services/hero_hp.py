@@ -0,0 +1,97 @@
+# core/services/hero_hp.py
+from __future__ import annotations
+from datetime import datetime
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db.models import Case, IntegerField, Value, When
+from django.utils.timezone import now
+
+from core.models import Member, PlayerHero
+
+# Vida persistente de los héroes con regeneración perezosa: PlayerHero.current_hp es la vida en
+# PlayerHero.hp_updated_at (último daño o curación) y la regeneración acumulada desde entonces se
+# calcula al leer. Solo se escribe ("se asienta") al entrar en combate o al curar, y siempre con
+# un único UPDATE por lote (Case/When con la vida ya calculada en memoria). Un héroe caído (vida 0)
+# no regenera hasta que se le cura, y el tiempo dentro de una raid no cuenta: al terminar la sala
+# se reinicia hp_updated_at (resume_regen).
+
+
+def regen_per_minute() -> float:
+    """Fracción de la vida máxima que se recupera por minuto fuera de combate."""
+    return float(getattr(settings, "HERO_HP_REGEN_PER_MINUTE", 0.01))
+
+
+def regenerated_hp(current_hp: int, max_hp: int, since: Optional[datetime], at: datetime) -> int:
+    """Vida tras regenerar desde `since` hasta `at`, sin pasar de la vida máxima. Los caídos no regeneran."""
+    if current_hp <= 0 or current_hp >= max_hp or since is None:
+        return current_hp
+    minutes = max(0.0, (at - since).total_seconds() / 60)
+    return min(max_hp, current_hp + int(max_hp * regen_per_minute() * minutes))
+
+
+def hp_now(ph: PlayerHero, max_hp: Optional[int] = None, at: Optional[datetime] = None) -> int:
+    """Vida actual de un héroe con la regeneración pendiente (sin guardar)."""
+    return regenerated_hp(ph.current_hp, ph.s_hp() if max_hp is None else max_hp, ph.hp_updated_at, at or now())
+
+
+def hp_and_max(ph: PlayerHero, at: Optional[datetime] = None) -> tuple[int, int]:
+    """(vida actual con regeneración, vida máxima) para mostrar un héroe."""
+    max_hp = ph.s_hp()
+    return hp_now(ph, max_hp, at), max_hp
+
+
+def _write_hp(hp_by_id: dict, at: datetime) -> int:
+    """Fija {player_hero_id: vida} con un único UPDATE (héroes con la misma vida comparten When)."""
+    if not hp_by_id:
+        return 0
+    groups = {}
+    for ph_id, hp in hp_by_id.items():
+        groups.setdefault(hp, []).append(ph_id)
+    return PlayerHero.objects.filter(id__in=list(hp_by_id)).update(
+        current_hp=Case(*[When(id__in=ids, then=Value(hp)) for hp, ids in groups.items()],
+                        output_field=IntegerField()),
+        hp_updated_at=at,
+    )
+
+
+def _load(heroes) -> list:
+    heroes = list(heroes.select_related("hero"))
+    PlayerHero.prime_level_caps(heroes)
+    return heroes
+
+
+def settle_regen(player_hero_ids: Iterable[int]) -> dict:
+    """
+    Guarda la regeneración pendiente de varios héroes antes de que entren en combate (las
+    comprobaciones de "héroe vivo" y los snapshots leen current_hp). Devuelve {id: vida}.
+    """
+    at = now()
+    hp, changed = {}, {}
+    for ph in _load(PlayerHero.objects.filter(id__in=list(player_hero_ids))):
+        hp[ph.id] = hp_now(ph, at=at)
+        if hp[ph.id] != ph.current_hp:
+            changed[ph.id] = hp[ph.id]
+    _write_hp(changed, at)
+    return hp
+
+
+def resume_regen(player_hero_ids: Iterable[int], at: Optional[datetime] = None) -> int:
+    """
+    Reinicia la regeneración de los héroes de una raid que termina (un UPDATE): su current_hp ya es
+    la vida del final del combate y el tiempo pasado en la sala no cuenta como descanso.
+    """
+    return PlayerHero.objects.filter(id__in=list(player_hero_ids)).update(hp_updated_at=at or now())
+
+
+def heal_all(member: Member) -> tuple[int, int]:
+    """Cura al máximo todos los héroes del miembro con un único UPDATE. (curados, total)"""
+    at = now()
+    heroes = _load(PlayerHero.objects.filter(member=member))
+    healed = {}
+    for ph in heroes:
+        max_hp = ph.s_hp()
+        if hp_now(ph, max_hp, at) < max_hp:
+            healed[ph.id] = max_hp
+    _write_hp(healed, at)
+    return len(healed), len(heroes)
@@ -0,0 +1,336 @@
+# core/services/matchmaking.py
+from __future__ import annotations
+import random
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional
+
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from core.models import Member, PlayerHero, Raid, RaidParticipant, RaidRoom, Team
+from core.services.raid_log import buffered_log, log_event
+from core.services.raid_service import LOBBY_STATES, RaidError, start_lobby_room
+
+# Tiempo máximo que una petición espera a que otra la asigne dentro de su lote
+JOIN_WAIT_TIMEOUT = 30.0
+
+# Emparejamiento por poder de equipo
+POWER_BAND_WIDTH = 100      # puntos de poder por banda
+BAND_WIDEN_SECONDS = 15     # cada 15 s de espera, una sala acepta una banda más a cada lado
+MAX_BAND_SPREAD = 4         # tope de bandas de diferencia
+
+
+# =============== PODER DE EQUIPO / BANDAS ===============
+def hero_power(hero, level: int) -> float:
+    """Poder de un héroe: suma de stats escaladas por nivel (mismo +5%/nivel que PlayerHero.s_*)."""
+    mult = 1.0 + 0.05 * max(level - 1, 0)
+    return mult * (
+        hero.base_hp * 0.2
+        + hero.base_atk_phy + hero.base_atk_mag
+        + hero.base_def_phy + hero.base_def_mag
+        + hero.base_speed
+    )
+
+
+def team_power(team: Team) -> int:
+    """Poder total de los héroes del equipo (2 consultas: slots + cap de nivel por HQ)."""
+    heroes = [slot.player_hero for slot in team.slots.select_related("player_hero__hero")]
+    PlayerHero.prime_level_caps(heroes)
+    return int(sum(hero_power(ph.hero, ph.level) for ph in heroes))
+
+
+def power_band(power: float) -> int:
+    return int(power // POWER_BAND_WIDTH)
+
+
+def band_tolerance(wait_seconds: float) -> int:
+    """Bandas de diferencia aceptadas tras esperar `wait_seconds`."""
+    return min(MAX_BAND_SPREAD, int(max(wait_seconds, 0) // BAND_WIDEN_SECONDS))
+
+
+def open_room_band_filter(band: int, at: datetime) -> Q:
+    """
+    Salas compatibles con un jugador de banda `band`: misma banda, o ±d bandas si la sala lleva
+    esperando al menos d * BAND_WIDEN_SECONDS. Son rangos (power_band, created_at) que
+    resuelve el índice raidroom_open_band_idx; el BETWEEN exterior acota el recorrido del
+    índice aunque el planificador no sepa descomponer el OR.
+    """
+    cond = Q(power_band=band)
+    for d in range(1, MAX_BAND_SPREAD + 1):
+        cond |= Q(power_band__in=(band - d, band + d),
+                  created_at__lte=at - timedelta(seconds=d * BAND_WIDEN_SECONDS))
+    return Q(power_band__range=(band - MAX_BAND_SPREAD, band + MAX_BAND_SPREAD)) & cond
+
+
+class PowerBandQueue:
+    """
+    Versión en memoria de la política de salas por banda (la usa la simulación de
+    simulate_matchmaking). Por banda, una cola FIFO de salas abiertas; las bandas no vacías
+    se mantienen en una lista ordenada, así insertar y buscar candidatas es O(log n) por bisect.
+    """
+
+    @dataclass
+    class Room:
+        band: int
+        created_at: float
+        seats: int
+        arrivals: List[float] = field(default_factory=list)
+
+    def __init__(self, room_size: int):
+        self.room_size = room_size
+        self._bands: List[int] = []                       # bandas con salas abiertas (ordenadas)
+        self._rooms: Dict[int, Deque["PowerBandQueue.Room"]] = {}
+
+    def __len__(self):
+        return sum(len(q) for q in self._rooms.values())
+
+    def _push(self, room: "PowerBandQueue.Room") -> None:
+        q = self._rooms.get(room.band)
+        if q is None:
+            q = self._rooms[room.band] = deque()
+            insort(self._bands, room.band)
+        q.append(room)
+
+    def _drop_band_if_empty(self, band: int) -> None:
+        if not self._rooms[band]:
+            del self._rooms[band]
+            del self._bands[bisect_left(self._bands, band)]
+
+    def match(self, band: int, at: float) -> Optional["PowerBandQueue.Room"]:
+        """Sala abierta más antigua compatible con `band` en el instante `at`."""
+        lo = bisect_left(self._bands, band - MAX_BAND_SPREAD)
+        hi = bisect_right(self._bands, band + MAX_BAND_SPREAD)
+        best = None
+        for b in self._bands[lo:hi]:
+            room = self._rooms[b][0]  # FIFO: la más antigua de la banda
+            if band_tolerance(at - room.created_at) >= abs(b - band):
+                if best is None or room.created_at < best.created_at:
+                    best = room
+        return best
+
+    def join(self, band: int, at: float) -> tuple["PowerBandQueue.Room", bool]:
+        """Sienta a un jugador. Devuelve (sala, llena)."""
+        room = self.match(band, at)
+        if room is None:
+            room = self.Room(band=band, created_at=at, seats=self.room_size)
+            self._push(room)
+        room.seats -= 1
+        room.arrivals.append(at)
+        if room.seats == 0:
+            self._rooms[room.band].remove(room)
+            self._drop_band_if_empty(room.band)
+            return room, True
+        return room, False
+
+    def expire(self, at: float, max_wait: float) -> List["PowerBandQueue.Room"]:
+        """Saca las salas que llevan más de `max_wait` abiertas (auto-start con los que haya)."""
+        started = []
+        for b in list(self._bands):
+            q = self._rooms[b]
+            while q and at - q[0].created_at >= max_wait:
+                started.append(q.popleft())
+            self._drop_band_if_empty(b)
+        return started
+
+
+@dataclass
+class JoinRequest:
+    member: Member
+    team: Team
+    hero: PlayerHero  # héroe principal del participante (primer slot del equipo)
+    band: int = 0     # banda de poder del equipo
+
+
+@dataclass
+class _Ticket:
+    request: JoinRequest
+    wake: threading.Event = field(default_factory=threading.Event)   # resultado listo o turno de líder
+    lead: bool = False          # le toca vaciar el siguiente lote
+    done: bool = False
+    room: Optional[RaidRoom] = None
+    error: Optional[Exception] = None
+
+
+def _open_room(raid: Raid, owner: Member, band: int) -> RaidRoom:
+    return RaidRoom.objects.create(
+        owner=owner,
+        raid=raid,
+        max_players=raid.max_players,
+        open_seats=raid.max_players,
+        power_band=band,
+        random_seed=random.randint(1, 10_000),
+        name=f"Sala de {raid.name}",
+    )
+
+
+def _fill_room(raid: Raid, band: int, pending: List[JoinRequest]) -> tuple[RaidRoom, List[JoinRequest]]:
+    """
+    Una transacción por sala: bloquea la sala abierta compatible (por banda de poder) más antigua
+    que nadie tenga bloqueada (SKIP LOCKED → joins concurrentes se reparten salas en vez de
+    esperar), o crea una nueva, y la llena hasta max_players con un único bulk_create.
+    Todas las peticiones de `pending` son de la banda `band`.
+    Devuelve la sala y las peticiones que han entrado en ella.
+    """
+    with buffered_log():
+        room = (RaidRoom.objects
+                .select_for_update(skip_locked=True)
+                .filter(raid=raid, state__in=LOBBY_STATES, open_seats__gt=0)
+                .filter(open_room_band_filter(band, now()))
+                .order_by("created_at")
+                .first())
+        if room is None:
+            room = _open_room(raid, owner=pending[0].member, band=band)
+
+        taken = pending[:room.open_seats]
+        seated = room.max_players - room.open_seats
+
+        RaidParticipant.objects.bulk_create([
+            RaidParticipant(
+                room=room,
+                member=req.member,
+                hero=req.hero,
+                is_ready=True,
+                player_color=((seated + i) % 4) + 1,  # Colores 1-4 por orden de llegada
+            )
+            for i, req in enumerate(taken)
+        ])
+        for req in taken:
+            log_event(room, "join",
+                      payload={"member_id": req.member.id, "hero_id": req.hero.id, "team_id": req.team.id})
+
+        RaidRoom.objects.filter(pk=room.pk).update(open_seats=F("open_seats") - len(taken))
+        room.open_seats -= len(taken)
+
+        # Si la sala está llena, iniciar automáticamente (la fila ya está bloqueada por esta transacción)
+        if room.open_seats == 0:
+            room = start_lobby_room(room) or room
+
+    return room, taken
+
+
+def _seat_band(raid: Raid, band: int, pending: List[JoinRequest], assigned: dict) -> None:
+    while pending:
+        room, taken = _fill_room(raid, band, pending)
+        for req in taken:
+            assigned[req.member.id] = room
+        pending = pending[len(taken):]
+
+
+def assign_seats(raid: Raid, requests: List[JoinRequest]) -> tuple[Dict[int, RaidRoom], Dict[int, Exception]]:
+    """
+    Asigna asiento a un lote de peticiones de la misma raid. Devuelve ({member_id: sala},
+    {member_id: error}). Si falla el lote de una banda, sus peticiones se reintentan de una en
+    una para que el error solo le llegue a quien lo provoca.
+    """
+    assigned: Dict[int, RaidRoom] = {}
+    errors: Dict[int, Exception] = {}
+
+    # Deduplicar y respetar a quien ya espera en una sala de esta raid (una sola consulta)
+    unique: Dict[int, JoinRequest] = {}
+    for req in requests:
+        unique.setdefault(req.member.id, req)
+    already = (RaidParticipant.objects
+               .filter(member_id__in=list(unique), room__raid=raid, room__state__in=LOBBY_STATES)
+               .select_related("room"))
+    for part in already:
+        assigned[part.member_id] = part.room
+        unique.pop(part.member_id, None)
+
+    by_band: Dict[int, List[JoinRequest]] = defaultdict(list)
+    for req in unique.values():
+        by_band[req.band].append(req)
+
+    for band, pending in by_band.items():
+        try:
+            _seat_band(raid, band, pending, assigned)
+        except Exception:
+            for req in pending:
+                if req.member.id in assigned:
+                    continue
+                try:
+                    _seat_band(raid, band, [req], assigned)
+                except Exception as e:
+                    errors[req.member.id] = e
+    return assigned, errors
+
+
+class MatchmakingQueue:
+    """
+    Cola de matchmaking por raid con "group commit": la primera petición que llega para una raid
+    se convierte en líder, vacía lo acumulado para esa raid y lo asigna en lote (una transacción
+    por sala); el resto de peticiones concurrentes solo esperan su resultado. El líder asigna un
+    único lote y cede el liderazgo a la primera petición que siga en cola, así ninguna petición
+    HTTP trabaja más que un lote para los demás.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[int, List[_Ticket]] = defaultdict(list)
+        self._draining: set[int] = set()
+
+    def join(self, raid: Raid, request: JoinRequest) -> RaidRoom:
+        ticket = _Ticket(request)
+        with self._lock:
+            self._pending[raid.id].append(ticket)
+            ticket.lead = raid.id not in self._draining
+            if ticket.lead:
+                self._draining.add(raid.id)
+
+        deadline = time.monotonic() + JOIN_WAIT_TIMEOUT
+        while not ticket.done:
+            if ticket.lead:
+                ticket.lead = False
+                self._drain(raid)
+                continue
+            if not ticket.wake.wait(max(0.0, deadline - time.monotonic())):
+                if self._abandon(raid, ticket):
+                    raise RaidError("El matchmaking está saturado, inténtalo de nuevo")
+                ticket.wake.wait()   # ya va en un lote (o acaba de ser líder): el resultado es inminente
+            ticket.wake.clear()
+        if ticket.error:
+            raise ticket.error
+        return ticket.room
+
+    def _abandon(self, raid: Raid, ticket: _Ticket) -> bool:
+        """Saca de la cola una petición que ha agotado su espera, si ningún lote la ha tomado."""
+        with self._lock:
+            queue = self._pending.get(raid.id, [])
+            if ticket.lead or ticket not in queue:
+                return False
+            queue.remove(ticket)
+            return True
+
+    def _drain(self, raid: Raid) -> None:
+        """Asigna un lote y pasa el liderazgo a la primera petición en cola (si la hay)."""
+        with self._lock:
+            batch = self._pending.pop(raid.id, [])
+        try:
+            rooms, errors = assign_seats(raid, [t.request for t in batch])
+            for t in batch:
+                member_id = t.request.member.id
+                t.room = rooms.get(member_id)
+                if t.room is None:
+                    t.error = errors.get(member_id) or RaidError("No se pudo asignar sala")
+        except Exception as e:   # fallo antes de repartir por bandas (p. ej. la consulta inicial)
+            for t in batch:
+                t.error = e
+        finally:
+            for t in batch:
+                t.done = True
+                t.wake.set()
+            with self._lock:
+                queue = self._pending.get(raid.id)
+                if queue:
+                    queue[0].lead = True
+                    queue[0].wake.set()
+                else:
+                    self._pending.pop(raid.id, None)
+                    self._draining.discard(raid.id)
+
+
+matchmaking_queue = MatchmakingQueue()
@@ -0,0 +1,69 @@
+# core/services/passives.py
+from __future__ import annotations
+from typing import Sequence
+
+from core.models import PassiveTrigger, PlayerHero, RaidEnemyInstance, RaidRoom, SkillEffectType
+from core.services.battle_state import BattleState, enemy_actor, hero_actor, save_battle_state
+from core.services.effects import apply_skill
+from core.services.raid_rules import passive_log, passive_targets, passive_turns
+from core.services.raid_log import log_event
+
+# Bus de eventos de pasivas. Las suscripciones se compilan al empezar la raid en la tabla de
+# habilidades (skills.compile_triggers, indexada por (actor, trigger)); disparar un evento es una
+# búsqueda en esa tabla, así el coste por golpe no crece con el número de héroes con pasivas.
+#
+# Contexto de cada evento (enemigos relacionados):
+#   ON_HIT      enemigos golpeados        ON_KILL    enemigos abatidos
+#   ON_DAMAGED  enemigo atacante          ON_BATTLE_START / ALWAYS  ninguno
+# Las pasivas no disparan a su vez otros eventos (sin cadenas). A quién afecta cada pasiva y su
+# log salen de raid_rules, las mismas reglas que usa la auto-batalla.
+
+
+def fire(room: RaidRoom, table: dict, state: BattleState, trigger: str, hero_id: int,
+         enemies: Sequence[RaidEnemyInstance] = (), turn=None) -> int:
+    """Dispara `trigger` para el héroe y aplica sus pasivas. Devuelve cuántas se activaron."""
+    listeners = table["triggers"].get((hero_actor(hero_id), trigger))
+    if not listeners:
+        return 0
+
+    # Instancias por id de lo que devuelven las consultas de vivos (raid_rules trabaja con ids)
+    enemy_rows = {e.id: e for e in enemies}
+    hero_rows = {}
+
+    def alive_enemies() -> list:
+        rows = list(room.enemies.filter(is_alive=True).order_by("id"))
+        enemy_rows.update((e.id, e) for e in rows)
+        return [e.id for e in rows]
+
+    def alive_heroes() -> list:
+        rows = list(PlayerHero.objects.filter(id__in=list(table["heroes"]), current_hp__gt=0))
+        hero_rows.update((ph.id, ph) for ph in rows)
+        return [ph.id for ph in rows]
+
+    hero = table["heroes"][hero_id]
+    fired = 0
+    state_changed = False
+    for passive in listeners:
+        targets = passive_targets(passive, hero_id, [e.id for e in enemies if e.is_alive],
+                                  alive_enemies, alive_heroes)
+        if targets is None:
+            continue
+        enemy_ids, hero_ids = targets
+        enemy_hits, hero_hits, _ = apply_skill(state, table, hero_id, passive,
+                                               [enemy_rows[i] for i in enemy_ids], [hero_rows[i] for i in hero_ids],
+                                               turns=passive_turns(passive))
+        if passive["effect"] in (SkillEffectType.BUFF, SkillEffectType.DEBUFF):
+            state_changed = True
+        payload = passive_log(passive, hero_id, enemy_hits, hero_hits,
+                              [enemy_actor(i) for i in enemy_ids] + [hero_actor(i) for i in hero_ids])
+        log_event(room=room, turn=turn, actor=hero["name"], action_type="passive", payload=payload)
+        fired += 1
+
+    if state_changed:
+        save_battle_state(state)
+    return fired
+
+
+def fire_battle_start(room: RaidRoom, table: dict, state: BattleState) -> int:
+    """ON_BATTLE_START (y ALWAYS) de todos los héroes de la sala."""
+    return sum(fire(room, table, state, PassiveTrigger.ON_BATTLE_START, hero_id) for hero_id in table["heroes"])
@@ -0,0 +1,138 @@
+# core/services/raid_archive.py
+from __future__ import annotations
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Optional
+
+from django.db import transaction
+from django.utils.timezone import now
+
+from core.models import RaidDecisionLog, RaidEnemyInstance, RaidParticipant, RaidReplayArchive, RaidRoom, RaidTurn
+from core.services.replay import (
+    A_ACTOR, A_PARTICIPANT, A_PAYLOAD, A_SEQ, A_TS, A_TURN, ReplayEngine, action_name, build_replay,
+    decode_replay, encode_replay,
+)
+
+# Compactación de salas terminadas: su historial pasa a un único fichero de replay
+# (core.services.replay) en RaidReplayArchive y se borran las filas de las tablas calientes.
+# Los turnos no se conservan.
+ARCHIVE_FORMAT_VERSION = 2
+ARCHIVE_AFTER = timedelta(minutes=10)   # margen para que los clientes lean el estado final
+
+
+def _iso(dt):
+    return dt.isoformat() if dt else None
+
+
+def _room_dict(room: RaidRoom) -> dict:
+    return {
+        "id": room.id,
+        "name": room.name,
+        "raid_id": room.raid_id,
+        "state": room.state,
+        "wave_index": room.wave_index,
+        "random_seed": room.random_seed,
+        "created_at": _iso(room.created_at),
+        "closed": room.closed,
+    }
+
+
+def _participants(room: RaidRoom) -> list:
+    participants = (RaidParticipant.objects
+                    .filter(room=room)
+                    .select_related("member", "hero__hero")
+                    .order_by("joined_at", "id"))
+    return [
+        {
+            "id": p.id,
+            "member_id": p.member_id,
+            "member_name": p.member.name,
+            "hero_id": p.hero_id,
+            "hero_name": p.hero.hero.name if p.hero else None,
+            "player_color": p.player_color,
+            "is_alive": p.is_alive,
+        } for p in participants
+    ]
+
+
+def history_from_replay(room: RaidRoom, body: dict) -> dict:
+    """Historial de la sala (logs y enemigos finales) reconstruido a partir de su replay."""
+    final = ReplayEngine(body).final_state()
+    return {
+        "version": 2,
+        "room": _room_dict(room),
+        "participants": _participants(room),
+        "enemies": [
+            {
+                "id": inst_id,
+                "enemy_id": e["enemy_id"],
+                "name": e["name"],
+                "current_hp": e["hp"],
+                "max_hp": e["max_hp"],
+                "speed": e["speed"],
+                "is_alive": e["alive"],
+            } for inst_id, e in final["enemies"].items()
+        ],
+        "turns": [],
+        "logs": [
+            {
+                "seq": a[A_SEQ],
+                "ts": datetime.fromtimestamp(a[A_TS] / 1000, tz=dt_timezone.utc).isoformat(),
+                "action": action_name(a),
+                "actor": a[A_ACTOR],
+                "payload": a[A_PAYLOAD],
+                "participant_id": a[A_PARTICIPANT],
+                "turn_id": a[A_TURN],
+            } for a in body["actions"]
+        ],
+    }
+
+
+def archive_room(room_id: int) -> Optional[RaidReplayArchive]:
+    """
+    Archiva una sala terminada y borra sus logs, turnos y enemigos. Idempotente: si otra
+    ejecución la tiene bloqueada, ya está archivada o no ha terminado, no hace nada.
+    """
+    with transaction.atomic():
+        room = (RaidRoom.objects
+                .select_for_update(skip_locked=True)
+                .filter(pk=room_id, state="finished")
+                .first())
+        if room is None or RaidReplayArchive.objects.filter(room_id=room_id).exists():
+            return None
+
+        body = build_replay(room)
+        archive = RaidReplayArchive.objects.create(
+            room=room,
+            format_version=ARCHIVE_FORMAT_VERSION,
+            blob=encode_replay(body),
+            log_count=len(body["actions"]),
+            turn_count=RaidTurn.objects.filter(room_id=room_id).count(),
+            enemy_count=RaidEnemyInstance.objects.filter(room_id=room_id).count(),
+        )
+        # Orden: logs → turnos → enemigos, para no disparar los SET_NULL entre ellas
+        RaidDecisionLog.objects.filter(room_id=room_id).delete()
+        RaidTurn.objects.filter(room_id=room_id).delete()
+        RaidEnemyInstance.objects.filter(room_id=room_id).delete()
+    return archive
+
+
+def compact_finished_rooms(limit: int = 500, older_than: timedelta = ARCHIVE_AFTER) -> int:
+    """Archiva hasta `limit` salas terminadas hace más de `older_than`. Devuelve cuántas."""
+    room_ids = list(RaidRoom.objects
+                    .filter(state="finished", updated_at__lte=now() - older_than, archive__isnull=True)
+                    .order_by("updated_at")
+                    .values_list("id", flat=True)[:limit])
+    return sum(1 for rid in room_ids if archive_room(rid) is not None)
+
+
+def load_replay(room: RaidRoom) -> dict:
+    """Cuerpo del replay: del archivo si la sala está compactada, si no de las filas vivas."""
+    archive = RaidReplayArchive.objects.filter(room=room).first()
+    if archive is not None:
+        return decode_replay(archive.blob)
+    return build_replay(room)
+
+
+def load_history(room: RaidRoom) -> dict:
+    """Historial de la sala, del archivo o de las filas vivas (siempre en el formato del replay)."""
+    return history_from_replay(room, load_replay(room))
@@ -0,0 +1,91 @@
+# core/services/raid_log.py
+from __future__ import annotations
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from django.db import transaction
+from django.db.models import F
+
+from core.models import RaidDecisionLog, RaidRoom
+
+# Eventos de raid (RaidDecisionLog) en modo append-only y por lotes: dentro de buffered_log()
+# los log_event() se acumulan en memoria y se insertan con un único bulk_create al final del
+# bloque atómico, numerados con la secuencia por sala (RaidRoom.log_seq → RaidDecisionLog.seq).
+_buffer: ContextVar[Optional[List[RaidDecisionLog]]] = ContextVar("raid_log_buffer", default=None)
+
+def log_event(room, action_type: str, payload=None, participant=None, turn=None, actor: str = "") -> RaidDecisionLog:
+    """Registra un evento de la sala. Fuera de buffered_log() se escribe al momento."""
+    entry = RaidDecisionLog(
+        room_id=getattr(room, "pk", room),
+        action_type=action_type,
+        payload=payload,
+        participant=participant,
+        turn=turn,
+        actor=actor,
+    )
+    buf = _buffer.get()
+    if buf is None:
+        with transaction.atomic():
+            flush([entry])
+    else:
+        buf.append(entry)
+    return entry
+
+
+def flush(entries: List[RaidDecisionLog]) -> None:
+    """
+    Asigna a cada entrada su número de secuencia dentro de su sala e inserta todas de una vez.
+    Debe ejecutarse dentro de una transacción: el UPDATE del contador bloquea la fila de la
+    sala hasta el commit, así dos escritores de la misma sala no reciben la misma secuencia.
+    """
+    if not entries:
+        return
+    by_room = defaultdict(list)
+    for entry in entries:
+        by_room[entry.room_id].append(entry)
+
+    for room_id, items in by_room.items():
+        RaidRoom.objects.filter(pk=room_id).update(log_seq=F("log_seq") + len(items))
+        last = RaidRoom.objects.filter(pk=room_id).values_list("log_seq", flat=True).get()
+        first = last - len(items) + 1
+        for i, entry in enumerate(items):
+            entry.seq = first + i
+
+    RaidDecisionLog.objects.bulk_create(entries)
+
+
+def flush_buffer() -> None:
+    """
+    Vuelca ya lo acumulado en el buffered_log() en curso. Necesario antes de borrar filas a las
+    que apuntan eventos pendientes (p. ej. los turnos al reconstruir el orden): así el borrado
+    las pone a NULL en vez de dejar la FK colgando al volcar.
+    """
+    buf = _buffer.get()
+    if buf:
+        flush(list(buf))
+        buf.clear()
+
+
+@contextmanager
+def buffered_log():
+    """
+    Bloque atómico cuyos log_event() se vuelcan juntos al final. Se puede anidar (el bloque
+    exterior es el que vuelca) y usar como decorador. Si el bloque falla no se escribe nada.
+    """
+    if _buffer.get() is not None:
+        yield
+        return
+
+    entries: List[RaidDecisionLog] = []
+    token = _buffer.set(entries)
+    try:
+        with transaction.atomic():
+            yield
+            _buffer.reset(token)
+            token = None
+            flush(entries)
+    finally:
+        if token is not None:
+            _buffer.reset(token)
@@ -0,0 +1,265 @@
+# core/services/raid_rewards.py
+from __future__ import annotations
+import os
+import random
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Iterable, Optional
+
+import django
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from core.models import (
+    ExperienceCurve, Member, PlayerHero, PlayerResource, Raid, RaidClear, RaidReward, RaidRewardLedger, RaidRoom,
+)
+
+# Recompensas de raid (botín RaidReward + XP Raid.hero_xp por héroe): reparto al terminar cada
+# sala y barrido de raids ya completadas (N victorias en una sola transacción, sin crear salas).
+#   - Barrido puro: resultado esperado en forma cerrada (N × probabilidad × cantidad media).
+#   - Barrido simulado: N auto-batallas en memoria (auto_battle.HeadlessRaid); el botín se tira
+#     por cada victoria. La vida de los héroes no cambia. En las peticiones se simula en el propio
+#     proceso; el pool de procesos (sweep_pool) queda para los comandos de gestión.
+MAX_SWEEP = 100
+
+
+def sweep_workers() -> int:
+    return int(getattr(settings, "RAID_SWEEP_WORKERS", min(4, os.cpu_count() or 1)))
+
+
+# ---- botín ----
+def reward_table(raid_id: int) -> list:
+    """[(resource_type_id, mínimo, máximo, probabilidad), ...] de la raid."""
+    return list(RaidReward.objects
+                .filter(raid_id=raid_id)
+                .values_list("resource_type_id", "min_amount", "max_amount", "chance"))
+
+
+def expected_rewards(rewards: list, times: int) -> dict:
+    """Botín esperado de `times` victorias: {resource_type_id: cantidad}."""
+    totals = {}
+    for rt_id, lo, hi, chance in rewards:
+        totals[rt_id] = totals.get(rt_id, 0) + times * min(1.0, chance) * (lo + hi) / 2
+    return {rt_id: int(round(amount)) for rt_id, amount in totals.items() if round(amount) > 0}
+
+
+def roll_rewards(rewards: list, times: int, rng=random) -> dict:
+    """Botín tirado victoria a victoria: {resource_type_id: cantidad}."""
+    totals = {}
+    for _ in range(times):
+        for rt_id, lo, hi, chance in rewards:
+            if rng.random() < chance:
+                totals[rt_id] = totals.get(rt_id, 0) + rng.randint(lo, hi)
+    return totals
+
+
+# ---- abonos en bloque ----
+def credit_resources(credits: dict) -> None:
+    """
+    Suma {(member_id, resource_type_id): cantidad} a PlayerResource: una consulta de lectura
+    bloqueante, un bulk_update para las filas existentes y un bulk_create para las nuevas.
+    """
+    credits = {key: amount for key, amount in credits.items() if amount > 0}
+    if not credits:
+        return
+    member_ids = {m for m, _ in credits}
+    rt_ids = {rt for _, rt in credits}
+    rows = {}
+    for pr in (PlayerResource.objects
+               .select_for_update()
+               .filter(member_id__in=member_ids, resource_type_id__in=rt_ids)
+               .order_by("id")):
+        rows.setdefault((pr.member_id, pr.resource_type_id), pr)
+
+    existing, new = [], []
+    for (member_id, rt_id), amount in credits.items():
+        pr = rows.get((member_id, rt_id))
+        if pr is None:
+            new.append(PlayerResource(member_id=member_id, resource_type_id=rt_id, amount=amount))
+        else:
+            pr.amount += amount
+            existing.append(pr)
+    if existing:
+        PlayerResource.objects.bulk_update(existing, ["amount"])
+    if new:
+        PlayerResource.objects.bulk_create(new)
+
+
+def grant_hero_xp(xp: dict) -> list:
+    """Suma {player_hero_id: xp} con un único bulk_update. Devuelve los PlayerHero actualizados."""
+    xp = {ph_id: amount for ph_id, amount in xp.items() if amount > 0}
+    if not xp:
+        return []
+    heroes = list(PlayerHero.objects.select_for_update().filter(id__in=list(xp)).only("id", "member_id", "experience"))
+    for ph in heroes:
+        ph.experience = int(ph.experience) + int(xp[ph.id])
+    PlayerHero.objects.bulk_update(heroes, ["experience"])
+    return heroes
+
+
+def record_clears(raid_id: int, member_ids: Iterable[int]) -> None:
+    """Anota una victoria en la raid para cada miembro (habilita el barrido)."""
+    member_ids = set(member_ids)
+    if not member_ids:
+        return
+    updated = set(RaidClear.objects
+                  .filter(raid_id=raid_id, member_id__in=member_ids)
+                  .values_list("member_id", flat=True))
+    if updated:
+        RaidClear.objects.filter(raid_id=raid_id, member_id__in=updated).update(clears=F("clears") + 1)
+    RaidClear.objects.bulk_create(
+        [RaidClear(raid_id=raid_id, member_id=m, clears=1) for m in member_ids - updated],
+        ignore_conflicts=True,
+    )
+
+
+# ---- reparto al terminar una sala ----
+def distribute_room_rewards(room: RaidRoom, winner: str, rng=None) -> Optional[dict]:
+    """
+    Reparte las recompensas de una sala terminada a todos sus participantes. Idempotente: la sala
+    se reclama con un UPDATE condicional y una segunda llamada no hace nada (devuelve None).
+
+    Victoria: Raid.hero_xp a cada héroe del equipo activo, una tirada de botín por miembro y una
+    victoria más en RaidClear (record_clears).
+    Derrota/timeout: XP proporcional a las oleadas superadas, sin botín.
+    XP con un bulk_update, recursos con un único abono agregado y una fila de RaidRewardLedger
+    por miembro. Devuelve {"xp_per_hero", "members": {member_id: {"heroes", "resources"}}}.
+    """
+    from core.models import TeamSlot
+
+    if not room.raid_id:
+        return None
+    with transaction.atomic():
+        if not RaidRoom.objects.filter(pk=room.pk, rewards_granted=False).update(rewards_granted=True):
+            return None
+        room.rewards_granted = True
+        raid = room.raid
+        member_ids = list(room.participants.values_list("member_id", flat=True))
+        heroes_by_member = {}
+        for member_id, ph_id in (TeamSlot.objects
+                                 .filter(team__owner_id__in=member_ids, team__is_active=True)
+                                 .values_list("team__owner_id", "player_hero_id")):
+            heroes_by_member.setdefault(member_id, []).append(ph_id)
+
+        if winner == "heroes":
+            record_clears(raid.id, member_ids)
+            xp = raid.hero_xp
+            rewards = reward_table(raid.id)
+            rng = rng or random.Random(room.random_seed or None)
+            loot = {member_id: roll_rewards(rewards, 1, rng) for member_id in member_ids}
+        else:
+            total_waves = raid.waves.count()
+            xp = raid.hero_xp * min(room.wave_index, total_waves) // total_waves if total_waves else 0
+            loot = {}
+
+        heroes = grant_hero_xp({ph_id: xp for ids in heroes_by_member.values() for ph_id in ids})
+        PlayerHero.prime_level_caps(heroes)
+        levels = {}
+        for ph in heroes:
+            cap = ph.max_level_cap
+            before = min(ExperienceCurve.level_from_xp(ph.experience - xp), cap)
+            levels[ph.id] = [ph.id, before, min(ExperienceCurve.level_from_xp(ph.experience), cap)]
+
+        credit_resources({(member_id, rt_id): amount
+                          for member_id, items in loot.items() for rt_id, amount in items.items()})
+        summary = {"xp_per_hero": xp, "members": {}}
+        ledger = []
+        for member_id in member_ids:
+            hero_levels = [levels[ph_id] for ph_id in heroes_by_member.get(member_id, []) if ph_id in levels]
+            resources = {str(rt_id): amount for rt_id, amount in loot.get(member_id, {}).items()}
+            ledger.append(RaidRewardLedger(room_id=room.pk, member_id=member_id, xp_per_hero=xp,
+                                           heroes=hero_levels, resources=resources))
+            summary["members"][str(member_id)] = {"heroes": hero_levels, "resources": resources}
+        RaidRewardLedger.objects.bulk_create(ledger)
+    return summary
+
+
+# ---- simulación ----
+def _simulate_chunk(table: dict, heroes: list, waves: list, seeds: list) -> int:
+    """Victorias de una tanda de auto-batallas (en el propio proceso o en los del pool)."""
+    from core.services.auto_battle import HeadlessRaid
+    return sum(HeadlessRaid(table, heroes, waves, rng=random.Random(seed)).run().winner == "heroes"
+               for seed in seeds)
+
+
+def sweep_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Pool de procesos para simulaciones largas fuera de las peticiones (comandos de gestión). Cada
+    worker ejecuta django.setup() al arrancar: con spawn/forkserver no hereda el registro de apps.
+    """
+    return ProcessPoolExecutor(max_workers=workers or sweep_workers(), initializer=django.setup)
+
+
+def simulate_clears(member: Member, raid: Raid, times: int, rng=random,
+                    executor: Optional[Executor] = None) -> int:
+    """
+    Victorias en `times` auto-batallas del equipo activo del miembro (desde su vida actual).
+    Sin `executor` se simula en el propio proceso (caso de las peticiones web); con uno, las
+    tandas se reparten entre sus workers y, si el pool falla, se simula aquí.
+    """
+    from core.services.auto_battle import hero_snapshot, raid_waves
+    from core.services.skills import member_skill_table
+
+    table = member_skill_table(member.id, raid.id)
+    heroes, waves = hero_snapshot(table), raid_waves(raid)
+    seeds = [rng.randint(1, 2 ** 31) for _ in range(times)]
+    if executor is None:
+        return _simulate_chunk(table, heroes, waves, seeds)
+
+    workers = sweep_workers()
+    chunks = [seeds[i::workers] for i in range(workers)]
+    try:
+        futures = [executor.submit(_simulate_chunk, table, heroes, waves, chunk) for chunk in chunks if chunk]
+        return sum(f.result() for f in futures)
+    except Exception:
+        return _simulate_chunk(table, heroes, waves, seeds)
+
+
+# ---- barrido ----
+def _sweepable(member: Member, raid: Raid, lock: bool = False) -> tuple[RaidClear, list]:
+    """(RaidClear, héroes del equipo activo) o RaidError si el miembro no puede barrer la raid."""
+    from core.models import TeamSlot
+    from core.services.raid_service import RaidError
+
+    clears = RaidClear.objects.select_for_update() if lock else RaidClear.objects
+    clear = clears.filter(member=member, raid=raid).first()
+    if clear is None:
+        raise RaidError("Completa la raid antes de barrerla")
+    hero_ids = list(TeamSlot.objects
+                    .filter(team__owner=member, team__is_active=True)
+                    .values_list("player_hero_id", flat=True))
+    if not hero_ids:
+        raise RaidError("Tu equipo no tiene héroes asignados")
+    return clear, hero_ids
+
+
+def sweep_raid(member: Member, raid: Raid, times: int, simulated: bool = False,
+               executor: Optional[Executor] = None) -> dict:
+    """
+    Concede `times` victorias de una raid ya completada: XP para cada héroe del equipo activo y
+    botín, sin salas. En modo simulado solo cuentan las victorias simuladas; las simulaciones se
+    hacen antes de abrir la transacción, que solo bloquea RaidClear para abonar.
+    """
+    from core.services.raid_service import RaidError
+
+    if not 1 <= times <= MAX_SWEEP:
+        raise RaidError(f"Se puede barrer entre 1 y {MAX_SWEEP} veces")
+    _sweepable(member, raid)
+
+    rewards = reward_table(raid.id)
+    if simulated:
+        wins = simulate_clears(member, raid, times, executor=executor)
+        loot = roll_rewards(rewards, wins)
+    else:
+        wins = times
+        loot = expected_rewards(rewards, times)
+
+    xp = raid.hero_xp * wins
+    with transaction.atomic():
+        clear, hero_ids = _sweepable(member, raid, lock=True)
+        grant_hero_xp({ph_id: xp for ph_id in hero_ids})
+        credit_resources({(member.id, rt_id): amount for rt_id, amount in loot.items()})
+        if wins:
+            RaidClear.objects.filter(pk=clear.pk).update(sweeps=F("sweeps") + wins)
+    return {"times": times, "wins": wins, "xp_per_hero": xp, "heroes": hero_ids,
+            "resources": {str(rt_id): amount for rt_id, amount in loot.items()}}
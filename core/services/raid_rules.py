@@ -0,0 +1,149 @@
+# core/services/raid_rules.py
+from __future__ import annotations
+from typing import Callable, Optional, Sequence
+
+from core.models import PassiveTrigger, SkillEffectType, SkillSlot, SkillTarget
+from core.services.battle_state import DEFAULT_EFFECT_TURNS, BattleState
+from core.services.combat_core import attack_spec
+
+# Reglas de las raids comunes a la raid en vivo (raid_service, passives, effects) y a la
+# auto-batalla en memoria (auto_battle.HeadlessRaid): qué habilidad puede usar un héroe, a quién
+# afecta, la ira, el ataque enemigo y el log de cada acción. No tocan la base de datos: trabajan
+# con claves de combatiente (ids de modelo o actores) y cada modo las traduce a sus instancias o
+# a sus Fighter. Las listas de vivos se piden con callables para que la raid en vivo solo consulte
+# la BD cuando el tipo de objetivo lo necesita.
+ENEMY_VARIANCE = 0.2            # ataque enemigo: ±20 % de daño verdadero
+PERMANENT_TURNS = 1_000_000     # duración de los efectos de pasivas ALWAYS
+
+AliveFn = Callable[[], list]
+
+
+# ---- héroes ----
+def usable_skill(state: BattleState, hero_id: int, skill: dict) -> Optional[dict]:
+    """La habilidad si el héroe puede usarla ahora; None si es la definitiva y no tiene ira suficiente."""
+    if skill["slot"] == SkillSlot.ULTIMATE and state.rage.get(hero_id, 0) < skill["rage_cost"]:
+        return None
+    return skill
+
+
+def skill_targets(skill: dict, hero_id: int, target, alive_enemies: AliveFn, alive_heroes: AliveFn,
+                  hp_fraction: Callable, fallback: bool = True) -> tuple[list, list]:
+    """
+    (enemigos, héroes) afectados por una habilidad activa. `target` es el enemigo elegido: si ya
+    no está vivo y `fallback`, se ataca al primer enemigo vivo. El aliado objetivo es el de menor
+    fracción de vida (`hp_fraction`). El daño solo alcanza a enemigos y la curación solo a héroes.
+    """
+    kind = skill["target"]
+    enemies, heroes = [], []
+    if kind == SkillTarget.ENEMY_TEAM:
+        enemies = alive_enemies()
+    elif kind == SkillTarget.ENEMY_SINGLE:
+        alive = alive_enemies()
+        if target in alive:
+            enemies = [target]
+        elif (fallback or target is None) and alive:
+            enemies = alive[:1]
+    elif kind == SkillTarget.SELF:
+        heroes = [hero_id]
+    else:
+        allies = alive_heroes()
+        if kind == SkillTarget.ALLY_TEAM:
+            heroes = allies
+        elif allies:
+            heroes = [min(allies, key=hp_fraction)]
+
+    if skill["effect"] == SkillEffectType.DAMAGE:
+        heroes = []
+    elif skill["effect"] == SkillEffectType.HEAL:
+        enemies = []
+    return enemies, heroes
+
+
+def settle_rage(state: BattleState, table: dict, hero_id: int, skill: dict, hit: bool) -> int:
+    """Ira tras la acción: coste de la habilidad, ganancia y bonus por golpe (rage_on_hit). Devuelve la ira."""
+    caster = table["heroes"][hero_id]
+    state.spend_rage(hero_id, skill["rage_cost"])
+    state.gain_rage(hero_id, skill["rage_gain"] + (caster["rage_on_hit"] if hit else 0), caster["rage_max"])
+    return state.rage[hero_id]
+
+
+def hero_action_log(skill: dict, hero_id: int, enemy_hits: list, hero_hits: list, crit: bool,
+                    rage: int) -> tuple[str, dict]:
+    """(action_type, payload) de la acción: daño a un objetivo como hero_attack, el resto como hero_skill."""
+    effect = skill["effect"]
+    if effect == SkillEffectType.DAMAGE and skill["target"] == SkillTarget.ENEMY_SINGLE:
+        enemy_id, dmg, remaining = enemy_hits[0]
+        action_type = "hero_attack"
+        payload = {"enemy_id": enemy_id, "dmg": dmg, "hero_id": hero_id, "enemy_remaining_hp": remaining}
+    else:
+        action_type = "hero_skill"
+        payload = {"hero_id": hero_id, "effect": effect, "target": skill["target"],
+                   "enemies": enemy_hits, "heroes": hero_hits}
+        if effect in (SkillEffectType.BUFF, SkillEffectType.DEBUFF):
+            payload.update(percent=skill["percent"], stats=skill["stats"], turns=DEFAULT_EFFECT_TURNS)
+    payload["skill_id"] = skill["id"]
+    payload["rage"] = rage
+    if crit:
+        payload["crit"] = True
+    return action_type, payload
+
+
+# ---- pasivas ----
+def passive_turns(passive: dict) -> int:
+    return PERMANENT_TURNS if passive["trigger"] == PassiveTrigger.ALWAYS else DEFAULT_EFFECT_TURNS
+
+
+def passive_targets(passive: dict, hero_id: int, related: Sequence, alive_enemies: AliveFn,
+                    alive_heroes: AliveFn) -> Optional[tuple[list, list]]:
+    """
+    (enemigos, héroes) de una pasiva; `related` son los enemigos vivos del evento (ver passives).
+    None si no tiene a quién aplicarse o es un buff/debuff sin stats.
+    """
+    effect, kind = passive["effect"], passive["target"]
+    if effect in (SkillEffectType.BUFF, SkillEffectType.DEBUFF) and not passive["stats"]:
+        return None
+    enemies, heroes = [], []
+    if effect != SkillEffectType.HEAL:
+        if kind == SkillTarget.ENEMY_TEAM:
+            enemies = alive_enemies()
+        elif kind == SkillTarget.ENEMY_SINGLE:
+            enemies = list(related[:1])
+    if effect != SkillEffectType.DAMAGE:
+        if kind in (SkillTarget.SELF, SkillTarget.ALLY_SINGLE):
+            heroes = [hero_id] if hero_id in alive_heroes() else []
+        elif kind == SkillTarget.ALLY_TEAM:
+            heroes = alive_heroes()
+    if not enemies and not heroes:
+        return None
+    return enemies, heroes
+
+
+def passive_log(passive: dict, hero_id: int, enemy_hits: list, hero_hits: list, target_actors: list) -> dict:
+    """Payload del log "passive"."""
+    effect = passive["effect"]
+    payload = {"hero_id": hero_id, "skill_id": passive["id"], "trigger": passive["trigger"], "effect": effect}
+    if effect == SkillEffectType.DAMAGE:
+        payload["enemies"] = enemy_hits
+    elif effect == SkillEffectType.HEAL:
+        payload["heroes"] = hero_hits
+    else:
+        payload.update(targets=target_actors, percent=passive["percent"], stats=passive["stats"])
+    return payload
+
+
+# ---- enemigos ----
+def enemy_strike_spec(table: dict, enemy_id: int, name: str, attack: float = 0) -> dict:
+    """Ataque de un enemigo: daño verdadero con variación; ataque de la tabla (o `attack` si no está)."""
+    stats = table["enemies"].get(enemy_id)
+    return attack_spec(name, stats["attack"] if stats else attack, variance=ENEMY_VARIANCE)
+
+
+def enemy_hit_log(member_id: int, hero_id: int, hero_name: str, dmg: int, old_hp: int,
+                  remaining: int) -> tuple[str, dict]:
+    """(action_type, payload) del golpe de un enemigo: hero_killed si el héroe cae, si no enemy_attack."""
+    payload = {"target_member_id": member_id, "target_hero": hero_name, "target_hero_id": hero_id, "dmg": dmg}
+    if remaining <= 0:
+        payload["old_hp"] = old_hp
+        return "hero_killed", payload
+    payload["remaining_hp"] = remaining
+    return "enemy_attack", payload
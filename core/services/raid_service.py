@@ -1,21 +1,71 @@
+from datetime import timedelta
+
 from django.db import transaction
 from django.utils.timezone import now
 from django.http import JsonResponse
 from core.models import (
-    RaidRoom, RaidParticipant, RaidEnemyInstance, RaidTurn, RaidDecisionLog,
-    Member, PlayerHero, Enemy, Raid, RaidWave, RaidEnemy, Team
+    RaidRoom, RaidParticipant, RaidEnemyInstance, RaidTurn,
+    Member, PlayerHero, Enemy, Raid, RaidWave, RaidEnemy, Team,
+    PassiveTrigger, SkillEffectType, SkillTarget,
+)
+from core.services.catalog import random_pick
+from core.services.raid_log import buffered_log, flush_buffer, log_event
+from core.services.battle_state import (
+    STAT_SPEED, clear_battle_state, enemy_actor, hero_actor,
+    load_battle_state, save_battle_state, snapshot_battle_state,
 )
+from core.services.effects import apply_skill, enemy_strike
+from core.services.hero_hp import resume_regen, settle_regen
+from core.services.passives import fire, fire_battle_start
+from core.services.raid_rules import enemy_hit_log, hero_action_log, settle_rage, skill_targets, usable_skill
+from core.services.raid_rewards import distribute_room_rewards
+from core.services.skills import compile_skill_table, hero_skill, skill_table
 import random
 
 class RaidError(Exception):
     pass
 
 
+# Ciclo de vida de las salas en lobby: waiting → ready a los 5 s, auto-start a los 240 s.
+# Ambos estados siguen admitiendo jugadores hasta que la sala empieza.
+LOBBY_STATES = ("waiting", "ready")
+AUTO_READY_SECONDS = 5
+AUTO_START_SECONDS = 240
+
+
+def room_rng(room: RaidRoom) -> random.Random:
+    """RNG sembrado de la sala (reproducible para la misma sala)."""
+    return random.Random(room.random_seed or int(now().timestamp()))
+
+
+def _hero_snapshot(room: RaidRoom) -> list:
+    """[[player_hero_id, member_id, nombre, hp, max_hp, velocidad], ...] de los equipos activos (replay)."""
+    from core.models import TeamSlot
+    slots = (TeamSlot.objects
+             .filter(team__owner__raid_participations__room=room, team__is_active=True)
+             .select_related("player_hero__hero", "team")
+             .order_by("team__owner_id", "position"))
+    return [
+        [s.player_hero_id, s.team.owner_id, s.player_hero.hero.name, s.player_hero.current_hp,
+         s.player_hero.s_hp(), s.player_hero.s_speed()]
+        for s in slots
+    ]
+
+
+def _enemy_snapshot(instances) -> list:
+    """[[instance_id, enemy_id, nombre, hp, max_hp, velocidad], ...] (replay)."""
+    return [[e.id, e.enemy_id, e.enemy.name, e.current_hp, e.max_hp, e.speed] for e in instances]
+
+
 def matchmaking_join(member: Member, raid: Raid = None, team: Team = None) -> RaidRoom:
     """
     Unirse al matchmaking para una raid específica.
-    Busca una sala existente o crea una nueva.
+    La asignación de sala la hace la cola de matchmaking (core.services.matchmaking):
+    asientos asignados en lote y de forma atómica, sin sobrellenar salas, emparejando
+    equipos de poder similar (la tolerancia de banda crece con la espera de la sala).
     """
+    from core.services.matchmaking import matchmaking_queue, JoinRequest, team_power, power_band
+
     if not raid:
         raise RaidError("Se requiere especificar una raid")
 
@@ -24,65 +74,32 @@ def matchmaking_join(member: Member, raid: Raid = None, team: Team = None) -> Ra
         if not team:
             raise RaidError("Necesitas un equipo para participar en raids")
 
-    # Verificar que el equipo tenga al menos un héroe vivo
+    # Verificar que el equipo tenga al menos un héroe vivo (con la regeneración pendiente ya guardada)
+    settle_regen(team.slots.values_list("player_hero_id", flat=True))
     alive_heroes = team.slots.filter(player_hero__current_hp__gt=0).count()
     if alive_heroes == 0:
         raise RaidError("Todos tus héroes están muertos. Cúralos antes de participar en raids.")
 
-    # Buscar sala existente para esta raid específica
-    from django.db.models import Count
-    room = (RaidRoom.objects
-            .filter(state="waiting", raid=raid)
-            .annotate(participant_count=Count('participants'))
-            .filter(participant_count__lt=raid.max_players)
-            .order_by("created_at")
-            .first())
-
-    if not room:
-        # Crear nueva sala
-        room = RaidRoom.objects.create(
-            owner=member,
-            raid=raid,
-            max_players=raid.max_players,
-            random_seed=random.randint(1, 10_000),
-            name=f"Sala de {raid.name}"
-        )
-
-    # Verificar que el miembro no esté ya en la sala
-    if room.participants.filter(member=member).exists():
-        return room
-
-    # Añadir participante con su equipo (por ahora solo el primer héroe del equipo)
-    team_hero = team.slots.first()
+    # Participante con su equipo (por ahora solo el primer héroe del equipo)
+    team_hero = team.slots.select_related("player_hero").first()
     if not team_hero:
         raise RaidError("Tu equipo no tiene héroes asignados")
 
-    # Asignar color basado en el orden de llegada
-    participant_count = room.participants.count()
-    player_color = (participant_count % 4) + 1  # Colores 1-4
-
-    p = RaidParticipant.objects.create(
-        room=room,
-        member=member,
-        hero=team_hero.player_hero,
-        is_ready=True,
-        player_color=player_color
+    band = power_band(team_power(team))
+    return matchmaking_queue.join(
+        raid, JoinRequest(member=member, team=team, hero=team_hero.player_hero, band=band)
     )
 
-    RaidDecisionLog.objects.create(
-        room=room,
-        participant=None,
-        action_type="join",
-        payload={"member_id": member.id, "hero_id": team_hero.player_hero.id, "team_id": team.id}
-    )
-
-    # Si la sala está llena, iniciar automáticamente
-    if room.participants.count() >= room.max_players:
-        start_structured_raid(room)
 
-    return room
+def _room_hero_ids(room_ids):
+    """Ids de los héroes que combaten en las salas: los equipos activos de sus participantes."""
+    from core.models import TeamSlot
+    return (TeamSlot.objects
+            .filter(team__owner__raid_participations__room_id__in=list(room_ids), team__is_active=True)
+            .values_list("player_hero_id", flat=True))
 
 
+@buffered_log()
 def start_structured_raid(room: RaidRoom):
     """Iniciar una raid estructurada con oleadas definidas"""
     if room.state not in ["waiting", "ready"]:
@@ -91,12 +108,11 @@ def start_structured_raid(room: RaidRoom):
     if not room.raid:
         raise RaidError("La sala no tiene una raid asignada")
 
-    # Inicializar la primera oleada
-    room.wave_index = 0
-    spawn_wave_enemies(room)
+    # La vida regenerada desde la última batalla cuenta para el orden de turnos y los snapshots
+    settle_regen(_room_hero_ids([room.id]))
 
-    # Build first turn order
-    build_turn_order(room)
+    # En curso antes de generar la oleada y el orden de turnos (solo se hacen en salas en curso)
+    room.wave_index = 0
     room.state = "in_progress"
     room.last_tick_at = now()
 
@@ -104,13 +120,32 @@ def start_structured_raid(room: RaidRoom):
     from datetime import timedelta
     room.expires_at = (room.created_at or now()) + timedelta(minutes=30)
     room.closed = False
-    room.save(update_fields=["state", "last_tick_at", "expires_at", "closed", "wave_index"])
+    room.open_seats = 0  # deja de admitir jugadores
+    room.save(update_fields=["state", "last_tick_at", "expires_at", "closed", "wave_index", "open_seats"])
+
+    # Inicializar la primera oleada (una raid sin oleadas termina aquí)
+    spawn_wave_enemies(room)
+    if room.state != "in_progress":
+        return
+
+    # Build first turn order
+    build_turn_order(room)
+    table = compile_skill_table(room)
 
-    RaidDecisionLog.objects.create(
+    log_event(
         room=room,
         action_type="start",
-        payload={"raid_id": room.raid.id, "wave_index": room.wave_index}
+        payload={"raid_id": room.raid.id, "wave_index": room.wave_index, "heroes": _hero_snapshot(room)}
     )
+    _start_battle_state(room, table)
+
+
+def _start_battle_state(room: RaidRoom, table: dict) -> None:
+    """Ira inicial y pasivas de inicio de combate; el estado resultante es el primer snapshot."""
+    state = load_battle_state(room)
+    state.init_rage(table["heroes"])
+    fire_battle_start(room, table, state)
+    snapshot_battle_state(room, state)
 
 
 def spawn_wave_enemies(room: RaidRoom):
@@ -129,65 +164,83 @@ def spawn_wave_enemies(room: RaidRoom):
     room.enemies.all().delete()
 
     # Spawn enemies for this wave
-    for raid_enemy in wave.enemies.all():
+    instances = []
+    for raid_enemy in wave.enemies.select_related("enemy"):
         for _ in range(raid_enemy.quantity):
             enemy = raid_enemy.enemy
             level_mod = raid_enemy.level_modifier
 
-            RaidEnemyInstance.objects.create(
+            instances.append(RaidEnemyInstance(
                 room=room,
                 enemy=enemy,
                 max_hp=int(enemy.base_hp * level_mod),
                 current_hp=int(enemy.base_hp * level_mod),
                 speed=int(enemy.speed * level_mod),
-            )
+            ))
+    RaidEnemyInstance.objects.bulk_create(instances)
 
-    RaidDecisionLog.objects.create(
+    log_event(
         room=room,
         action_type="wave_start",
-        payload={"wave_number": wave.wave_number, "wave_name": wave.name}
+        payload={"wave_number": wave.wave_number, "wave_name": wave.name, "enemies": _enemy_snapshot(instances)}
     )
 
 
+@buffered_log()
 def start_raid(room: RaidRoom, enemy: Enemy | None = None):
     """Función legacy para raids simples (compatibilidad)"""
     if room.state not in ["waiting", "ready"]:
         return
-    rng = random.Random(room.random_seed or int(now().timestamp()))
     # Create a simple single-enemy wave for test
-    enemy = enemy or Enemy.objects.order_by("?").first()
+    enemy = enemy or random_pick(Enemy, rng=room_rng(room))
     if not enemy:
         raise RaidError("No enemies defined")
-    RaidEnemyInstance.objects.create(
+    instance = RaidEnemyInstance.objects.create(
         room=room,
         enemy=enemy,
         max_hp=enemy.base_hp,
         current_hp=enemy.base_hp,
         speed=enemy.speed,
     )
-    # Build first turn order
-    build_turn_order(room)
     room.state = "in_progress"
     room.last_tick_at = now()
     # Set expiration in 20 minutes
     from datetime import timedelta
     room.expires_at = (room.created_at or now()) + timedelta(minutes=20)
     room.closed = False
-    room.save(update_fields=["state", "last_tick_at", "expires_at", "closed"])
-    RaidDecisionLog.objects.create(room=room, action_type="start", payload={"enemy_id": enemy.id})
+    room.open_seats = 0  # deja de admitir jugadores
+    room.save(update_fields=["state", "last_tick_at", "expires_at", "closed", "open_seats"])
+    # Build first turn order
+    build_turn_order(room)
+    table = compile_skill_table(room)
+    log_event(room=room, action_type="start", payload={
+        "enemy_id": enemy.id,
+        "heroes": _hero_snapshot(room),
+        "enemies": _enemy_snapshot([instance]),
+    })
+    _start_battle_state(room, table)
 
 
 def build_turn_order(room: RaidRoom):
     """
     Construir orden de turnos basado en velocidad de TODOS los héroes y enemigos.
-    Cada héroe individual tiene su propio turno, no por jugador.
+    Cada héroe individual tiene su propio turno, no por jugador. Solo en salas en curso.
     """
     from core.models import Team, RaidTurn
 
-    # Clear existing unresolved future turns
+    if room.state != "in_progress":
+        return
+
+    # Clear existing unresolved future turns (los eventos pendientes que apuntan a ellos, antes)
+    flush_buffer()
     room.turns.all().delete()
     order = []
 
+    # Nuevo ciclo: caducan los efectos vencidos y se guarda el snapshot del estado de combate
+    state = load_battle_state(room)
+    state.advance()
+    snapshot_battle_state(room, state)
+
     # Añadir TODOS los héroes vivos de TODOS los jugadores
     for participant in room.participants.select_related("member").all():
         team = Team.objects.filter(owner=participant.member, is_active=True).first()
@@ -198,13 +251,13 @@ def build_turn_order(room: RaidRoom):
             )
             for slot in team_slots:
                 hero = slot.player_hero
-                speed = hero.s_speed()
+                speed = state.effective(hero_actor(hero.id), STAT_SPEED, hero.s_speed())
                 order.append(("hero", speed, participant, hero))
 
     # Añadir todos los enemigos vivos
     for enemy in room.enemies.all():
         if enemy.is_alive:
-            order.append(("enemy", enemy.speed, enemy, None))
+            order.append(("enemy", state.effective(enemy_actor(enemy.id), STAT_SPEED, enemy.speed), enemy, None))
 
     # Ordenar por velocidad (mayor velocidad = primero)
     order.sort(key=lambda x: x[1], reverse=True)
@@ -234,6 +287,38 @@ def get_current_turn(room: RaidRoom):
     return room.turns.filter(resolved=False).order_by("index").first()
 
 
+@buffered_log()
+def _claim_lobby_room(room: RaidRoom) -> RaidRoom | None:
+    """
+    Bloquea la sala si sigue en el lobby y nadie más la tiene (dentro de una transacción), para
+    que un auto-start no se solape con otro ni con _fill_room. None si ya no está disponible.
+    """
+    return (RaidRoom.objects
+            .select_for_update(skip_locked=True)
+            .filter(pk=room.pk, state__in=LOBBY_STATES, closed=False)
+            .first())
+
+
+@buffered_log()
+def start_lobby_room(room: RaidRoom, enemy: Enemy | None = None) -> RaidRoom | None:
+    """
+    Único paso lobby → en curso: reclama la sala (_claim_lobby_room) y arranca la raid estructurada
+    o, si la sala no tiene raid, la legacy contra `enemy` (uno al azar si no se indica). Devuelve
+    la sala arrancada, o None si otro proceso ya la tiene o no hay enemigos.
+    """
+    claimed = _claim_lobby_room(room)
+    if claimed is None:
+        return None
+    if claimed.raid_id:
+        start_structured_raid(claimed)
+    else:
+        enemy = enemy or random_pick(Enemy, rng=room_rng(claimed))
+        if not enemy:
+            return None
+        start_raid(claimed, enemy=enemy)
+    return claimed
+
+
 def process_tick(room: RaidRoom):
     """Procesar tick de la raid - se ejecuta cada segundo"""
     from django.utils.timezone import now as tz_now
@@ -241,10 +326,10 @@ def process_tick(room: RaidRoom):
     # Auto-ready después de 5 segundos en waiting
     if room.state == "waiting":
         time_waiting = (tz_now() - room.created_at).total_seconds()
-        if time_waiting >= 5:
+        if time_waiting >= AUTO_READY_SECONDS:
             room.state = "ready"
             room.save(update_fields=["state"])
-            RaidDecisionLog.objects.create(
+            log_event(
                 room=room,
                 action_type="auto_ready",
                 payload={"seconds_waited": time_waiting}
@@ -254,21 +339,16 @@ def process_tick(room: RaidRoom):
     # Auto-start después de 4 minutos en ready
     if room.state == "ready":
         time_waiting = (tz_now() - room.created_at).total_seconds()
-        if time_waiting >= 240:  # 4 minutos = 240 segundos
-            # Auto-iniciar la raid
-            if room.raid:
-                start_structured_raid(room)
-            else:
-                from core.models import Enemy
-                enemy = Enemy.objects.order_by("?").first()
-                if enemy:
-                    start_raid(room, enemy=enemy)
-
-            RaidDecisionLog.objects.create(
-                room=room,
-                action_type="auto_start",
-                payload={"seconds_waited": time_waiting, "reason": "timeout_4min"}
-            )
+        if time_waiting >= AUTO_START_SECONDS:
+            with buffered_log():
+                claimed = start_lobby_room(room)
+                if claimed is None:
+                    return
+                log_event(
+                    room=claimed,
+                    action_type="auto_start",
+                    payload={"seconds_waited": time_waiting, "reason": "timeout_4min"}
+                )
         return
 
     if room.state != "in_progress":
@@ -306,7 +386,7 @@ def process_tick(room: RaidRoom):
             # Enemy is dead, skip turn
             turn.resolved = True
             turn.save()
-            RaidDecisionLog.objects.create(
+            log_event(
                 room=room,
                 turn=turn,
                 participant=None,
@@ -328,7 +408,7 @@ def process_tick(room: RaidRoom):
         if not hero_alive:
             turn.resolved = True
             turn.save()
-            RaidDecisionLog.objects.create(
+            log_event(
                 room=room,
                 turn=turn,
                 participant=turn.participant,
@@ -338,6 +418,8 @@ def process_tick(room: RaidRoom):
                     "hero_id": turn.hero_instance.id if turn.hero_instance else None
                 }
             )
+        elif turn.queued_action:
+            run_queued_turns(room)
 
 
 def enemy_attack(room: RaidRoom, turn: RaidTurn):
@@ -380,33 +462,20 @@ def enemy_attack(room: RaidRoom, turn: RaidTurn):
     target_participant = target_data['participant']
     target_hero = target_data['hero']
 
-    # Calcular daño
-    base_damage = enemy.enemy.attack if hasattr(enemy.enemy, 'attack') else 10
-    dmg = max(1, int(base_damage * random.uniform(0.8, 1.2)))  # Variación de daño
-
-    # Aplicar daño al héroe
+    # Calcular y aplicar daño (combat_core: ataque verdadero con variación y buffs del enemigo)
+    state = load_battle_state(room)
+    table = skill_table(room)
     old_hp = target_hero.current_hp
-    target_hero.current_hp = max(0, target_hero.current_hp - dmg)
+    dmg = enemy_strike(state, table, enemy, target_hero)
     target_hero.save()
 
-    # Verificar si el héroe murió
-    hero_died = target_hero.current_hp <= 0
-    if hero_died:
-        # Log de muerte del héroe
-        RaidDecisionLog.objects.create(
-            room=room,
-            turn=turn,
-            participant=None,
-            actor=enemy.enemy.name,
-            action_type="hero_killed",
-            payload={
-                "target_member_id": target_participant.member_id,
-                "target_hero": target_hero.hero.name,
-                "dmg": dmg,
-                "old_hp": old_hp
-            }
-        )
+    # Log del golpe: hero_killed si el héroe muere, si no enemy_attack
+    action_type, payload = enemy_hit_log(target_participant.member_id, target_hero.id, target_hero.hero.name,
+                                         dmg, old_hp, target_hero.current_hp)
+    log_event(room=room, turn=turn, participant=None, actor=enemy.enemy.name,
+              action_type=action_type, payload=payload)
 
+    if target_hero.current_hp <= 0:
         # Verificar si el participante se queda sin héroes vivos
         team = Team.objects.filter(owner=target_participant.member, is_active=True).first()
         if team:
@@ -415,7 +484,7 @@ def enemy_attack(room: RaidRoom, turn: RaidTurn):
                 target_participant.is_alive = False
                 target_participant.save()
 
-                RaidDecisionLog.objects.create(
+                log_event(
                     room=room,
                     turn=turn,
                     participant=None,
@@ -427,21 +496,8 @@ def enemy_attack(room: RaidRoom, turn: RaidTurn):
                     }
                 )
 
-    # Log del ataque (solo si el héroe no murió, para evitar duplicados)
-    if not hero_died:
-        RaidDecisionLog.objects.create(
-            room=room,
-            turn=turn,
-            participant=None,
-            actor=enemy.enemy.name,
-            action_type="enemy_attack",
-            payload={
-                "target_member_id": target_participant.member_id,
-                "target_hero": target_hero.hero.name,
-                "dmg": dmg,
-                "remaining_hp": target_hero.current_hp
-            }
-        )
+    else:
+        fire(room, table, state, PassiveTrigger.ON_DAMAGED, target_hero.id, enemies=[enemy], turn=turn)
 
     # Resolver turno
     turn.resolved = True
@@ -457,6 +513,93 @@ def enemy_attack(room: RaidRoom, turn: RaidTurn):
         check_wave_completion(room)
 
 
+def _skill_targets(room: RaidRoom, table: dict, skill: dict, hero: PlayerHero, target_enemy_id: int | None,
+                   queued: bool) -> tuple[list, list]:
+    """(enemigos, héroes) afectados por la habilidad (raid_rules.skill_targets sobre las filas de la sala)."""
+    enemy_rows, hero_rows = {}, {hero.id: hero}
+
+    def alive_enemies() -> list:
+        rows = list(room.enemies.filter(is_alive=True).order_by("id"))
+        enemy_rows.update((e.id, e) for e in rows)
+        return [e.id for e in rows]
+
+    def alive_heroes() -> list:
+        rows = list(PlayerHero.objects.filter(id__in=list(table["heroes"]), current_hp__gt=0).select_related("hero"))
+        hero_rows.update((ph.id, ph) for ph in rows)
+        return [ph.id for ph in rows]
+
+    def hp_fraction(ph_id: int) -> float:
+        return hero_rows[ph_id].current_hp / max(1, table["heroes"][ph_id]["max_hp"])
+
+    enemy_ids, hero_ids = skill_targets(skill, hero.id, target_enemy_id, alive_enemies, alive_heroes, hp_fraction,
+                                        fallback=queued)
+    return [enemy_rows[i] for i in enemy_ids], [hero_rows[i] for i in hero_ids]
+
+
+def _hero_attack(room: RaidRoom, turn: RaidTurn, part: RaidParticipant, attacking_hero: PlayerHero,
+                 target_enemy_id: int | None = None, queued: bool = False, ability_id: int | None = None) -> bool:
+    """
+    Resuelve la habilidad del héroe en su turno (por defecto la básica) con la tabla compilada
+    de la sala. Una acción encolada cuyo objetivo ya murió ataca al primer enemigo vivo.
+    Devuelve False si la habilidad es ofensiva y no queda ningún enemigo vivo.
+    """
+    table = skill_table(room)
+    if attacking_hero.id not in table["heroes"]:
+        table = compile_skill_table(room)  # equipo cambiado después de compilar
+    skill = hero_skill(table, attacking_hero.id, ability_id)
+    if skill is None:
+        raise RaidError("Habilidad no disponible para este héroe")
+
+    # La definitiva exige ira; encolada sin ira suficiente, se usa la básica
+    state = load_battle_state(room)
+    if usable_skill(state, attacking_hero.id, skill) is None:
+        if not queued:
+            raise RaidError("Ira insuficiente")
+        skill = hero_skill(table, attacking_hero.id)
+
+    enemies, heroes = _skill_targets(room, table, skill, attacking_hero, target_enemy_id, queued)
+    if skill["target"] in (SkillTarget.ENEMY_SINGLE, SkillTarget.ENEMY_TEAM) and not enemies:
+        return False
+    enemy_hits, hero_hits, crit = apply_skill(state, table, attacking_hero.id, skill, enemies, heroes)
+
+    # Ira (solo en la caché) y log: daño a un objetivo como hero_attack, el resto como hero_skill
+    rage = settle_rage(state, table, attacking_hero.id, skill,
+                       hit=bool(enemy_hits) and skill["effect"] == SkillEffectType.DAMAGE)
+    save_battle_state(state)
+    action_type, payload = hero_action_log(skill, attacking_hero.id, enemy_hits, hero_hits, crit, rage)
+    if queued:
+        payload["queued"] = True
+    log_event(
+        room=room,
+        turn=turn,
+        participant=part,
+        actor=attacking_hero.hero.name,
+        action_type=action_type,
+        payload=payload
+    )
+
+    # Pasivas del atacante (después del log del golpe, para que el replay las aplique encima)
+    if enemy_hits and skill["effect"] == SkillEffectType.DAMAGE:
+        fire(room, table, state, PassiveTrigger.ON_HIT, attacking_hero.id, enemies=enemies, turn=turn)
+        killed = [e for e in enemies if not e.is_alive]
+        if killed:
+            fire(room, table, state, PassiveTrigger.ON_KILL, attacking_hero.id, enemies=killed, turn=turn)
+
+    # Resolver turno
+    turn.resolved = True
+    turn.save()
+
+    # Verificar si la oleada está completada (para raids estructuradas)
+    if room.raid:
+        check_wave_completion(room)
+    else:
+        # Raid legacy: verificar si todos los enemigos están muertos
+        if not room.enemies.filter(is_alive=True).exists():
+            finish_room(room, winner="heroes")
+    return True
+
+
+@buffered_log()
 def submit_player_decision(member: Member, room: RaidRoom, ability_id: int | None = None, target_enemy_id: int | None = None):
     if room.state != "in_progress":
         raise RaidError("Raid no iniciada")
@@ -487,49 +630,93 @@ def submit_player_decision(member: Member, room: RaidRoom, ability_id: int | Non
             raise RaidError("Tu héroe está muerto")
         attacking_hero = part.hero
 
-    # Seleccionar enemigo objetivo
-    enemy_inst = room.enemies.filter(id=target_enemy_id, is_alive=True).first() if target_enemy_id else room.enemies.filter(is_alive=True).first()
-    if not enemy_inst:
+    if not _hero_attack(room, turn, part, attacking_hero, target_enemy_id=target_enemy_id, ability_id=ability_id):
         raise RaidError("No hay enemigo vivo")
 
-    # Calcular daño
-    hero_atk = attacking_hero.s_atk_phy() + attacking_hero.s_atk_mag()
-    dmg = max(1, int(hero_atk * 0.4))
+    # Los siguientes turnos pueden tener ya su acción encolada
+    run_queued_turns(room)
 
-    # Aplicar daño al enemigo
-    enemy_inst.current_hp = max(0, enemy_inst.current_hp - dmg)
-    if enemy_inst.current_hp == 0:
-        enemy_inst.is_alive = False
-    enemy_inst.save()
 
-    # Log del ataque
-    RaidDecisionLog.objects.create(
-        room=room,
-        turn=turn,
-        participant=part,
-        actor=attacking_hero.hero.name,
-        action_type="hero_attack",
-        payload={
-            "enemy_id": enemy_inst.id,
-            "dmg": dmg,
-            "hero_id": attacking_hero.id,
-            "enemy_remaining_hp": enemy_inst.current_hp
-        }
-    )
+@buffered_log()
+def queue_player_decisions(member: Member, room: RaidRoom, actions: list[dict]) -> dict:
+    """
+    Encola las acciones de los héroes del jugador para sus turnos pendientes del ciclo actual.
+    Cada acción es {"hero_id", "target_enemy_id", "ability_id"}; una acción sin hero_id vale
+    para todos los héroes que no tengan una propia. Las acciones se aplican en orden de
+    velocidad según llegan los turnos (run_queued_turns) y se descartan al reconstruir el
+    orden de turnos (nuevo ciclo u oleada). Encolar de nuevo sustituye lo encolado.
+    """
+    if room.state != "in_progress":
+        raise RaidError("Raid no iniciada")
 
-    # Resolver turno
-    turn.resolved = True
-    turn.save()
+    part = RaidParticipant.objects.filter(room=room, member=member).first()
+    if not part:
+        raise RaidError("No estás en esta raid")
+    if not actions:
+        raise RaidError("No hay acciones")
+
+    default = None
+    by_hero = {}
+    for action in actions:
+        hero_id = action.get("hero_id")
+        queued = {"target_enemy_id": action.get("target_enemy_id"), "ability_id": action.get("ability_id")}
+        if hero_id is None:
+            default = queued
+        else:
+            by_hero[hero_id] = queued
 
-    # Verificar si la oleada está completada (para raids estructuradas)
-    if room.raid:
-        check_wave_completion(room)
-    else:
-        # Raid legacy: verificar si todos los enemigos están muertos
-        if not room.enemies.filter(is_alive=True).exists():
-            finish_room(room, winner="heroes")
+    turns = list(room.turns.filter(resolved=False, actor_type="hero", participant=part).order_by("index"))
+    if not turns:
+        raise RaidError("No te quedan turnos en este ciclo")
+    unknown = set(by_hero) - {t.hero_instance_id for t in turns}
+    if unknown:
+        raise RaidError(f"Héroes sin turno en este ciclo: {sorted(unknown)}")
+
+    table = skill_table(room)
+    for turn in turns:
+        action = by_hero.get(turn.hero_instance_id, default)
+        if not action or not action["ability_id"] or not turn.hero_instance_id:
+            continue
+        if hero_skill(table, turn.hero_instance_id, action["ability_id"]) is None:
+            raise RaidError("Habilidad no disponible para este héroe")
+
+    targets = {a["target_enemy_id"] for a in [default, *by_hero.values()] if a and a["target_enemy_id"]}
+    if targets and room.enemies.filter(id__in=targets, is_alive=True).count() != len(targets):
+        raise RaidError("Objetivo no válido")
 
+    for turn in turns:
+        turn.queued_action = by_hero.get(turn.hero_instance_id, default)
+    RaidTurn.objects.bulk_update(turns, ["queued_action"])
 
+    applied = run_queued_turns(room)
+    return {"queued": sum(1 for t in turns if t.queued_action), "applied": applied}
+
+
+def run_queued_turns(room: RaidRoom) -> int:
+    """
+    Aplica seguidos los turnos de héroe con acción encolada desde el turno actual. Se detiene
+    en el primer turno de enemigo, sin acción o de un héroe muerto (de esos se ocupa
+    process_tick). Devuelve cuántos turnos ha aplicado.
+    """
+    applied = 0
+    while room.state == "in_progress":
+        turn = (room.turns.filter(resolved=False)
+                .select_related("participant__hero__hero", "hero_instance__hero")
+                .order_by("index").first())
+        if not turn or turn.actor_type != "hero" or not turn.queued_action:
+            break
+        hero = turn.hero_instance or (turn.participant.hero if turn.participant else None)
+        if not hero or hero.current_hp <= 0:
+            break
+        if not _hero_attack(room, turn, turn.participant, hero,
+                            target_enemy_id=turn.queued_action.get("target_enemy_id"), queued=True,
+                            ability_id=turn.queued_action.get("ability_id")):
+            break
+        applied += 1
+    return applied
+
+
+@buffered_log()
 def start_solo_raid(member: Member, raid: Raid = None, team: Team = None, enemy: Enemy = None) -> RaidRoom:
     """Iniciar una raid en solitario"""
     if raid:
@@ -557,7 +744,7 @@ def start_solo_raid(member: Member, raid: Raid = None, team: Team = None, enemy:
             is_ready=True,
             is_alive=True
         )
-        start_structured_raid(room)
+        start_lobby_room(room)
     else:
         # Raid legacy con enemigo simple
         if not enemy:
@@ -571,11 +758,12 @@ def start_solo_raid(member: Member, raid: Raid = None, team: Team = None, enemy:
 
         room = RaidRoom.objects.create(owner=member, max_players=1, random_seed=random.randint(1, 10_000))
         RaidParticipant.objects.create(room=room, member=member, hero=hero, is_ready=True, is_alive=True)
-        start_raid(room, enemy=enemy)
+        start_lobby_room(room, enemy=enemy)
 
     return room
 
 
+@buffered_log()
 def check_wave_completion(room: RaidRoom):
     """Verificar si la oleada actual está completada y avanzar si es necesario"""
     if not room.raid:
@@ -589,8 +777,10 @@ def check_wave_completion(room: RaidRoom):
     room.wave_index += 1
     room.save(update_fields=["wave_index"])
 
-    # Intentar generar la siguiente oleada
+    # Intentar generar la siguiente oleada (sin más oleadas, spawn_wave_enemies termina la sala)
     spawn_wave_enemies(room)
+    if room.state == "finished":
+        return
 
     # Si no hay más oleadas, la raid está completada
     if not room.enemies.exists():
@@ -600,10 +790,17 @@ def check_wave_completion(room: RaidRoom):
         build_turn_order(room)
 
 
+@buffered_log()
 def finish_room(room: RaidRoom, winner: str):
     room.state = "finished"
-    room.save(update_fields=["state"])
-    RaidDecisionLog.objects.create(room=room, action_type="finish", payload={"winner": winner})
+    room.battle_state = load_battle_state(room).to_snapshot()
+    room.save(update_fields=["state", "battle_state", "updated_at"])
+    clear_battle_state(room.id)
+    resume_regen(_room_hero_ids([room.id]))
+    log_event(room=room, action_type="finish", payload={"winner": winner})
+    rewards = distribute_room_rewards(room, winner)
+    if rewards:
+        log_event(room=room, action_type="rewards", payload=rewards)
 
 
 def process_all_active_raids():
@@ -624,7 +821,7 @@ def auto_start_full_rooms():
 
     # Buscar salas ready o waiting con suficientes jugadores
     ready_rooms = RaidRoom.objects.filter(
-        state__in=["ready", "waiting"]
+        state__in=LOBBY_STATES
     ).prefetch_related('participants')
 
     for room in ready_rooms:
@@ -651,14 +848,49 @@ def auto_start_full_rooms():
                         break
 
             if all_ready:
-                if room.raid:
-                    start_structured_raid(room)
-                else:
-                    # Raid legacy
-                    from core.models import Enemy
-                    enemy = Enemy.objects.order_by("?").first()
-                    if enemy:
-                        start_raid(room, enemy=enemy)
+                start_lobby_room(room)
+
+
+def force_close_rooms(room_ids) -> list[int]:
+    """
+    Cierre forzado en bloque (timeout): KO de todos los participantes, HP 0 a sus héroes y salas
+    cerradas, con un UPDATE por tabla en vez de un save por fila. Cada sala guarda su estado de
+    combate final y reparte sus recompensas de derrota (distribute_room_rewards).
+    Idempotente: solo afecta a salas aún no cerradas. Devuelve los ids de las salas cerradas.
+    """
+    with buffered_log():
+        rooms = list(RaidRoom.objects
+                     .select_for_update(skip_locked=True)
+                     .filter(id__in=list(room_ids), closed=False))
+        if not rooms:
+            return []
+        ids = [room.id for room in rooms]
+
+        affected: dict[int, list[int]] = {rid: [] for rid in ids}
+        for room_id, ph_id in (RaidParticipant.objects
+                               .filter(room_id__in=ids, hero__isnull=False)
+                               .exclude(hero__current_hp=0)
+                               .values_list("room_id", "hero_id")):
+            affected[room_id].append(ph_id)
+
+        ph_ids = [ph_id for lst in affected.values() for ph_id in lst]
+        if ph_ids:
+            PlayerHero.objects.filter(id__in=ph_ids).update(current_hp=0, hp_updated_at=now())
+        resume_regen(_room_hero_ids(ids))
+        RaidParticipant.objects.filter(room_id__in=ids, is_alive=True).update(is_alive=False)
+        for room in rooms:
+            if room.state == "in_progress":
+                room.battle_state = load_battle_state(room).to_snapshot()
+                RaidRoom.objects.filter(pk=room.pk).update(battle_state=room.battle_state)
+        RaidRoom.objects.filter(id__in=ids).update(closed=True, state="finished", updated_at=now())
+        for room in rooms:
+            clear_battle_state(room.id)
+            log_event(room.id, "finish",
+                      payload={"winner": "timeout", "closed": True, "affected_player_heroes": affected[room.id]})
+            rewards = distribute_room_rewards(room, "timeout")
+            if rewards:
+                log_event(room.id, "rewards", payload=rewards)
+    return ids
 
 
 def force_close_room(room: RaidRoom):
@@ -667,23 +899,78 @@ def force_close_room(room: RaidRoom):
     """
     if room.closed:
         return
-    # KO all alive participants and set their PlayerHero HP to 0
-    changed_ph_ids = []
-    for p in room.participants.select_related("hero").all():
-        if p.is_alive:
-            p.is_alive = False
-            p.save(update_fields=["is_alive"])
-        if p.hero_id:
-            ph = p.hero
-            if ph.current_hp != 0:
-                ph.current_hp = 0
-                ph.save(update_fields=["current_hp"])
-                changed_ph_ids.append(ph.id)
+    force_close_rooms([room.id])
     room.closed = True
     room.state = "finished"
-    room.save(update_fields=["closed", "state"])
-    RaidDecisionLog.objects.create(
-        room=room,
-        action_type="finish",
-        payload={"winner": "timeout", "closed": True, "affected_player_heroes": changed_ph_ids}
-    )
+
+
+def sweep_rooms(at=None) -> dict:
+    """
+    Avanza o cierra todas las salas pendientes de una vez, sin depender de que un cliente
+    haga polling (process_tick). Pensado para ejecutarse periódicamente (sweep_raid_rooms).
+
+    - waiting → ready tras AUTO_READY_SECONDS (un UPDATE).
+    - Salas de lobby vacías tras AUTO_START_SECONDS: se cierran (un UPDATE y un evento "finish").
+    - Salas de lobby con jugadores tras AUTO_START_SECONDS: auto-start.
+    - Salas en curso con expires_at vencido: force_close_rooms en bloque.
+    """
+    at = at or now()
+    ready_cutoff = at - timedelta(seconds=AUTO_READY_SECONDS)
+    start_cutoff = at - timedelta(seconds=AUTO_START_SECONDS)
+    stats = {"ready": 0, "abandoned": 0, "started": 0, "expired": 0}
+
+    # waiting → ready
+    with buffered_log():
+        due = list(RaidRoom.objects
+                   .select_for_update(skip_locked=True)
+                   .filter(state="waiting", created_at__lte=ready_cutoff)
+                   .values_list("id", "created_at"))
+        if due:
+            RaidRoom.objects.filter(id__in=[rid for rid, _ in due]).update(state="ready", updated_at=at)
+            for rid, created in due:
+                log_event(rid, "auto_ready", payload={"seconds_waited": (at - created).total_seconds()})
+        stats["ready"] = len(due)
+
+    # Salas de lobby abandonadas (sin nadie sentado)
+    with buffered_log():
+        abandoned = list(RaidRoom.objects
+                         .select_for_update(skip_locked=True)
+                         .filter(state__in=LOBBY_STATES, created_at__lte=start_cutoff, closed=False)
+                         .exclude(participants__isnull=False)
+                         .values_list("id", "created_at"))
+        if abandoned:
+            RaidRoom.objects.filter(id__in=[rid for rid, _ in abandoned]).update(
+                state="finished", closed=True, open_seats=0, updated_at=at)
+            for rid, created in abandoned:
+                log_event(rid, "finish", payload={"winner": "abandoned", "closed": True,
+                                                  "seconds_waited": (at - created).total_seconds()})
+        stats["abandoned"] = len(abandoned)
+
+    # Auto-start: arrancar una raid necesita generar enemigos y turnos, así que va por sala,
+    # pero solo se cargan las salas que ya han vencido.
+    for room in (RaidRoom.objects
+                 .filter(state__in=LOBBY_STATES, created_at__lte=start_cutoff, closed=False)
+                 .order_by("created_at")):
+        try:
+            with buffered_log():
+                started = start_lobby_room(room)
+                if started is None:
+                    continue  # otro proceso la está llenando o ya la ha arrancado (o no hay enemigos)
+                room = started
+                log_event(
+                    room=room,
+                    action_type="auto_start",
+                    payload={"seconds_waited": (at - room.created_at).total_seconds(), "reason": "sweeper"}
+                )
+            stats["started"] += 1
+        except Exception as e:
+            import logging
+            logging.error(f"Error auto-starting raid room {room.id}: {e}")
+
+    # Salas en curso caducadas
+    expired = list(RaidRoom.objects
+                   .filter(state="in_progress", closed=False, expires_at__lte=at)
+                   .values_list("id", flat=True))
+    if expired:
+        stats["expired"] = len(force_close_rooms(expired))
+    return stats
@@ -0,0 +1,263 @@
+# core/services/replay.py
+from __future__ import annotations
+import json
+import struct
+import zlib
+from bisect import bisect_right
+from copy import deepcopy
+from typing import Dict, List, Optional
+
+try:
+    import msgpack  # opcional: formato más compacto y rápido que JSON
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
+# =============== FORMATO ===============
+# Fichero de replay de una sala:
+#   b"RRPL" | versión (u8) | códec (u8: 0=json, 1=msgpack) | zlib(cuerpo)
+# Cuerpo:
+#   {"v": 1,
+#    "room": {id, name, raid_id, created_at},
+#    "seed": random_seed de la sala,
+#    "participants": [[participant_id, member_id, member_name, hero_id, hero_name, color], ...],
+#    "actions": [[seq, ts_ms, tipo, actor, payload, participant_id, turn_id], ...]}   (orden por seq)
+# El estado inicial de héroes y enemigos viaja en los payloads de "start" y "wave_start".
+MAGIC = b"RRPL"
+REPLAY_VERSION = 1
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+_HEADER = struct.Struct("!4sBB")
+
+# Acciones frecuentes → entero (el resto se guarda como texto)
+ACTION_CODES = {
+    "join": 1, "start": 2, "wave_start": 3, "hero_attack": 4, "enemy_attack": 5,
+    "hero_killed": 6, "participant_eliminated": 7, "skip_dead": 8, "skip_dead_enemy": 9,
+    "finish": 10, "auto_ready": 11, "auto_start": 12, "hero_skill": 13,
+    "passive": 14,
+}
+ACTION_NAMES = {code: name for name, code in ACTION_CODES.items()}
+
+# Índices de cada acción
+A_SEQ, A_TS, A_TYPE, A_ACTOR, A_PAYLOAD, A_PARTICIPANT, A_TURN = range(7)
+
+
+def encode_replay(body: dict, codec: Optional[int] = None) -> bytes:
+    if codec is None:
+        codec = CODEC_MSGPACK if MSGPACK_AVAILABLE else CODEC_JSON
+    if codec == CODEC_MSGPACK:
+        if not MSGPACK_AVAILABLE:
+            raise RuntimeError("msgpack no está instalado")
+        raw = msgpack.packb(body, use_bin_type=True)
+    else:
+        raw = json.dumps(body, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return _HEADER.pack(MAGIC, REPLAY_VERSION, codec) + zlib.compress(raw, 6)
+
+
+def decode_replay(blob: bytes) -> dict:
+    blob = bytes(blob)
+    magic, version, codec = _HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("No es un fichero de replay")
+    if version > REPLAY_VERSION:
+        raise ValueError(f"Versión de replay no soportada: {version}")
+    raw = zlib.decompress(blob[_HEADER.size:])
+    if codec == CODEC_MSGPACK:
+        if not MSGPACK_AVAILABLE:
+            raise RuntimeError("Replay en msgpack pero msgpack no está instalado")
+        return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+    return json.loads(raw.decode("utf-8"))
+
+
+def is_replay(blob: bytes) -> bool:
+    return bytes(blob[:4]) == MAGIC
+
+
+def action_name(action) -> str:
+    code = action[A_TYPE]
+    return ACTION_NAMES.get(code, code) if isinstance(code, int) else code
+
+
+def build_replay(room) -> dict:
+    """Cuerpo del replay a partir de las filas vivas de la sala (3 consultas)."""
+    from core.models import RaidDecisionLog, RaidParticipant
+
+    participants = (RaidParticipant.objects
+                    .filter(room=room)
+                    .select_related("member", "hero__hero")
+                    .order_by("joined_at", "id"))
+    logs = (RaidDecisionLog.objects
+            .filter(room=room)
+            .order_by("seq", "id")
+            .values_list("seq", "created_at", "action_type", "actor", "payload", "participant_id", "turn_id"))
+    return {
+        "v": REPLAY_VERSION,
+        "room": {
+            "id": room.id,
+            "name": room.name,
+            "raid_id": room.raid_id,
+            "created_at": room.created_at.isoformat() if room.created_at else None,
+        },
+        "seed": room.random_seed,
+        "participants": [
+            [p.id, p.member_id, p.member.name, p.hero_id, p.hero.hero.name if p.hero else None, p.player_color]
+            for p in participants
+        ],
+        "actions": [
+            [seq, int(ts.timestamp() * 1000), ACTION_CODES.get(action, action), actor, payload, pid, tid]
+            for seq, ts, action, actor, payload, pid, tid in logs
+        ],
+    }
+
+
+# =============== MOTOR DE REPLAY ===============
+def initial_state(body: dict) -> dict:
+    return {
+        "seq": 0,
+        "state": "waiting",
+        "winner": None,
+        "wave": 0,
+        "participants": {p[1]: {"member_name": p[2], "alive": True, "color": p[5]} for p in body["participants"]},
+        "heroes": {},
+        "enemies": {},
+    }
+
+
+def _apply_start(state, p):
+    state["state"] = "in_progress"
+    for ph_id, member_id, name, hp, max_hp, speed in p.get("heroes", []):
+        state["heroes"][ph_id] = {"member_id": member_id, "name": name, "hp": hp, "max_hp": max_hp, "speed": speed}
+    _spawn(state, p.get("enemies", []))
+
+
+def _spawn(state, enemies):
+    for inst_id, enemy_id, name, hp, max_hp, speed in enemies:
+        state["enemies"][inst_id] = {"enemy_id": enemy_id, "name": name, "hp": hp, "max_hp": max_hp,
+                                     "speed": speed, "alive": hp > 0}
+
+
+def _apply_wave_start(state, p):
+    state["wave"] = p.get("wave_number", state["wave"] + 1)
+    state["enemies"] = {}
+    _spawn(state, p.get("enemies", []))
+
+
+def _apply_hero_attack(state, p):
+    enemy = state["enemies"].get(p.get("enemy_id"))
+    if enemy is not None:
+        hp = p.get("enemy_remaining_hp", enemy["hp"] - p.get("dmg", 0))
+        enemy["hp"] = max(0, hp)
+        enemy["alive"] = enemy["hp"] > 0
+
+
+def _apply_hero_skill(state, p):
+    # Habilidades de área, curas y buffs: [id, cantidad, vida restante] por objetivo
+    for inst_id, _, remaining in p.get("enemies", []):
+        enemy = state["enemies"].get(inst_id)
+        if enemy is not None:
+            enemy["hp"] = max(0, remaining)
+            enemy["alive"] = enemy["hp"] > 0
+    for ph_id, _, remaining in p.get("heroes", []):
+        hero = state["heroes"].get(ph_id)
+        if hero is not None:
+            hero["hp"] = remaining
+
+
+def _apply_enemy_attack(state, p):
+    hero = state["heroes"].get(p.get("target_hero_id"))
+    if hero is not None:
+        hero["hp"] = max(0, p.get("remaining_hp", hero["hp"] - p.get("dmg", 0)))
+
+
+def _apply_hero_killed(state, p):
+    hero = state["heroes"].get(p.get("target_hero_id"))
+    if hero is not None:
+        hero["hp"] = 0
+
+
+def _apply_eliminated(state, p):
+    part = state["participants"].get(p.get("member_id"))
+    if part is not None:
+        part["alive"] = False
+
+
+def _apply_finish(state, p):
+    state["state"] = "finished"
+    state["winner"] = p.get("winner")
+    for ph_id in p.get("affected_player_heroes", []):
+        if ph_id in state["heroes"]:
+            state["heroes"][ph_id]["hp"] = 0
+    if p.get("closed"):
+        for part in state["participants"].values():
+            part["alive"] = False
+
+
+def _apply_ready(state, p):
+    state["state"] = "ready"
+
+
+_APPLY = {
+    "start": _apply_start,
+    "wave_start": _apply_wave_start,
+    "hero_attack": _apply_hero_attack,
+    "hero_skill": _apply_hero_skill,
+    "passive": _apply_hero_skill,
+    "enemy_attack": _apply_enemy_attack,
+    "hero_killed": _apply_hero_killed,
+    "participant_eliminated": _apply_eliminated,
+    "finish": _apply_finish,
+    "auto_ready": _apply_ready,
+}
+
+
+class ReplayEngine:
+    """
+    Reconstruye el estado de la sala en cualquier punto aplicando las acciones en memoria.
+    Guarda un keyframe cada `keyframe_every` acciones, así saltar a un seq arbitrario cuesta
+    como mucho `keyframe_every` aplicaciones desde el keyframe anterior.
+    """
+
+    def __init__(self, body: dict, keyframe_every: int = 256):
+        self.body = body
+        self.actions: List[list] = body["actions"]
+        self._seqs = [a[A_SEQ] for a in self.actions]
+        self.keyframe_every = keyframe_every
+        self._keyframes: Dict[int, dict] = {0: initial_state(body)}  # índice de acción → estado
+
+    @classmethod
+    def from_blob(cls, blob: bytes, **kwargs) -> "ReplayEngine":
+        return cls(decode_replay(blob), **kwargs)
+
+    def __len__(self):
+        return len(self.actions)
+
+    @staticmethod
+    def apply(state: dict, action: list) -> None:
+        fn = _APPLY.get(action_name(action))
+        if fn is not None:
+            fn(state, action[A_PAYLOAD] or {})
+        state["seq"] = action[A_SEQ]
+
+    def state_at_index(self, n: int) -> dict:
+        """Estado tras aplicar las `n` primeras acciones."""
+        n = max(0, min(n, len(self.actions)))
+        base = (n // self.keyframe_every) * self.keyframe_every
+        while base not in self._keyframes:
+            base -= self.keyframe_every
+        state = deepcopy(self._keyframes[base])
+        for i in range(base, n):
+            self.apply(state, self.actions[i])
+            if (i + 1) % self.keyframe_every == 0 and (i + 1) not in self._keyframes:
+                self._keyframes[i + 1] = deepcopy(state)
+        return state
+
+    def state_at(self, seq: int) -> dict:
+        """Estado tras la última acción con número de secuencia <= `seq`."""
+        return self.state_at_index(bisect_right(self._seqs, seq))
+
+    def final_state(self) -> dict:
+        state = deepcopy(self._keyframes[0])
+        for action in self.actions:
+            self.apply(state, action)
+        return state
@@ -0,0 +1,221 @@
+# core/services/skills.py
+from __future__ import annotations
+from typing import Optional
+
+from django.core.cache import cache
+
+from core.models import (
+    ArtifactSubstat, DamageProfile, HeroSkill, PassiveTrigger, PlayerHero, PlayerHeroSkill, RaidEnemy,
+    RaidRoom, ScalingStat, SkillEffectType, SkillSlot, SkillTarget, SubstatType, TeamSlot,
+)
+from core.services.battle_state import STAT_ATK_MAG, STAT_ATK_PHY, STAT_CODES, hero_actor
+from core.services.combat_core import TRUE_DAMAGE, defense_stats
+
+# Tabla de habilidades compilada por sala: al empezar la raid se resuelven una vez los stats
+# escalados, el nivel de cada habilidad y los overrides de ira de todos los héroes, y cada acción
+# pasa a ser una búsqueda en la tabla más aritmética (sin consultas a Skill/HeroSkill).
+#
+#   {"heroes": {player_hero_id: {
+#        "member_id", "name", "max_hp", "speed", "atk_phy", "atk_mag", "def_phy", "def_mag",
+#        "crit_chance", "crit_damage", "rage_max", "starting_rage", "rage_on_hit",
+#        "basic": skill_id, "ultimate": skill_id | None,
+#        "skills": {skill_id: entrada}, "passives": [entrada, ...]}},
+#    "enemies": {enemy_id: {"attack", "defense"}},
+#    "triggers": {(actor, trigger): [entrada pasiva, ...]}}
+#
+#   entrada = {"id", "name", "slot", "effect", "target", "profile", "amount", "percent",
+#              "power_stat", "stats", "rage_gain", "rage_cost", "trigger"}
+#
+# "amount" es el valor ya escalado (sin defensa ni crítico): stat * base_value / 100, o
+# base_value si no escala. Defensa, crítico y buffs se aplican al resolver (combat_core).
+# "power_stat" es el stat (battle_state.STAT_*) cuyos buffs escalan "amount", y "stats" los
+# stats que modifica un buff/debuff.
+SKILL_TABLE_TTL = 6 * 60 * 60
+DEFAULT_SKILL_ID = 0        # héroes sin habilidad básica asignada
+
+
+def _table_key(room_id: int) -> str:
+    return f"raid:skills:{room_id}"
+
+
+def _stat_values(ph: PlayerHero) -> dict:
+    return {
+        ScalingStat.NONE: 0,
+        ScalingStat.ATK_PHY: ph.s_atk_phy(),
+        ScalingStat.ATK_MAG: ph.s_atk_mag(),
+        ScalingStat.HP: ph.s_hp(),
+        ScalingStat.DEF_PHY: ph.s_def_phy(),
+        ScalingStat.DEF_MAG: ph.s_def_mag(),
+        ScalingStat.SPEED: ph.s_speed(),
+    }
+
+
+_PROFILE_ATK = {
+    DamageProfile.PHYSICAL: [STAT_ATK_PHY],
+    DamageProfile.MAGICAL: [STAT_ATK_MAG],
+    DamageProfile.MIXED: [STAT_ATK_PHY, STAT_ATK_MAG],
+}
+
+
+def _effect_stats(skill) -> list:
+    """Stats que modifica un buff/debuff: su scaling_stat o, si no tiene, ataque/defensa de su perfil."""
+    if skill.scaling_stat in STAT_CODES:
+        return [STAT_CODES[skill.scaling_stat]]
+    if skill.effect_type == SkillEffectType.BUFF:
+        return _PROFILE_ATK.get(skill.damage_profile, [])
+    return list(defense_stats(skill.damage_profile))
+
+
+def _skill_entry(hero_skill: HeroSkill, level: int, stats: dict) -> dict:
+    skill = hero_skill.skill
+    level_mult = 1.0 + skill.per_level_multiplier * (level - 1)
+    base = float(skill.base_value) * level_mult
+    stat = stats.get(skill.scaling_stat, 0)
+    return {
+        "id": skill.id,
+        "name": skill.name,
+        "slot": hero_skill.slot,
+        "effect": skill.effect_type,
+        "target": skill.target,
+        "profile": skill.damage_profile,
+        "amount": stat * base / 100 if skill.scaling_stat != ScalingStat.NONE else base,
+        "percent": float(skill.percent_value) * level_mult,
+        "power_stat": STAT_CODES.get(skill.scaling_stat),
+        "stats": _effect_stats(skill) if skill.effect_type in (SkillEffectType.BUFF, SkillEffectType.DEBUFF) else [],
+        "rage_gain": hero_skill.effective_rage_gain,
+        "rage_cost": hero_skill.effective_rage_cost,
+        "trigger": skill.passive_trigger,
+    }
+
+
+def _default_basic(stats: dict) -> dict:
+    # Ataque de los héroes sin habilidades: el daño fijo de siempre, (ATK físico + mágico) * 0.4
+    return {
+        "id": DEFAULT_SKILL_ID,
+        "name": "Ataque",
+        "slot": SkillSlot.BASIC,
+        "effect": SkillEffectType.DAMAGE,
+        "target": SkillTarget.ENEMY_SINGLE,
+        "profile": TRUE_DAMAGE,
+        "amount": (stats[ScalingStat.ATK_PHY] + stats[ScalingStat.ATK_MAG]) * 0.4,
+        "percent": 0.0,
+        "power_stat": STAT_ATK_PHY,
+        "stats": [],
+        "rage_gain": 0,
+        "rage_cost": 0,
+        "trigger": None,
+    }
+
+
+def compile_skill_table(room: RaidRoom) -> dict:
+    """Compila y cachea la tabla de la sala (6 consultas, independiente del número de héroes)."""
+    slots = (TeamSlot.objects
+             .filter(team__owner__raid_participations__room=room, team__is_active=True))
+    if room.raid_id:
+        enemy_rows = RaidEnemy.objects.filter(wave__raid_id=room.raid_id)
+    else:
+        enemy_rows = room.enemies
+    table = build_skill_table(slots, enemy_rows.values_list("enemy_id", "enemy__attack", "enemy__defense"))
+    cache.set(_table_key(room.id), table, SKILL_TABLE_TTL)
+    return table
+
+
+def member_skill_table(member_id: int, raid_id: int) -> dict:
+    """Tabla del equipo activo de un miembro contra una raid, sin sala ni caché (simulaciones)."""
+    return build_skill_table(
+        TeamSlot.objects.filter(team__owner_id=member_id, team__is_active=True),
+        RaidEnemy.objects.filter(wave__raid_id=raid_id).values_list("enemy_id", "enemy__attack", "enemy__defense"),
+    )
+
+
+def build_skill_table(slots, enemy_rows) -> dict:
+    """Tabla a partir de los TeamSlot de los equipos y las filas (enemy_id, ataque, defensa)."""
+    slots = list(slots.select_related("team", "player_hero__hero"))
+    player_heroes = [s.player_hero for s in slots]
+    PlayerHero.prime_level_caps(player_heroes)
+
+    hero_skills = {}
+    for hs in HeroSkill.objects.filter(hero_id__in={ph.hero_id for ph in player_heroes}).select_related("skill"):
+        hero_skills.setdefault(hs.hero_id, []).append(hs)
+    levels = dict(((phs.player_hero_id, phs.hero_skill_id), phs.level)
+                  for phs in PlayerHeroSkill.objects.filter(player_hero__in=player_heroes))
+
+    # Substats de ira del equipo equipado (valores absolutos)
+    rage_bonus = {}
+    for ph_id, substat, value in (ArtifactSubstat.objects
+                                  .filter(artifact__playerartifact__playerheroequipment__player_hero__in=player_heroes,
+                                          substat_type__in=[SubstatType.RAGE_START, SubstatType.RAGE_ON_HIT])
+                                  .values_list("artifact__playerartifact__playerheroequipment__player_hero_id",
+                                               "substat_type", "value")):
+        key = (ph_id, substat)
+        rage_bonus[key] = rage_bonus.get(key, 0) + int(value)
+
+    heroes = {}
+    for slot in slots:
+        ph = slot.player_hero
+        stats = _stat_values(ph)
+        entry = {
+            "member_id": slot.team.owner_id,
+            "name": ph.hero.name,
+            "max_hp": stats[ScalingStat.HP],
+            "speed": stats[ScalingStat.SPEED],
+            "atk_phy": stats[ScalingStat.ATK_PHY],
+            "atk_mag": stats[ScalingStat.ATK_MAG],
+            "def_phy": stats[ScalingStat.DEF_PHY],
+            "def_mag": stats[ScalingStat.DEF_MAG],
+            "crit_chance": ph.hero.base_crit_chance,
+            "crit_damage": ph.hero.base_crit_damage,
+            "rage_max": ph.hero.rage_max,
+            "starting_rage": ph.hero.starting_rage + rage_bonus.get((ph.id, SubstatType.RAGE_START), 0),
+            "rage_on_hit": rage_bonus.get((ph.id, SubstatType.RAGE_ON_HIT), 0),
+            "basic": None,
+            "ultimate": None,
+            "skills": {},
+            "passives": [],
+        }
+        for hs in hero_skills.get(ph.hero_id, []):
+            skill = _skill_entry(hs, levels.get((ph.id, hs.id), 1), stats)
+            if hs.slot in (SkillSlot.BASIC, SkillSlot.ULTIMATE):
+                entry[hs.slot] = skill["id"]
+                entry["skills"][skill["id"]] = skill
+            else:
+                entry["passives"].append(skill)
+        if entry["basic"] is None:
+            entry["basic"] = DEFAULT_SKILL_ID
+            entry["skills"][DEFAULT_SKILL_ID] = _default_basic(stats)
+        heroes[ph.id] = entry
+
+    enemies = {enemy_id: {"attack": attack, "defense": defense} for enemy_id, attack, defense in enemy_rows}
+    return {"heroes": heroes, "enemies": enemies, "triggers": compile_triggers(heroes)}
+
+
+def compile_triggers(heroes: dict) -> dict:
+    """
+    Tabla de disparadores de pasivas indexada por (actor, trigger): un evento solo consulta a sus
+    oyentes reales. Las pasivas ALWAYS se tratan como ON_BATTLE_START permanentes.
+    """
+    triggers = {}
+    for ph_id, hero in heroes.items():
+        for passive in hero["passives"]:
+            trigger = passive["trigger"]
+            if trigger == PassiveTrigger.ALWAYS:
+                trigger = PassiveTrigger.ON_BATTLE_START
+            triggers.setdefault((hero_actor(ph_id), trigger), []).append(passive)
+    return triggers
+
+
+def skill_table(room: RaidRoom) -> dict:
+    """Tabla de la sala desde la caché; si no está (otro proceso, caducada) se recompila."""
+    table = cache.get(_table_key(room.id))
+    if table is None:
+        table = compile_skill_table(room)
+    return table
+
+
+def hero_skill(table: dict, hero_id: int, skill_id: Optional[int] = None) -> Optional[dict]:
+    """Habilidad activa del héroe: la pedida (básica o ulti) o la básica. None si no es suya."""
+    hero = table["heroes"].get(hero_id)
+    if hero is None:
+        return None
+    return hero["skills"].get(hero["basic"] if skill_id is None else skill_id)
+
@@ -0,0 +1,203 @@
+# core/services/spectator.py
+from __future__ import annotations
+import time
+from collections import defaultdict
+from typing import Optional, Tuple
+
+from django.core.cache import cache
+
+from core.models import PlayerHero, RaidRoom, TeamSlot
+from core.services.battle_state import load_battle_state
+
+# Modo espectador: un único snapshot por sala y versión de estado (RaidRoom.log_seq), compartido
+# por todos los espectadores. La versión se lee siempre de la base de datos (una columna por
+# clave primaria), así ningún worker sirve un snapshot viejo; en la caché solo va el snapshot,
+# que se recalcula como mucho una vez por versión (y por caché, si es local a cada proceso).
+SNAPSHOT_TTL = 300
+LOCK_TTL = 10
+LOCK_WAIT = 1.0      # segundos que espera quien no tiene el cerrojo y no hay snapshot previo
+LOCK_POLL = 0.05
+
+
+def _image_url(image):
+    return image.url if image else None
+
+
+def serialize_room_state(room: RaidRoom, after_seq: Optional[int] = None) -> dict:
+    """
+    Estado de la sala para el cliente (sin tickear). Número fijo de consultas, independiente
+    del número de jugadores y héroes.
+    """
+    parts = list(room.participants.select_related('member', 'hero__hero'))
+    enemies = list(room.enemies.select_related('enemy'))
+    turn = (room.turns
+            .filter(resolved=False)
+            .select_related('participant__hero__hero', 'hero_instance__hero')
+            .order_by('index')
+            .first())
+    logs_qs = room.decision_logs.select_related('participant')
+    # Logs por secuencia: los nuevos desde after_seq, o los 30 últimos
+    if after_seq is not None:
+        logs = list(logs_qs.filter(seq__gt=after_seq).order_by('seq')[:100])
+    else:
+        logs = list(logs_qs.order_by('-seq')[:30])[::-1]
+
+    # Equipos activos de todos los participantes en una consulta
+    slots_by_owner = defaultdict(list)
+    for slot in (TeamSlot.objects
+                 .filter(team__owner_id__in=[p.member_id for p in parts], team__is_active=True)
+                 .select_related('team', 'player_hero__hero')
+                 .order_by('position', 'id')):
+        slots_by_owner[slot.team.owner_id].append(slot)
+
+    heroes = [s.player_hero for lst in slots_by_owner.values() for s in lst]
+    heroes += [p.hero for p in parts if p.hero]
+    if turn:
+        heroes += [h for h in (turn.hero_instance, turn.participant.hero if turn.participant else None) if h]
+    PlayerHero.prime_level_caps(heroes)
+    rage = load_battle_state(room).rage
+
+    participants_data = []
+    for p in parts:
+        team_heroes = [
+            {
+                "id": slot.player_hero.id,
+                "name": slot.player_hero.hero.name,
+                "image": _image_url(slot.player_hero.hero.image),
+                "current_hp": slot.player_hero.current_hp,
+                "max_hp": slot.player_hero.s_hp(),
+                "is_alive": slot.player_hero.current_hp > 0,
+                "position": slot.position,
+                "rage": rage.get(slot.player_hero.id, 0),
+                "rage_max": slot.player_hero.hero.rage_max,
+            } for slot in slots_by_owner.get(p.member_id, [])
+        ]
+        participants_data.append({
+            "member_id": p.member_id,
+            "member_name": p.member.name,
+            "is_alive": p.is_alive,
+            "is_ready": p.is_ready,
+            "player_color": p.player_color,
+            "team_heroes": team_heroes,
+            # Héroe principal (para compatibilidad)
+            "hero": p.hero.hero.name if p.hero else None,
+            "hero_hp": p.hero.current_hp if p.hero else None,
+        })
+
+    # Información de la raid y oleada actual
+    raid_info = None
+    if room.raid:
+        waves = dict(room.raid.waves.values_list('wave_number', 'name'))
+        current = room.wave_index + 1
+        raid_info = {
+            "id": room.raid.id,
+            "name": room.raid.name,
+            "difficulty": room.raid.difficulty,
+            "current_wave": current if current in waves else None,
+            "wave_name": waves.get(current),
+            "total_waves": len(waves),
+        }
+
+    turn_hero = None
+    if turn:
+        turn_hero = turn.hero_instance or (turn.participant.hero if turn.participant else None)
+
+    return {
+        "room_id": room.id,
+        "name": room.name,
+        "state": room.state,
+        "max_players": room.max_players,
+        "raid": raid_info,
+        "participants": participants_data,
+        "enemies": [
+            {
+                "id": e.id,
+                "name": e.enemy.name,
+                "image": _image_url(e.enemy.image),
+                "hp": e.current_hp,
+                "max_hp": e.max_hp,
+                "alive": e.is_alive,
+                "speed": e.speed,
+            } for e in enemies
+        ],
+        "turn": None if not turn else {
+            "index": turn.index,
+            "actor_type": turn.actor_type,
+            "member_id": turn.participant.member_id if turn.participant_id else None,
+            "enemy_id": turn.enemy_instance_id,
+            "hero_id": turn.hero_instance.id if turn.hero_instance else None,
+            "hero_name": turn_hero.hero.name if turn_hero else None,
+            "hero_speed": turn_hero.s_speed() if turn_hero else None,
+        },
+        "logs": [
+            {
+                "seq": l.seq,
+                "ts": l.created_at.isoformat(),
+                "action": l.action_type,
+                "actor": l.actor,
+                "payload": l.payload,
+                "member_id": l.participant.member_id if l.participant_id else None,
+            } for l in logs
+        ],
+        "last_seq": logs[-1].seq if logs else after_seq,
+    }
+
+
+def room_version(room_id: int) -> Optional[int]:
+    """Versión de estado de la sala (RaidRoom.log_seq), o None si no existe."""
+    return RaidRoom.objects.filter(pk=room_id).values_list("log_seq", flat=True).first()
+
+
+def _snapshot_key(room_id: int, version: int) -> str:
+    return f"raid:spectate:{room_id}:{version}"
+
+
+def _latest_key(room_id: int) -> str:
+    return f"raid:spectate:{room_id}:latest"
+
+
+def _build(room_id: int, version: int) -> Optional[dict]:
+    room = RaidRoom.objects.select_related("raid").filter(pk=room_id).first()
+    if room is None:
+        return None
+    snapshot = serialize_room_state(room)
+    cache.set(_snapshot_key(room_id, version), snapshot, SNAPSHOT_TTL)
+    cache.set(_latest_key(room_id), (version, snapshot), SNAPSHOT_TTL)
+    return snapshot
+
+
+def spectator_snapshot(room_id: int) -> Optional[Tuple[int, dict]]:
+    """
+    (versión, snapshot) de la sala, o None si no existe. Con el snapshot en caché, un espectador
+    hace una sola consulta (la versión); solo el primero que llega tras un cambio reconstruye el
+    snapshot, y mientras tanto el resto recibe el anterior.
+    """
+    version = room_version(room_id)
+    if version is None:
+        return None
+    key = _snapshot_key(room_id, version)
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        return version, snapshot
+
+    lock = f"{key}:lock"
+    if cache.add(lock, 1, LOCK_TTL):
+        try:
+            snapshot = _build(room_id, version)
+        finally:
+            cache.delete(lock)
+        return (version, snapshot) if snapshot is not None else None
+
+    latest = cache.get(_latest_key(room_id))
+    if latest is not None:
+        return latest
+
+    # Primer snapshot de la sala en construcción: esperar un poco antes de calcularlo también
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        snapshot = cache.get(key)
+        if snapshot is not None:
+            return version, snapshot
+    snapshot = _build(room_id, version)
+    return (version, snapshot) if snapshot is not None else None
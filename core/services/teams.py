@@ -0,0 +1,71 @@
+# core/services/teams.py
+from __future__ import annotations
+from typing import Sequence
+
+from django.db import transaction
+
+from core.models import Member, PlayerHero, Team, TeamSlot
+
+# Edición del equipo activo como una alineación completa: se valida en memoria (tamaño, héroes
+# propios, sin repetir Hero base) con una sola consulta y se aplica el diff mínimo contra los
+# TeamSlot existentes (un delete, un bulk_create y un bulk_update de posiciones como máximo).
+MAX_TEAM_SIZE = 4
+
+
+class TeamError(Exception):
+    """Alineación no válida; el mensaje es el código de error de la API."""
+
+
+def validate_lineup(member: Member, player_hero_ids: Sequence[int]) -> list:
+    """Comprueba la alineación deseada (en orden de posición). Devuelve los ids como enteros."""
+    try:
+        ids = [int(ph_id) for ph_id in player_hero_ids]
+    except (TypeError, ValueError):
+        raise TeamError("invalid_player_hero_id")
+    if len(ids) > MAX_TEAM_SIZE:
+        raise TeamError("team_full")
+    if len(set(ids)) != len(ids):
+        raise TeamError("duplicate_hero")
+
+    owned = dict(PlayerHero.objects.filter(member=member, id__in=ids).values_list("id", "hero_id"))
+    if len(owned) != len(ids):
+        raise TeamError("not_found")
+    if len(set(owned.values())) != len(ids):
+        raise TeamError("duplicate_hero")
+    return ids
+
+
+@transaction.atomic
+def set_lineup(member: Member, player_hero_ids: Sequence[int]) -> dict:
+    """
+    Deja el equipo activo del miembro (creándolo si no existe) con exactamente esos héroes y en
+    ese orden. Devuelve {"team_id", "added", "removed", "moved"} con los player_hero_id afectados.
+    """
+    ids = validate_lineup(member, player_hero_ids)
+    team = Team.objects.select_for_update().filter(owner=member, is_active=True).first()
+    if team is None:
+        team = Team.objects.create(owner=member, is_active=True)
+        current = {}
+    else:
+        current = {slot.player_hero_id: slot
+                   for slot in TeamSlot.objects.filter(team=team).only("id", "player_hero_id", "position")}
+
+    wanted = {ph_id: position for position, ph_id in enumerate(ids)}
+    removed = [ph_id for ph_id in current if ph_id not in wanted]
+    added = [ph_id for ph_id in ids if ph_id not in current]
+    moved = []
+    for ph_id, slot in current.items():
+        position = wanted.get(ph_id)
+        if position is not None and slot.position != position:
+            slot.position = position
+            moved.append(slot)
+
+    if removed:
+        TeamSlot.objects.filter(team=team, player_hero_id__in=removed).delete()
+    if added:
+        TeamSlot.objects.bulk_create([TeamSlot(team=team, player_hero_id=ph_id, position=wanted[ph_id])
+                                      for ph_id in added])
+    if moved:
+        TeamSlot.objects.bulk_update(moved, ["position"])
+    return {"team_id": team.id, "added": added, "removed": removed,
+            "moved": [slot.player_hero_id for slot in moved]}
@@ -1,7 +1,7 @@
 # core/signals.py
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Member, Hero, PlayerHero
+from .models import Member, Hero, PlayerHero, Enemy
 
 DEFAULT_HERO_CODENAME = "novato"
 
@@ -14,3 +14,19 @@ def give_default_hero(sender, instance: Member, created: bool, **kwargs):
     except Hero.DoesNotExist:
         return  # opcional: loggear un warning
     PlayerHero.objects.get_or_create(member=instance, hero=hero, defaults={"experience": 0})
+
+
+@receiver(post_save, sender=Member)
+@receiver(post_delete, sender=Member)
+def invalidate_cached_member(sender, instance: Member, **kwargs):
+    from core.middleware import member_cache
+    member_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Enemy)
+@receiver(post_delete, sender=Enemy)
+@receiver(post_save, sender=Hero)
+@receiver(post_delete, sender=Hero)
+def invalidate_catalog_ids(sender, **kwargs):
+    from core.services.catalog import invalidate_catalog
+    invalidate_catalog(sender)
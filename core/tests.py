@@ -1,3 +1,969 @@
-from django.test import TestCase
+import random
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.utils.timezone import now
+
+from core.models import (
+    DamageProfile, Enemy, Hero, HeroSkill, Member, PlayerHero, Raid, RaidClear, RaidEnemy,
+    RaidEnemyInstance, RaidParticipant, RaidReplayArchive, RaidRewardLedger, RaidRoom, RaidTurn, RaidWave, Skill,
+    SkillEffectType, SkillSlot, SoloEncounter, Team, TeamSlot,
+)
+from core.services.battle_state import STAT_ATK_PHY, BattleState
+from core.services.combat_core import (
+    DEFENSE_FACTOR, MIN_DAMAGE, Action, CombatState, Fighter, attack_spec, resolve_action,
+)
+
+
+def _world(n_members=1, heroes_per=2, n_enemies=1):
+    """Catálogo mínimo: habilidades, héroes, enemigos, una raid de dos oleadas y miembros con equipo."""
+    basic = Skill.objects.create(name="Golpe", effect_type=SkillEffectType.DAMAGE, base_value=120,
+                                 scaling_stat="atk_phy", rage_gain=25)
+    ult = Skill.objects.create(name="Ulti", effect_type=SkillEffectType.DAMAGE, base_value=300,
+                               scaling_stat="atk_phy", rage_cost=50, target="enemy_team")
+    heroes = []
+    for i in range(heroes_per):
+        hero = Hero.objects.create(codename=f"h{i}", name=f"Hero{i}", race="elf", klass="mage", base_hp=100,
+                                   base_atk_phy=20, base_speed=10 + i, image="heroes/x.png")
+        HeroSkill.objects.create(hero=hero, skill=basic, slot="basic")
+        HeroSkill.objects.create(hero=hero, skill=ult, slot="ultimate")
+        heroes.append(hero)
+    enemies = [Enemy.objects.create(name=f"E{i}", base_hp=60, attack=8, defense=5, speed=9, level=1,
+                                    image="enemies/x.png") for i in range(n_enemies)]
+    for enemy in enemies:
+        enemy.skills.add(basic)
+    raid = Raid.objects.create(name="R", max_players=4)
+    for number in (1, 2):
+        wave = RaidWave.objects.create(raid=raid, wave_number=number, name=f"W{number}")
+        RaidEnemy.objects.create(wave=wave, enemy=enemies[0], quantity=2)
+    members = []
+    for m in range(n_members):
+        member = Member.objects.create(name=f"m{m}", firstname="x", password_member="pw",
+                                       email="a@a.com", phone=1000 + m)
+        team = Team.objects.create(owner=member)
+        for position, hero in enumerate(heroes):
+            ph = PlayerHero.objects.create(member=member, hero=hero, current_hp=100)
+            TeamSlot.objects.create(team=team, player_hero=ph, position=position)
+        members.append(member)
+    return {"basic": basic, "heroes": heroes, "enemies": enemies, "raid": raid, "members": members}
+
+
+class _FixedRng:
+    """random.Random con random() fijo (decide el crítico) y sin variación."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def random(self):
+        return self.value
+
+    def uniform(self, a, b):
+        return 1.0
+
+
+def _live_room(world):
+    """Raid en vivo del primer miembro del mundo, ya arrancada (primer turno: su héroe más rápido)."""
+    from core.services.raid_service import matchmaking_join, start_lobby_room
+
+    cache.clear()
+    return start_lobby_room(matchmaking_join(world["members"][0], raid=world["raid"]))
+
+
+# =============== MIEMBROS ===============
+class MemberPasswordTests(TestCase):
+    def _member(self, password):
+        return Member.objects.create(name="m", firstname="x", password_member=password, email="a@a.com", phone=1)
+
+    def test_set_password_hashes(self):
+        from django.contrib.auth.hashers import check_password
+
+        member = Member(name="m", firstname="x", email="a@a.com", phone=1)
+        member.set_password("secreto")
+        member.save()
+        self.assertTrue(member.has_password_hash())
+        self.assertTrue(check_password("secreto", Member.objects.get(pk=member.pk).password_member))
+
+    def test_plaintext_shaped_like_a_hash_is_hashed(self):
+        from django.contrib.auth.hashers import check_password
+
+        for raw in ("pbkdf2_sha256$secreto", "md5$secreto", "unknown$1$2$3"):
+            member = self._member(raw)
+            self.assertNotEqual(member.password_member, raw)
+            self.assertTrue(check_password(raw, member.password_member))
+            member.delete()
+
+    def test_existing_hash_is_kept(self):
+        from django.contrib.auth.hashers import make_password
+
+        encoded = make_password("secreto")
+        self.assertEqual(self._member(encoded).password_member, encoded)
+
+
+class LoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.member = Member(name="m", firstname="x", email="a@a.com", phone=600)
+        self.member.set_password("secreto")
+        self.member.save()
+
+    def test_failed_attempts_are_rate_limited(self):
+        from django.test import override_settings
+        from core.services.auth_service import LoginRateLimited, WrongPassword, authenticate_member
+
+        with override_settings(LOGIN_RATE_LIMIT_ATTEMPTS=2):
+            self.assertEqual(authenticate_member(600, "secreto").pk, self.member.pk)
+            for _ in range(2):
+                with self.assertRaises(WrongPassword):
+                    authenticate_member(600, "mal")
+            with self.assertRaises(LoginRateLimited):
+                authenticate_member(600, "secreto")
+
+    def test_outdated_hash_is_upgraded_on_login(self):
+        from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+        from core.services.auth_service import authenticate_member
+
+        old = make_password("secreto", hasher="pbkdf2_sha1")
+        Member.objects.filter(pk=self.member.pk).update(password_member=old)
+        authenticate_member(600, "secreto")
+        stored = Member.objects.get(pk=self.member.pk).password_member
+        self.assertNotEqual(stored, old)
+        self.assertEqual(identify_hasher(stored).algorithm, "pbkdf2_sha256")
+        self.assertTrue(check_password("secreto", stored))
+
+
+class MemberCacheTests(TestCase):
+    def setUp(self):
+        from core.middleware import member_cache
+
+        member_cache.clear()
+        self.member = Member.objects.create(name="m", firstname="x", password_member="pw", email="a@a.com", phone=1)
+
+    def _request(self):
+        from django.test import RequestFactory
+
+        request = RequestFactory().get("/")
+        request.session = {"member_id": self.member.pk}
+        return request
+
+    def test_lru_evicts_the_least_recent_and_expired_entries(self):
+        from core.middleware import _MemberLRU
+
+        lru = _MemberLRU(maxsize=2, ttl=60)
+        lru.set(1, ("a",))
+        lru.set(2, ("b",))
+        lru.get(1)
+        lru.set(3, ("c",))
+        self.assertEqual((lru.get(1), lru.get(2), lru.get(3)), (("a",), None, ("c",)))
+
+        expired = _MemberLRU(maxsize=2, ttl=-1)
+        expired.set(1, ("a",))
+        self.assertIsNone(expired.get(1))
+
+    def test_cached_member_needs_no_query_until_saved(self):
+        from core.middleware import get_member
+
+        self.assertEqual(get_member(self._request()).pk, self.member.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_member(self._request()).name, "m")
+
+        self.member.name = "nuevo"
+        self.member.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_member(self._request()).name, "nuevo")
+
+
+# =============== NÚCLEO DE COMBATE ===============
+class ResolveActionTests(SimpleTestCase):
+    def _state(self, mods=None, rng=None, crit_chance=0.0, defense=0):
+        caster = Fighter(1, 100, 100, crit_chance=crit_chance, crit_damage=2.0)
+        target = Fighter(-1, 500, 500, def_phy=defense, def_mag=defense)
+        return CombatState([caster, target], mods=mods, rng=rng or _FixedRng(0.99))
+
+    def test_damage_subtracts_scaled_defense(self):
+        state = self._state(defense=100)
+        spec = attack_spec("Golpe", 100, profile=DamageProfile.PHYSICAL)
+        result = resolve_action(state, Action(1, spec, [-1]))
+        self.assertEqual(result.amounts, [int(100 - 100 * DEFENSE_FACTOR)])
+        self.assertEqual(state.fighters[-1].hp, 500 - result.amounts[0])
+        self.assertFalse(result.crit)
+
+    def test_damage_is_never_below_minimum(self):
+        state = self._state(defense=10_000)
+        result = resolve_action(state, Action(1, attack_spec("Golpe", 10, profile=DamageProfile.PHYSICAL), [-1]))
+        self.assertEqual(result.amounts, [MIN_DAMAGE])
+        self.assertEqual(MIN_DAMAGE, 1)
+
+    def test_heal_is_capped_at_max_hp(self):
+        state = self._state()
+        state.fighters[1].hp = 70
+        spec = dict(attack_spec("Cura", 50), effect=SkillEffectType.HEAL)
+        result = resolve_action(state, Action(1, spec, [1]))
+        self.assertEqual(result.amounts, [30])
+        self.assertEqual(state.fighters[1].hp, 100)
+
+    def test_crit_only_for_active_skills(self):
+        basic = attack_spec("Golpe", 100, slot=SkillSlot.BASIC)
+        result = resolve_action(self._state(crit_chance=1.0, rng=_FixedRng(0.0)), Action(1, basic, [-1]))
+        self.assertTrue(result.crit)
+        self.assertEqual(result.amounts, [200])
+
+        passive = attack_spec("Espinas", 100)
+        result = resolve_action(self._state(crit_chance=1.0, rng=_FixedRng(0.0)), Action(1, passive, [-1]))
+        self.assertFalse(result.crit)
+        self.assertEqual(result.amounts, [100])
+
+    def test_buff_scales_the_power_stat(self):
+        mods = BattleState(room_id=0)
+        state = self._state(mods=mods)
+        buff = dict(attack_spec("Furia", 0), effect=SkillEffectType.BUFF, stats=[STAT_ATK_PHY], percent=0.5)
+        self.assertEqual(resolve_action(state, Action(1, buff, [1])).amounts, [0])
+        self.assertEqual(mods.modifier(1, STAT_ATK_PHY), 0.5)
+
+        result = resolve_action(state, Action(1, attack_spec("Golpe", 100), [-1]))
+        self.assertEqual(result.amounts, [150])
+
+        mods.advance(mods.turn + 2)
+        result = resolve_action(state, Action(1, attack_spec("Golpe", 100), [-1]))
+        self.assertEqual(result.amounts, [100])
+
+
+class CombatBenchTests(SimpleTestCase):
+    """Los escenarios de bench_combat se ejecutan en la suite; los tiempos solo se informan."""
+
+    def test_full_fight_is_deterministic(self):
+        from core.management.commands.bench_combat import _fight
+
+        actions = _fight(random.Random(7), 16, 12)
+        self.assertGreater(actions, 28)
+        self.assertEqual(_fight(random.Random(7), 16, 12), actions)
+
+    def test_command_runs_every_scenario(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command("bench_combat", iterations=20, repeat=1, targets=[4], stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 8)
+        self.assertTrue(lines[-1].startswith("Combate completo 16 vs 12"))
+
+
+# =============== REGLAS DE RAID ===============
+class RaidRulesTests(SimpleTestCase):
+    def _skill(self, target, effect=SkillEffectType.DAMAGE, **kwargs):
+        return dict(attack_spec("Golpe", 10, slot=SkillSlot.BASIC), target=target, effect=effect,
+                    rage_cost=0, rage_gain=0, **kwargs)
+
+    def test_skill_targets(self):
+        from core.models import SkillTarget
+        from core.services.raid_rules import skill_targets
+
+        enemies, heroes = [-1, -2], [1, 2]
+        hp = {1: 0.9, 2: 0.3}
+        args = (lambda: list(enemies), lambda: list(heroes), hp.get)
+
+        self.assertEqual(skill_targets(self._skill(SkillTarget.ENEMY_SINGLE), 1, -2, *args), ([-2], []))
+        self.assertEqual(skill_targets(self._skill(SkillTarget.ENEMY_SINGLE), 1, -9, *args), ([-1], []))
+        self.assertEqual(skill_targets(self._skill(SkillTarget.ENEMY_SINGLE), 1, -9, *args, fallback=False),
+                         ([], []))
+        self.assertEqual(skill_targets(self._skill(SkillTarget.ENEMY_TEAM), 1, None, *args), ([-1, -2], []))
+        self.assertEqual(skill_targets(self._skill(SkillTarget.ALLY_SINGLE, SkillEffectType.HEAL), 1, None, *args),
+                         ([], [2]))
+        self.assertEqual(skill_targets(self._skill(SkillTarget.ALLY_TEAM, SkillEffectType.DAMAGE), 1, None, *args),
+                         ([], []))
+
+    def test_rage_gates_the_ultimate(self):
+        from core.services.raid_rules import settle_rage, usable_skill
+
+        table = {"heroes": {1: {"rage_max": 100, "rage_on_hit": 5}}}
+        ult = dict(self._skill("enemy_team"), slot=SkillSlot.ULTIMATE, rage_cost=50)
+        basic = dict(self._skill("enemy_single"), rage_gain=25)
+        state = BattleState(0)
+        state.rage[1] = 20
+        self.assertIsNone(usable_skill(state, 1, ult))
+        self.assertIs(usable_skill(state, 1, basic), basic)
+
+        self.assertEqual(settle_rage(state, table, 1, basic, hit=True), 50)
+        self.assertIs(usable_skill(state, 1, ult), ult)
+        self.assertEqual(settle_rage(state, table, 1, ult, hit=False), 0)
+
+    def test_passive_targets(self):
+        from core.models import PassiveTrigger, SkillTarget
+        from core.services.raid_rules import PERMANENT_TURNS, passive_targets, passive_turns
+
+        alive_enemies, alive_heroes = (lambda: [-1, -2]), (lambda: [1, 2])
+        thorns = dict(self._skill(SkillTarget.ENEMY_SINGLE), trigger=PassiveTrigger.ON_DAMAGED)
+        self.assertEqual(passive_targets(thorns, 1, [-2], alive_enemies, alive_heroes), ([-2], []))
+        self.assertIsNone(passive_targets(thorns, 1, [], alive_enemies, alive_heroes))
+
+        aura = dict(self._skill(SkillTarget.ALLY_TEAM, SkillEffectType.BUFF), stats=[STAT_ATK_PHY],
+                    trigger=PassiveTrigger.ALWAYS)
+        self.assertEqual(passive_targets(aura, 1, [], alive_enemies, alive_heroes), ([], [1, 2]))
+        self.assertEqual(passive_turns(aura), PERMANENT_TURNS)
+        self.assertIsNone(passive_targets(dict(aura, stats=[]), 1, [], alive_enemies, alive_heroes))
+
+    def test_enemy_hit_log(self):
+        from core.services.raid_rules import enemy_hit_log
+
+        self.assertEqual(enemy_hit_log(7, 1, "Hero", 12, 30, 18)[0], "enemy_attack")
+        action_type, payload = enemy_hit_log(7, 1, "Hero", 40, 30, 0)
+        self.assertEqual((action_type, payload["old_hp"]), ("hero_killed", 30))
+
+
+# =============== LOG DE SALAS ===============
+class RaidLogTests(TestCase):
+    def setUp(self):
+        self.room = RaidRoom.objects.create(max_players=1)
+
+    def _log(self):
+        from core.models import RaidDecisionLog
+
+        return list(RaidDecisionLog.objects.filter(room=self.room).order_by("seq")
+                    .values_list("seq", "action_type"))
+
+    def test_buffered_events_are_numbered_in_order(self):
+        from core.services.raid_log import buffered_log, log_event
+
+        log_event(self.room, "join")
+        with buffered_log():
+            log_event(self.room, "start")
+            with buffered_log():
+                log_event(self.room.pk, "hero_attack")
+            self.assertEqual(len(self._log()), 1)  # se vuelca al cerrar el bloque exterior
+            log_event(self.room, "enemy_attack")
+        self.assertEqual(self._log(), [(1, "join"), (2, "start"), (3, "hero_attack"), (4, "enemy_attack")])
+        self.assertEqual(RaidRoom.objects.get(pk=self.room.pk).log_seq, 4)
+
+    def test_failed_block_writes_nothing(self):
+        from core.services.raid_log import buffered_log, log_event
+
+        with self.assertRaises(RuntimeError):
+            with buffered_log():
+                log_event(self.room, "start")
+                raise RuntimeError
+        log_event(self.room, "join")
+        self.assertEqual(self._log(), [(1, "join")])
+
+
+# =============== RAIDS EN VIVO ===============
+class QueuedDecisionTests(TestCase):
+    def setUp(self):
+        self.world = _world()
+        self.member = self.world["members"][0]
+        self.room = _live_room(self.world)
+
+    def test_queued_actions_run_in_turn_order(self):
+        from core.models import RaidDecisionLog
+        from core.services.raid_service import get_current_turn, queue_player_decisions
+
+        first = get_current_turn(self.room)
+        result = queue_player_decisions(self.member, self.room, [{"hero_id": None, "target_enemy_id": None,
+                                                                   "ability_id": None}])
+        self.assertEqual(result, {"queued": 2, "applied": 2})
+        self.assertEqual(get_current_turn(self.room).actor_type, "enemy")
+        heroes = list(RaidDecisionLog.objects.filter(room=self.room, action_type="hero_attack")
+                      .order_by("seq").values_list("payload__hero_id", flat=True))
+        self.assertEqual(heroes[0], first.hero_instance_id)
+        self.assertEqual(len(heroes), 2)
+
+    def test_rejects_actions_it_cannot_queue(self):
+        from core.services.raid_service import RaidError, queue_player_decisions
+
+        for actions, message in (([], "No hay acciones"),
+                                 ([{"hero_id": 10 ** 6}], "Héroes sin turno"),
+                                 ([{"hero_id": None, "ability_id": 10 ** 6}], "Habilidad no disponible"),
+                                 ([{"hero_id": None, "target_enemy_id": 10 ** 6}], "Objetivo no válido")):
+            with self.assertRaisesMessage(RaidError, message):
+                queue_player_decisions(self.member, self.room, actions)
+        self.assertFalse(RaidTurn.objects.filter(room=self.room).exclude(queued_action=None).exists())
+
+
+class LiveRaidSkillTests(TestCase):
+    def setUp(self):
+        self.world = _world()
+        self.member = self.world["members"][0]
+        Enemy.objects.update(base_hp=1000)  # que la oleada no caiga en el primer golpe
+
+    def _start(self):
+        """Arranca la raid y devuelve el héroe del primer turno."""
+        from core.services.raid_service import get_current_turn
+
+        self.room = _live_room(self.world)
+        return get_current_turn(self.room).hero_instance
+
+    def _set_rage(self, hero_id, rage):
+        from core.services.battle_state import load_battle_state, save_battle_state
+
+        state = load_battle_state(self.room)
+        state.rage[hero_id] = rage
+        save_battle_state(state)
+
+    def _payloads(self, action_type):
+        from core.models import RaidDecisionLog
+
+        return list(RaidDecisionLog.objects.filter(room=self.room, action_type=action_type)
+                    .order_by("seq").values_list("payload", flat=True))
+
+    def test_team_skill_hits_every_enemy_in_one_action(self):
+        from core.services.raid_service import submit_player_decision
+
+        hero = self._start()
+        self._set_rage(hero.id, 50)
+        alive = set(RaidEnemyInstance.objects.filter(room=self.room, is_alive=True).values_list("id", flat=True))
+        submit_player_decision(self.member, self.room, ability_id=Skill.objects.get(name="Ulti").id)
+
+        (payload,) = self._payloads("hero_skill")
+        self.assertEqual({enemy_id for enemy_id, _, _ in payload["enemies"]}, alive)
+        hp = dict(RaidEnemyInstance.objects.filter(id__in=alive).values_list("id", "current_hp"))
+        for enemy_id, dmg, remaining in payload["enemies"]:
+            self.assertGreater(dmg, 0)
+            self.assertEqual(hp[enemy_id], remaining)
+
+    def test_buffs_are_kept_in_the_battle_state_until_they_expire(self):
+        from core.services.battle_state import DEFAULT_EFFECT_TURNS, STAT_ATK_PHY, hero_actor, load_battle_state
+        from core.services.raid_service import submit_player_decision
+
+        shout = Skill.objects.create(name="Grito", effect_type=SkillEffectType.BUFF, target="ally_team",
+                                     percent_value=0.2, scaling_stat="atk_phy")
+        HeroSkill.objects.filter(hero=self.world["heroes"][1], slot="ultimate").update(skill=shout)
+        hero = self._start()
+        self.assertEqual(hero.hero_id, self.world["heroes"][1].id)
+        submit_player_decision(self.member, self.room, ability_id=shout.id)
+
+        (payload,) = self._payloads("hero_skill")
+        self.assertEqual(payload["turns"], DEFAULT_EFFECT_TURNS)
+        team = PlayerHero.objects.filter(member=self.member).values_list("id", flat=True)
+        state = load_battle_state(self.room)
+        self.assertEqual({(actor, stat, round(mag, 6)) for actor, stat, mag, _ in state.active_effects()},
+                         {(hero_actor(ph_id), STAT_ATK_PHY, 0.2) for ph_id in team})
+        self.assertEqual(state.advance(state.turn + DEFAULT_EFFECT_TURNS), len(team))
+        self.assertEqual(state.effective(hero_actor(hero.id), STAT_ATK_PHY, 100), 100)
+
+
+    def test_passives_fire_at_start_and_on_hit(self):
+        from core.models import RaidDecisionLog
+        from core.services.battle_state import STAT_ATK_PHY, hero_actor, load_battle_state
+        from core.services.raid_rules import PERMANENT_TURNS
+        from core.services.raid_service import submit_player_decision
+
+        hero_def = self.world["heroes"][1]
+        aura = Skill.objects.create(name="Aura", effect_type=SkillEffectType.BUFF, target="self",
+                                    percent_value=0.1, scaling_stat="atk_phy", passive_trigger="always")
+        thorn = Skill.objects.create(name="Espina", effect_type=SkillEffectType.DAMAGE, base_value=5,
+                                     passive_trigger="on_hit")
+        HeroSkill.objects.create(hero=hero_def, skill=aura, slot="passive_1")
+        HeroSkill.objects.create(hero=hero_def, skill=thorn, slot="passive_2")
+        hero = self._start()
+
+        (start,) = self._payloads("passive")
+        self.assertEqual((start["skill_id"], start["trigger"]), (aura.id, "always"))
+        state = load_battle_state(self.room)
+        self.assertEqual([(a, s, e - state.turn) for a, s, _, e in state.active_effects()],
+                         [(hero_actor(hero.id), STAT_ATK_PHY, PERMANENT_TURNS)])
+
+        submit_player_decision(self.member, self.room)
+        hit, passive = RaidDecisionLog.objects.filter(room=self.room).order_by("-seq")[:2][::-1]
+        self.assertEqual((hit.action_type, passive.action_type), ("hero_attack", "passive"))
+        self.assertEqual(passive.payload["skill_id"], thorn.id)
+        self.assertEqual(passive.payload["enemies"][0][0], hit.payload["enemy_id"])
+
+
+    def test_ultimate_is_gated_by_rage(self):
+        from core.services.battle_state import load_battle_state
+        from core.services.raid_service import (
+            RaidError, get_current_turn, queue_player_decisions, submit_player_decision,
+        )
+
+        ult = Skill.objects.get(name="Ulti")
+        first = self._start()
+        with self.assertRaisesMessage(RaidError, "Ira insuficiente"):
+            submit_player_decision(self.member, self.room, ability_id=ult.id)
+        self.assertEqual(get_current_turn(self.room).hero_instance_id, first.id)
+
+        # Encolada sin ira: se usa la básica, que suma rage_gain
+        queue_player_decisions(self.member, self.room, [{"hero_id": first.id, "ability_id": ult.id}])
+        (attack,) = self._payloads("hero_attack")
+        self.assertEqual((attack["skill_id"], attack["rage"]), (self.world["basic"].id, 25))
+
+        second = get_current_turn(self.room).hero_instance
+        self._set_rage(second.id, 60)
+        submit_player_decision(self.member, self.room, ability_id=ult.id)
+        (skill,) = self._payloads("hero_skill")
+        self.assertEqual((skill["skill_id"], skill["rage"]), (ult.id, 10))
+        self.assertEqual(load_battle_state(self.room).rage, {first.id: 25, second.id: 10})
+
+
+# =============== ESPECTADORES ===============
+class SpectatorSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.room = RaidRoom.objects.create(max_players=1)
+
+    def test_snapshot_is_shared_per_version(self):
+        from core.services.raid_log import log_event
+        from core.services.spectator import spectator_snapshot
+
+        self.assertEqual(spectator_snapshot(self.room.pk)[0], 0)
+        with self.assertNumQueries(1):
+            version, snapshot = spectator_snapshot(self.room.pk)
+        self.assertEqual((version, snapshot["logs"]), (0, []))
+
+        log_event(self.room, "join")
+        version, snapshot = spectator_snapshot(self.room.pk)
+        self.assertEqual((version, [l["action"] for l in snapshot["logs"]]), (1, ["join"]))
+        self.assertIsNone(spectator_snapshot(10 ** 6))
+
+    def test_previous_snapshot_is_served_while_rebuilding(self):
+        from core.services.raid_log import log_event
+        from core.services.spectator import _snapshot_key, spectator_snapshot
+
+        spectator_snapshot(self.room.pk)
+        log_event(self.room, "join")
+        cache.add(f"{_snapshot_key(self.room.pk, 1)}:lock", 1)  # otro worker lo está reconstruyendo
+        self.assertEqual(spectator_snapshot(self.room.pk)[0], 0)
+
+
+# =============== ESTADO DE COMBATE ===============
+class BattleStateStorageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        world = _world()
+        self.room = RaidRoom.objects.create(owner=world["members"][0], raid=world["raid"], max_players=4,
+                                            state="in_progress")
+
+    def test_actions_stay_in_the_cache_until_a_snapshot(self):
+        from core.services.battle_state import load_battle_state, save_battle_state, snapshot_battle_state
+
+        state = load_battle_state(self.room)
+        state.rage[1] = 40
+        save_battle_state(state)
+        self.assertEqual(RaidRoom.objects.get(pk=self.room.pk).battle_state, {})
+        self.assertEqual(load_battle_state(self.room).rage, {1: 40})
+
+        self.assertTrue(snapshot_battle_state(self.room, state))
+        self.assertEqual(RaidRoom.objects.get(pk=self.room.pk).battle_state["version"], state.version)
+
+    def test_newer_snapshot_wins_over_a_stale_cache(self):
+        from core.services.battle_state import load_battle_state, save_battle_state, snapshot_battle_state
+
+        stale = load_battle_state(self.room)
+        save_battle_state(stale)
+        fresh = BattleState(self.room.pk, version=stale.version + 5)
+        fresh.rage[1] = 10
+        RaidRoom.objects.filter(pk=self.room.pk).update(battle_state=fresh.to_snapshot())
+        room = RaidRoom.objects.get(pk=self.room.pk)
+        self.assertEqual(load_battle_state(room).rage, {1: 10})
+
+        RaidRoom.objects.filter(pk=self.room.pk).update(state="finished")
+        self.assertFalse(snapshot_battle_state(room, stale))
+
+    def test_local_cache_warning(self):
+        from core.checks import raid_cache_check
+
+        with self.settings(RAID_SHARED_CACHE=False, DEBUG=False):
+            self.assertEqual([w.id for w in raid_cache_check(None)], ["core.W001"])
+        with self.settings(RAID_SHARED_CACHE=True, DEBUG=False):
+            self.assertEqual(raid_cache_check(None), [])
+
+
+# =============== COMBATE EN SOLITARIO ===============
+class SoloCombatTests(TestCase):
+    def setUp(self):
+        self.world = _world(heroes_per=1)
+        self.member = self.world["members"][0]
+        self.ph = PlayerHero.objects.select_related("hero").get(member=self.member)
+        self.enemy = self.world["enemies"][0]
+
+    def _encounter(self, **kwargs):
+        fields = dict(member=self.member, player_hero=self.ph, enemy=self.enemy, hero_hp=100,
+                      enemy_hp=self.enemy.base_hp, turn="hero")
+        fields.update(kwargs)
+        return SoloEncounter.objects.create(**fields)
+
+    def test_hero_ability_can_crit(self):
+        from core.services.combat_service import hero_turn
+
+        Hero.objects.filter(pk=self.ph.hero_id).update(base_crit_chance=1.0, base_crit_damage=2.0)
+        self.ph.hero.refresh_from_db()
+        encounter = self._encounter(enemy_hp=10_000)
+        hero_turn(encounter, self.world["basic"])
+        self.assertIn("¡Crítico!", encounter.log[0])
+
+    def test_hero_deals_minimum_damage(self):
+        from core.services.combat_service import hero_turn
+
+        Enemy.objects.filter(pk=self.enemy.pk).update(defense=100_000)
+        self.enemy.refresh_from_db()
+        encounter = self._encounter()
+        hero_turn(encounter, self.world["basic"])
+        self.assertEqual(encounter.enemy_hp, self.enemy.base_hp - MIN_DAMAGE)
+
+    def test_log_keeps_the_last_lines(self):
+        from core.services.combat_service import COMBAT_LOG_MAX, hero_turn
+
+        encounter = self._encounter(enemy_hp=10_000)
+        for _ in range(COMBAT_LOG_MAX + 3):
+            encounter.turn = "hero"
+            hero_turn(encounter, self.world["basic"])
+            last = encounter.log[-1]
+        encounter.refresh_from_db()
+        self.assertEqual(len(encounter.log), COMBAT_LOG_MAX)
+        self.assertEqual(encounter.log[-1], last)
+
+    def test_simulated_enemy_uses_its_own_abilities(self):
+        from core.services.combat_service import simulate_combat_with_ability
+
+        bite = Skill.objects.create(name="Mordisco", effect_type=SkillEffectType.DAMAGE, base_value=100)
+        self.enemy.skills.set([bite])
+        random.seed(1)
+        result = simulate_combat_with_ability(self.ph, self.enemy, self.world["basic"].id)
+        enemy_lines = [line for line in result.log if line.startswith(f"{self.enemy.name} usa")]
+        self.assertTrue(enemy_lines)
+        self.assertTrue(all("Mordisco" in line for line in enemy_lines))
+
+
+# =============== CATÁLOGO ===============
+class CatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.enemies = _world(n_members=0, n_enemies=3)["enemies"]
+
+    def test_saving_a_row_invalidates_the_cached_ids(self):
+        from core.services.catalog import random_pick_id
+
+        ids = {random_pick_id(Enemy, rng=random.Random(i), level=1) for i in range(30)}
+        self.assertEqual(ids, {e.pk for e in self.enemies})
+        extra = Enemy.objects.create(name="Nuevo", base_hp=1, attack=1, defense=1, speed=1, level=1,
+                                     image="enemies/x.png")
+        Enemy.objects.exclude(pk=extra.pk).update(level=2)  # update() no lanza señales
+        self.assertEqual(random_pick_id(Enemy, rng=random.Random(0), level=1), extra.pk)
+
+    def test_stale_id_is_retried_from_a_fresh_load(self):
+        from core.services.catalog import _catalog_key, random_pick
+
+        cache.set(_catalog_key(Enemy, None, {}), ([10 ** 6], None))
+        self.assertIn(random_pick(Enemy, rng=random.Random(0)), self.enemies)
+
+        Enemy.objects.all().delete()
+        self.assertIsNone(random_pick(Enemy, rng=random.Random(0)))
+
+
+# =============== EQUIPOS ===============
+class SetLineupTests(TestCase):
+    def setUp(self):
+        self.world = _world(heroes_per=3)
+        self.member = self.world["members"][0]
+        self.ids = list(PlayerHero.objects.filter(member=self.member).order_by("id").values_list("id", flat=True))
+
+    def _lineup(self):
+        return list(TeamSlot.objects.filter(team__owner=self.member, team__is_active=True)
+                    .order_by("position").values_list("player_hero_id", flat=True))
+
+    def test_applies_minimal_diff(self):
+        a, b, c = self.ids
+        from core.services.teams import set_lineup
+
+        result = set_lineup(self.member, [c, a])
+        self.assertEqual(result["added"], [])
+        self.assertEqual(result["removed"], [b])
+        self.assertEqual(sorted(result["moved"]), sorted([a, c]))
+        self.assertEqual(self._lineup(), [c, a])
+
+        result = set_lineup(self.member, [c, a])
+        self.assertEqual((result["added"], result["removed"], result["moved"]), ([], [], []))
+
+        result = set_lineup(self.member, [c, b])
+        self.assertEqual((result["added"], result["removed"], result["moved"]), ([b], [a], []))
+        self.assertEqual(self._lineup(), [c, b])
+
+    def test_rejects_invalid_lineups(self):
+        from core.services.teams import TeamError, set_lineup
+
+        for lineup, code in (([self.ids[0], self.ids[0]], "duplicate_hero"),
+                             (self.ids + [1, 2], "team_full"),
+                             (["x"], "invalid_player_hero_id"),
+                             ([999_999], "not_found")):
+            with self.assertRaisesMessage(TeamError, code):
+                set_lineup(self.member, lineup)
+        self.assertEqual(self._lineup(), self.ids)
+
+    def test_api_rejects_bodies_that_are_not_a_list_of_ids(self):
+        import json
+
+        session = self.client.session
+        session["member_id"] = self.member.pk
+        session.save()
+        for body in ({"player_hero_ids": "123"}, {"player_hero_ids": {"1": 2}}, {"player_hero_ids": [1.5]},
+                     {"player_hero_ids": [True]}, {}, []):
+            response = self.client.post("/api/team/edit/", json.dumps(body), content_type="application/json")
+            self.assertEqual((response.status_code, response.json()["error"]), (400, "invalid_body"), body)
+        self.assertEqual(self._lineup(), self.ids)
+
+        response = self.client.post("/api/team/edit/", json.dumps({"player_hero_ids": self.ids[:1]}),
+                                    content_type="application/json")
+        self.assertTrue(response.json()["ok"])
+        self.assertEqual(self._lineup(), self.ids[:1])
+
+
+# =============== VIDA DE HÉROES ===============
+class HeroRegenTests(TestCase):
+    def test_regen_is_capped_and_skips_fallen_heroes(self):
+        from core.services.hero_hp import regenerated_hp
+
+        at = now()
+        self.assertEqual(regenerated_hp(50, 100, at - timedelta(minutes=10), at), 60)
+        self.assertEqual(regenerated_hp(50, 100, at - timedelta(days=1), at), 100)
+        self.assertEqual(regenerated_hp(0, 100, at - timedelta(days=1), at), 0)
+
+    def test_time_inside_a_raid_does_not_regenerate(self):
+        from core.services.hero_hp import hp_now
+        from core.services.raid_service import finish_room, matchmaking_join, start_lobby_room
+
+        cache.clear()
+        world = _world(heroes_per=1)
+        member = world["members"][0]
+        room = start_lobby_room(matchmaking_join(member, raid=world["raid"]))
+        ph = PlayerHero.objects.get(member=member)
+        # Daño al principio de una raid larga
+        PlayerHero.objects.filter(pk=ph.pk).update(current_hp=40, hp_updated_at=now() - timedelta(hours=1))
+        finish_room(RaidRoom.objects.get(pk=room.pk), "heroes")
+        self.assertEqual(hp_now(PlayerHero.objects.get(pk=ph.pk)), 40)
+
+
+# =============== RECOMPENSAS ===============
+class RoomRewardsTests(TestCase):
+    def setUp(self):
+        self.world = _world(n_members=2)
+        raid = self.world["raid"]
+        raid.hero_xp = 50
+        raid.save(update_fields=["hero_xp"])
+        self.room = RaidRoom.objects.create(owner=self.world["members"][0], raid=raid, max_players=4,
+                                            state="finished", wave_index=2, random_seed=7)
+        for member in self.world["members"]:
+            RaidParticipant.objects.create(room=self.room, member=member,
+                                           hero=PlayerHero.objects.filter(member=member).first())
+
+    def test_rewards_are_granted_once(self):
+        from core.services.raid_rewards import distribute_room_rewards
+
+        summary = distribute_room_rewards(self.room, "heroes")
+        self.assertEqual(summary["xp_per_hero"], 50)
+        self.assertEqual(len(summary["members"]), 2)
+        self.assertIsNone(distribute_room_rewards(RaidRoom.objects.get(pk=self.room.pk), "heroes"))
+
+        self.assertEqual(RaidRewardLedger.objects.filter(room=self.room).count(), 2)
+        self.assertEqual(list(RaidClear.objects.values_list("clears", flat=True)), [1, 1])
+        self.assertEqual(set(PlayerHero.objects.values_list("experience", flat=True)), {50})
+
+    def test_defeat_gives_partial_xp_and_no_clear(self):
+        from core.services.raid_rewards import distribute_room_rewards
+
+        self.room.wave_index = 1
+        summary = distribute_room_rewards(self.room, "enemies")
+        self.assertEqual(summary["xp_per_hero"], 25)
+        self.assertFalse(RaidClear.objects.exists())
+
+
+# =============== BARRIDOS ===============
+class _BrokenExecutor:
+    def submit(self, *args, **kwargs):
+        raise RuntimeError("pool caído")
+
+
+class RaidSweepTests(TestCase):
+    def setUp(self):
+        from core.models import ResourceType, RaidReward
+
+        self.world = _world()
+        self.member = self.world["members"][0]
+        self.raid = self.world["raid"]
+        self.raid.hero_xp = 10
+        self.raid.save(update_fields=["hero_xp"])
+        self.gold = ResourceType.objects.create(name="Oro", description="")
+        RaidReward.objects.create(raid=self.raid, resource_type=self.gold, min_amount=4, max_amount=6, chance=1.0)
+
+    def test_requires_a_clear(self):
+        from core.services.raid_rewards import sweep_raid
+        from core.services.raid_service import RaidError
+
+        with self.assertRaisesMessage(RaidError, "Completa la raid"):
+            sweep_raid(self.member, self.raid, 3)
+
+    def test_pure_sweep_grants_expected_rewards(self):
+        from core.models import PlayerResource
+        from core.services.raid_rewards import sweep_raid
+
+        RaidClear.objects.create(member=self.member, raid=self.raid, clears=1)
+        result = sweep_raid(self.member, self.raid, 3)
+        self.assertEqual((result["wins"], result["xp_per_hero"]), (3, 30))
+        self.assertEqual(result["resources"], {str(self.gold.id): 15})
+        self.assertEqual(set(PlayerHero.objects.values_list("experience", flat=True)), {30})
+        self.assertEqual(PlayerResource.objects.get(member=self.member, resource_type=self.gold).amount, 15)
+        self.assertEqual(RaidClear.objects.get(member=self.member).sweeps, 3)
+
+    def test_simulated_sweep_falls_back_inline_when_the_pool_fails(self):
+        from core.services.raid_rewards import simulate_clears, sweep_raid
+
+        RaidClear.objects.create(member=self.member, raid=self.raid, clears=1)
+        inline = simulate_clears(self.member, self.raid, 4, rng=random.Random(5))
+        fallback = simulate_clears(self.member, self.raid, 4, rng=random.Random(5), executor=_BrokenExecutor())
+        self.assertEqual(inline, fallback)
+
+        result = sweep_raid(self.member, self.raid, 4, simulated=True, executor=_BrokenExecutor())
+        self.assertEqual(RaidClear.objects.get(member=self.member).sweeps, result["wins"])
+
+
+# =============== MATCHMAKING ===============
+class AssignSeatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.world = _world(n_members=5, heroes_per=1)
+
+    def _request(self, member):
+        from core.services.matchmaking import JoinRequest
+
+        team = Team.objects.get(owner=member, is_active=True)
+        return JoinRequest(member=member, team=team, hero=team.slots.first().player_hero)
+
+    def test_fills_rooms_up_to_max_players(self):
+        from core.services.matchmaking import assign_seats
+
+        raid = self.world["raid"]
+        requests = [self._request(member) for member in self.world["members"]]
+        assigned, errors = assign_seats(raid, requests + requests[:1])
+        self.assertEqual(errors, {})
+        self.assertEqual(len(assigned), 5)
+
+        rooms = RaidRoom.objects.filter(raid=raid).order_by("created_at", "id")
+        self.assertEqual([room.participants.count() for room in rooms], [4, 1])
+        self.assertEqual([room.open_seats for room in rooms], [0, 3])
+
+        # Quien ya espera en una sala conserva su asiento
+        waiting = self.world["members"][4]
+        assigned, _ = assign_seats(raid, [self._request(waiting)])
+        self.assertEqual(assigned[waiting.id].pk, rooms[1].pk)
+        self.assertEqual(RaidParticipant.objects.filter(member=waiting).count(), 1)
+
+
+# =============== SALAS ===============
+class SweepRoomsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.world = _world(n_members=2)
+        self.raid = self.world["raid"]
+
+    def _room(self, age_seconds, member=None):
+        room = RaidRoom.objects.create(owner=self.world["members"][0], raid=self.raid, max_players=4,
+                                       open_seats=4)
+        if member is not None:
+            ph = Team.objects.get(owner=member).slots.first().player_hero
+            RaidParticipant.objects.create(room=room, member=member, hero=ph, is_ready=True)
+        RaidRoom.objects.filter(pk=room.pk).update(created_at=now() - timedelta(seconds=age_seconds))
+        return room
+
+    def test_advances_closes_and_starts_lobby_rooms(self):
+        from core.models import RaidDecisionLog
+        from core.services.raid_service import AUTO_READY_SECONDS, AUTO_START_SECONDS, sweep_rooms
+
+        waiting = self._room(AUTO_READY_SECONDS + 1, self.world["members"][0])
+        empty = self._room(AUTO_START_SECONDS + 1)
+        due = self._room(AUTO_START_SECONDS + 1, self.world["members"][1])
+
+        stats = sweep_rooms()
+        self.assertEqual((stats["ready"], stats["abandoned"], stats["started"]), (3, 1, 1))
+        states = dict(RaidRoom.objects.values_list("id", "state"))
+        self.assertEqual((states[waiting.id], states[empty.id], states[due.id]), ("ready", "finished", "in_progress"))
+
+        empty = RaidRoom.objects.get(pk=empty.pk)
+        self.assertTrue(empty.closed)
+        events = list(RaidDecisionLog.objects.filter(room=empty).order_by("seq"))
+        self.assertEqual([e.action_type for e in events], ["auto_ready", "finish"])
+        self.assertEqual([e.seq for e in events], [1, empty.log_seq])
+        self.assertEqual(events[-1].payload["winner"], "abandoned")
+
+        stats = sweep_rooms()
+        self.assertEqual((stats["ready"], stats["abandoned"], stats["started"]), (0, 0, 0))
+
+    def test_only_lobby_rooms_are_started(self):
+        from core.services.raid_service import start_lobby_room
+
+        room = self._room(0, self.world["members"][0])
+        started = start_lobby_room(room)
+        self.assertEqual(started.state, "in_progress")
+        self.assertIsNone(start_lobby_room(room))
+
+
+class RaidQueryPlanTests(TestCase):
+    """Las consultas calientes de raids (explain_raid_queries) usan índices sobre un dataset sembrado."""
+
+    def test_hot_queries_use_indexes(self):
+        from io import StringIO
+
+        from django.db import connection
+        from core.management.commands.explain_raid_queries import Command, _uses_index
+
+        command = Command(stdout=StringIO())
+        ctx = command._seed(2000)
+        for label, qs in command._queries(ctx).items():
+            with self.subTest(label):
+                plan = qs.explain()
+                self.assertTrue(_uses_index(plan, connection.vendor), plan)
+
+
+# =============== ARCHIVO DE SALAS ===============
+class RaidArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.world = _world()
+        self.member = self.world["members"][0]
+
+    def test_auto_battle_replay_round_trip(self):
+        from core.services.auto_battle import auto_battle_solo
+        from core.services.raid_archive import ARCHIVE_FORMAT_VERSION, load_history, load_replay
+        from core.services.replay import ReplayEngine, decode_replay, encode_replay
+
+        room, result = auto_battle_solo(self.member, self.world["raid"])
+        archive = RaidReplayArchive.objects.get(room=room)
+        self.assertEqual(archive.format_version, ARCHIVE_FORMAT_VERSION)
+
+        body = load_replay(room)
+        self.assertEqual(decode_replay(encode_replay(body)), body)
+        self.assertEqual(len(body["actions"]), archive.log_count)
+        final = ReplayEngine(body).final_state()
+        self.assertEqual(final["winner"], result.winner)
+
+        history = load_history(room)
+        self.assertEqual(len(history["logs"]), archive.log_count)
+
+    def test_live_and_archived_history_match(self):
+        from core.services.raid_archive import compact_finished_rooms, load_history, load_replay
+        from core.services.raid_service import (
+            get_current_turn, matchmaking_join, process_tick, start_structured_raid, submit_player_decision,
+        )
+
+        room = matchmaking_join(self.member, raid=self.world["raid"])
+        start_structured_raid(RaidRoom.objects.get(pk=room.pk))
+        for _ in range(400):
+            room = RaidRoom.objects.get(pk=room.pk)
+            if room.state != "in_progress":
+                break
+            turn = get_current_turn(room)
+            if turn and turn.actor_type == "hero" and turn.hero_instance and turn.hero_instance.current_hp > 0:
+                submit_player_decision(self.member, room)
+            else:
+                process_tick(room)
+        room = RaidRoom.objects.get(pk=room.pk)
+        self.assertEqual(room.state, "finished")
+
+        live_history = load_history(room)
+        live_replay = load_replay(room)
+        RaidRoom.objects.filter(pk=room.pk).update(updated_at=now() - timedelta(hours=1))
+        self.assertEqual(compact_finished_rooms(), 1)
+        self.assertFalse(RaidEnemyInstance.objects.filter(room=room).exists())
+
+        self.assertEqual(load_replay(room), live_replay)
+        archived_history = load_history(room)
+        self.assertEqual(archived_history["logs"], live_history["logs"])
+        self.assertEqual(archived_history["enemies"], live_history["enemies"])
@@ -2,37 +2,29 @@ from django.shortcuts import redirect, render
 from django.views.generic import TemplateView
 from django.utils.timezone import now as tz_now
 from core.forms import MemberLoginForm, CombatActionForm, UpgradeBuildingForm
-from core.services.combat_service import calculate_damage
+from core.middleware import get_member
+from core.services.combat_service import get_or_start_encounter, enemy_turn, hero_turn
 from core.models import (
     Member, PlayerResource, PlayerBuilding, PlayerHero,
-    Enemy, Ability, Alliance, AllianceBuilding, AllianceMember, BuildingLevelCost, ResourceType,
+    Enemy, Alliance, AllianceBuilding, AllianceMember, BuildingLevelCost, ResourceType,
     Banner
 )
-import random
 
 
 def get_member_or_redirect(request):
     """
     Obtiene el member de la sesión o retorna None si no existe.
     Si no existe, limpia la sesión.
+    Resuelto una sola vez por petición (ver core.middleware.get_member).
     """
-    member_id = request.session.get('member_id')
-    if not member_id:
-        return None
-
-    try:
-        return Member.objects.get(id=member_id)
-    except Member.DoesNotExist:
-        request.session.flush()
-        return None
+    return get_member(request)
 
 
 class MemberRequiredMixin:
     """Mixin que requiere que el usuario esté autenticado como member"""
 
     def dispatch(self, request, *args, **kwargs):
-        member = get_member_or_redirect(request)
-        if not member:
+        if not request.member:
             return redirect("index")
         return super().dispatch(request, *args, **kwargs)
 
@@ -49,13 +41,10 @@ class IndexView(TemplateView):
     def post(self, request):
         form = MemberLoginForm(request.POST)
         if form.is_valid():
-            phone = form.cleaned_data['phone']
-            try:
-                member = Member.objects.get(phone=phone)
-                request.session['member_id'] = member.id
-                return redirect("userprofile")
-            except Member.DoesNotExist:
-                form.add_error(None, "Teléfono no registrado")
+            # El form ya resolvió y verificó el member (una consulta + un hash)
+            member = form.cleaned_data['member']
+            request.session['member_id'] = member.id
+            return redirect("userprofile")
 
         return render(request, self.template_name, {'form': form})
 
@@ -65,14 +54,13 @@ class DashboardView(TemplateView):
     template_name = "dashboard.html"
 
     def dispatch(self, request, *args, **kwargs):
-        if not request.session.get('member_id'):
+        if not request.member:
             return redirect("index")
         return super().dispatch(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        member_id = self.request.session.get('member_id')
-        member = Member.objects.get(id=member_id)
+        member = self.request.member
 
         context['member'] = member
         context['resources'] = PlayerResource.objects.filter(member=member)
@@ -94,13 +82,13 @@ class CityView(TemplateView):
     template_name = "city.html"
 
     def dispatch(self, request, *args, **kwargs):
-        if not request.session.get('member_id'):
+        if not request.member:
             return redirect("index")
         return super().dispatch(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        member = Member.objects.get(id=self.request.session["member_id"])
+        member = self.request.member
 
         membership = AllianceMember.objects.filter(member=member).first()
         if membership:
@@ -132,7 +120,7 @@ class CampView(MemberRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        member = get_member_or_redirect(self.request)
+        member = self.request.member
 
         heroes_member = PlayerHero.objects.filter(member=member).select_related('hero')
         player_buildings = (
@@ -198,7 +186,7 @@ class CampView(MemberRequiredMixin, TemplateView):
         return context
 
     def post(self, request, *args, **kwargs):
-        member = get_member_or_redirect(self.request)
+        member = self.request.member
         if not member:
             return redirect("index")
         form = UpgradeBuildingForm(request.POST, member=member)
@@ -209,58 +197,35 @@ class CampView(MemberRequiredMixin, TemplateView):
 
 # COMBATE
 class CombatView(TemplateView):
+    """Combate en solitario. El estado vive en SoloEncounter (servidor), no en la sesión."""
     template_name = "combat.html"
 
     def dispatch(self, request, *args, **kwargs):
-        if not request.session.get("member_id"):
+        member = request.member
+        if not member:
             return redirect("index")
 
-        member = Member.objects.get(id=request.session["member_id"])
-        hero = PlayerHero.objects.filter(member=member).first()
+        hero = PlayerHero.objects.filter(member=member).select_related("hero").first()
 
         if not hero:
             return redirect("userprofile")
 
-        if "combat" not in request.session:
-            enemy = Enemy.objects.order_by("?").first()
-            hero_hp = hero.current_hp
-            enemy_hp = enemy.base_hp
-            turn = "hero" if hero.get_speed() >= enemy.speed else "enemy"
-            log = [f"¡Combate iniciado contra {enemy.name}!"]
-
-            request.session["combat"] = {
-                "enemy_id": enemy.id,
-                "hero_hp": hero_hp,
-                "enemy_hp": enemy_hp,
-                "turn": turn,
-                "log": log
-            }
-
-        state = request.session["combat"]
-        if state["turn"] == "enemy":
-            enemy = Enemy.objects.get(id=state["enemy_id"])
-            ability = random.choice(enemy.abilities.all())
-            dmg = calculate_damage(enemy.attack, ability.power, hero.get_defense())
-            state["hero_hp"] -= dmg
-            state["log"].append(f"{enemy.name} usa {ability.name} y hace {dmg} de daño a {hero.hero.name}.")
-
-            if state["hero_hp"] <= 0:
-                state["log"].append("¡Perdiste!")
-                request.session.pop("combat")
-            else:
-                state["turn"] = "hero"
-                request.session["combat"] = state
+        encounter = get_or_start_encounter(member, hero)
+        if not encounter:
+            return redirect("userprofile")
 
+        if encounter.turn == "enemy":
+            enemy_turn(encounter)
             return redirect("combat")
 
+        self.encounter = encounter
         return super().dispatch(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        member = Member.objects.get(id=self.request.session["member_id"])
-        hero = PlayerHero.objects.filter(member=member).first()
-        state = self.request.session["combat"]
-        enemy = Enemy.objects.get(id=state["enemy_id"])
+        member = self.request.member
+        encounter = self.encounter
+        hero = encounter.player_hero
         resources = PlayerResource.objects.filter(member=member)
 
         form = CombatActionForm(hero=hero)
@@ -268,41 +233,22 @@ class CombatView(TemplateView):
         context.update({
             "member": member,
             "hero": hero,
-            "enemy": enemy,
+            "enemy": encounter.enemy,
             "form": form,
-            "log": state["log"],
-            "hero_hp": state["hero_hp"],
-            "enemy_hp": state["enemy_hp"],
-            "turn": state["turn"],
+            "log": encounter.log,
+            "hero_hp": encounter.hero_hp,
+            "enemy_hp": encounter.enemy_hp,
+            "turn": encounter.turn,
             "resources": resources,
         })
         return context
 
     def post(self, request, *args, **kwargs):
-        member = Member.objects.get(id=request.session["member_id"])
-        hero = PlayerHero.objects.filter(member=member).first()
-        state = request.session.get("combat")
-
-        if not hero or not state:
-            return redirect("combat")
-
-        enemy = Enemy.objects.get(id=state["enemy_id"])
-        form = CombatActionForm(request.POST, hero=hero)
+        encounter = self.encounter
+        form = CombatActionForm(request.POST, hero=encounter.player_hero)
 
         if form.is_valid():
-            ability_id = int(form.cleaned_data["ability_id"])
-            ability = Ability.objects.get(id=ability_id)
-
-            dmg = calculate_damage(hero.get_attack(), ability.power, enemy.defense)
-            state["enemy_hp"] -= dmg
-            state["log"].append(f"{hero.hero.name} usa {ability.name} y hace {dmg} de daño a {enemy.name}.")
-
-            if state["enemy_hp"] <= 0:
-                state["log"].append("¡Ganaste!")
-                request.session.pop("combat")
-            else:
-                state["turn"] = "enemy"
-                request.session["combat"] = state
+            hero_turn(encounter, form.cleaned_data["ability"])
 
         return redirect("combat")
 
@@ -319,26 +265,29 @@ class RaidRoomPage(TemplateView):
     template_name = "raid_room.html"
 
     def dispatch(self, request, *args, **kwargs):
-        if not request.session.get('member_id'):
+        if not request.member:
             return redirect("index")
         return super().dispatch(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        member = Member.objects.get(id=self.request.session.get('member_id'))
+        member = self.request.member
 
         # Heroes del jugador (para elegir equipo/líder)
-        heroes_member = PlayerHero.objects.filter(member=member).select_related('hero').order_by('id')
+        from core.services.hero_hp import hp_and_max
+        heroes_member = list(PlayerHero.objects.filter(member=member).select_related('hero').order_by('id'))
+        PlayerHero.prime_level_caps(heroes_member)
         ctx['my_heroes_data'] = [
             {
                 "id": ph.id,
                 "name": ph.hero.name,
-                "hp": ph.current_hp,
-                "max_hp": ph.s_hp(),
+                "hp": hp,
+                "max_hp": max_hp,
                 "base_hero_id": ph.hero_id,
                 "image": (ph.hero.image.url if getattr(ph.hero, 'image', None) else None),
             }
             for ph in heroes_member
+            for hp, max_hp in [hp_and_max(ph)]
         ]
 
         # Usamos Enemy como 'tipo de raid' seleccionable en modo Solo
@@ -421,7 +370,7 @@ class MatchmakingView(MemberRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        member = get_member_or_redirect(self.request)
+        member = self.request.member
 
         # Obtener equipo activo del jugador
         from core.models import Team, Raid
@@ -441,7 +390,7 @@ class MatchmakingRoomView(MemberRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        member = get_member_or_redirect(self.request)
+        member = self.request.member
         room_id = kwargs.get('room_id')
 
         try:
@@ -461,7 +410,7 @@ class RaidRoomDetailView(MemberRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        member = get_member_or_redirect(self.request)
+        member = self.request.member
         room_id = kwargs.get('room_id')
 
         try:
@@ -486,14 +435,13 @@ from django.db import models
 @require_POST
 def api_pull(request, banner_id):
     """Tirada x1: devuelve JSON con el resultado."""
-    member_id = request.session.get('member_id')
-    if not member_id:
+    member = request.member
+    if not member:
         return JsonResponse({"ok": False, "error": "unauthorized"}, status=401)
 
     try:
-        member = Member.objects.get(pk=member_id)
         banner = Banner.objects.get(pk=banner_id, is_active=True)
-    except (Member.DoesNotExist, Banner.DoesNotExist):
+    except Banner.DoesNotExist:
         return JsonResponse({"ok": False, "error": "not_found"}, status=404)
 
     try:
@@ -508,14 +456,13 @@ def api_pull(request, banner_id):
 @require_POST
 def api_pull_multi(request, banner_id):
     """Tirada múltiple x10 (o usa 'count' si lo envías en el form). Responde JSON con array de resultados."""
-    member_id = request.session.get('member_id')
-    if not member_id:
+    member = request.member
+    if not member:
         return JsonResponse({"ok": False, "error": "unauthorized"}, status=401)
 
     try:
-        member = Member.objects.get(pk=member_id)
         banner = Banner.objects.get(pk=banner_id, is_active=True)
-    except (Member.DoesNotExist, Banner.DoesNotExist):
+    except Banner.DoesNotExist:
         return JsonResponse({"ok": False, "error": "not_found"}, status=404)
 
     # si llega 'count' del form, lo usamos; por defecto 10
@@ -544,12 +491,11 @@ def logout_view(request):
 @csrf_exempt
 @require_POST
 def api_raid_matchmaking_join(request):
-    member_id = request.session.get('member_id')
-    if not member_id:
+    member = request.member
+    if not member:
         return JsonResponse({"ok": False, "error": "unauthorized"}, status=401)
 
-    from core.models import Member, Raid, Team
-    member = Member.objects.get(pk=member_id)
+    from core.models import Raid, Team
 
     raid_id = request.POST.get('raid_id')
     team_id = request.POST.get('team_id')
@@ -582,7 +528,7 @@ def api_raid_start(request, room_id):
     """Iniciar raid manualmente (solo el owner puede hacerlo)"""
     try:
         from core.models import RaidRoom
-        member = get_member_or_redirect(request)
+        member = request.member
         if not member:
             return JsonResponse({"ok": False, "error": "No autenticado"}, status=401)
         room = RaidRoom.objects.get(pk=room_id)
@@ -595,122 +541,23 @@ def api_raid_start(request, room_id):
         if room.state not in ["ready", "waiting"]:
             return JsonResponse({"ok": False, "error": "La sala no está lista para iniciar"}, status=400)
 
-        # Iniciar la raid
-        if room.raid:
-            from core.services.raid_service import start_structured_raid
-            start_structured_raid(room)
-        else:
-            from core.services.raid_service import start_raid
-            from core.models import Enemy
-            enemy = Enemy.objects.order_by("?").first()
-            if enemy:
-                start_raid(room, enemy=enemy)
+        # Iniciar la raid (None si otro proceso ya la ha arrancado o la está llenando)
+        from core.services.raid_service import start_lobby_room
+        if start_lobby_room(room) is None:
+            return JsonResponse({"ok": False, "error": "La sala no está lista para iniciar"}, status=400)
 
         return JsonResponse({"ok": True})
-    except (Member.DoesNotExist, RaidRoom.DoesNotExist):
+    except RaidRoom.DoesNotExist:
         return JsonResponse({"ok": False, "error": "Sala no encontrada"}, status=404)
     except Exception as e:
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
 
 
-def _serialize_room(room):
+def _serialize_room(room, after_seq=None):
     # tick on read (asíncrono simple)
     process_tick(room)
-    from core.models import RaidParticipant, RaidEnemyInstance, RaidTurn, RaidDecisionLog, Team
-
-    # Obtener participantes con sus equipos completos
-    parts = list(room.participants.select_related('member', 'hero__hero').all())
-    enemies = list(room.enemies.select_related('enemy').all())
-    turn = room.turns.filter(resolved=False).order_by('index').first()
-    logs = list(room.decision_logs.order_by('-created_at')[:30])
-
-    # Serializar participantes con equipos completos
-    participants_data = []
-    for p in parts:
-        # Obtener equipo completo del jugador
-        team = Team.objects.filter(owner=p.member, is_active=True).prefetch_related('slots__player_hero__hero').first()
-        team_heroes = []
-
-        if team:
-            for slot in team.slots.all():
-                ph = slot.player_hero
-                team_heroes.append({
-                    "id": ph.id,
-                    "name": ph.hero.name,
-                    "image": ph.hero.image.url if ph.hero.image else None,
-                    "current_hp": ph.current_hp,
-                    "max_hp": ph.s_hp(),
-                    "is_alive": ph.current_hp > 0,
-                    "position": slot.position,
-                })
-
-        participants_data.append({
-            "member_id": p.member_id,
-            "member_name": p.member.name,
-            "is_alive": p.is_alive,
-            "is_ready": p.is_ready,
-            "player_color": p.player_color,
-            "team_heroes": team_heroes,
-            # Héroe principal (para compatibilidad)
-            "hero": p.hero.hero.name if p.hero else None,
-            "hero_hp": p.hero.current_hp if p.hero else None,
-        })
-
-    # Información de la raid y oleada actual
-    raid_info = None
-    if room.raid:
-        current_wave = None
-        try:
-            current_wave = room.raid.waves.get(wave_number=room.wave_index + 1)
-        except:
-            pass
-
-        raid_info = {
-            "id": room.raid.id,
-            "name": room.raid.name,
-            "difficulty": room.raid.difficulty,
-            "current_wave": room.wave_index + 1 if current_wave else None,
-            "wave_name": current_wave.name if current_wave else None,
-            "total_waves": room.raid.waves.count(),
-        }
-
-    return {
-        "room_id": room.id,
-        "name": room.name,
-        "state": room.state,
-        "max_players": room.max_players,
-        "raid": raid_info,
-        "participants": participants_data,
-        "enemies": [
-            {
-                "id": e.id,
-                "name": e.enemy.name,
-                "image": e.enemy.image.url if e.enemy.image else None,
-                "hp": e.current_hp,
-                "max_hp": e.max_hp,
-                "alive": e.is_alive,
-                "speed": e.speed,
-            } for e in enemies
-        ],
-        "turn": None if not turn else {
-            "index": turn.index,
-            "actor_type": turn.actor_type,
-            "member_id": turn.participant.member_id if turn.participant_id else None,
-            "enemy_id": turn.enemy_instance_id,
-            "hero_id": turn.hero_instance.id if turn.hero_instance else None,
-            "hero_name": turn.hero_instance.hero.name if turn.hero_instance else (turn.participant.hero.hero.name if turn.participant and turn.participant.hero else None),
-            "hero_speed": turn.hero_instance.s_speed() if turn.hero_instance else (turn.participant.hero.s_speed() if turn.participant and turn.participant.hero else None),
-        },
-        "logs": [
-            {
-                "ts": l.created_at.isoformat(),
-                "action": l.action_type,
-                "actor": l.actor,
-                "payload": l.payload,
-                "member_id": l.participant.member_id if l.participant_id else None,
-            } for l in logs[::-1]
-        ]
-    }
+    from core.services.spectator import serialize_room_state
+    return serialize_room_state(room, after_seq=after_seq)
 
 
 from django.views.decorators.http import require_GET
@@ -721,19 +568,80 @@ def api_raid_state(request, room_id):
         room = RaidRoom.objects.get(pk=room_id)
     except RaidRoom.DoesNotExist:
         return JsonResponse({"ok": False, "error": "not_found"}, status=404)
-    data = _serialize_room(room)
+    try:
+        after_seq = int(request.GET['after_seq']) if request.GET.get('after_seq') else None
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "after_seq inválido"}, status=400)
+    data = _serialize_room(room, after_seq=after_seq)
     return JsonResponse({"ok": True, "state": data})
 
 
+@require_GET
+def api_raid_spectate(request, room_id):
+    """
+    Estado de la sala en solo lectura para espectadores: no tickea la sala y sirve un snapshot
+    compartido por versión. Con ?since=<version> responde unchanged si no ha cambiado nada.
+    """
+    from core.services.spectator import spectator_snapshot
+    result = spectator_snapshot(room_id)
+    if result is None:
+        return JsonResponse({"ok": False, "error": "not_found"}, status=404)
+    version, snapshot = result
+    if request.GET.get('since') == str(version):
+        return JsonResponse({"ok": True, "version": version, "unchanged": True})
+    return JsonResponse({"ok": True, "version": version, "state": snapshot})
+
+
+@require_GET
+def api_raid_history(request, room_id):
+    """Historial completo de una sala terminada (del archivo comprimido si ya está compactada)."""
+    from core.models import RaidRoom
+    from core.services.raid_archive import load_history
+    try:
+        room = RaidRoom.objects.get(pk=room_id)
+    except RaidRoom.DoesNotExist:
+        return JsonResponse({"ok": False, "error": "not_found"}, status=404)
+    if room.state != "finished":
+        return JsonResponse({"ok": False, "error": "La raid aún no ha terminado"}, status=400)
+    return JsonResponse({"ok": True, "history": load_history(room)})
+
+
+@require_GET
+def api_raid_replay(request, room_id):
+    """
+    Estado reconstruido de la sala en el evento ?seq=N (por defecto el final), desde su replay.
+    Con ?actions=1 devuelve además las acciones para reproducirlas en el cliente.
+    """
+    from core.models import RaidRoom
+    from core.services.raid_archive import load_replay
+    from core.services.replay import ReplayEngine
+    try:
+        room = RaidRoom.objects.get(pk=room_id)
+    except RaidRoom.DoesNotExist:
+        return JsonResponse({"ok": False, "error": "not_found"}, status=404)
+    try:
+        seq = int(request.GET['seq']) if request.GET.get('seq') else None
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "seq inválido"}, status=400)
+
+    body = load_replay(room)
+    engine = ReplayEngine(body)
+    state = engine.final_state() if seq is None else engine.state_at(seq)
+    data = {"ok": True, "room": body["room"], "seed": body["seed"], "state": state,
+            "total_actions": len(engine)}
+    if request.GET.get('actions'):
+        data["actions"] = body["actions"]
+    return JsonResponse(data)
+
+
 @csrf_exempt
 @require_POST
 def api_raid_solo_start(request):
-    member_id = request.session.get('member_id')
-    if not member_id:
+    member = request.member
+    if not member:
         return JsonResponse({"ok": False, "error": "unauthorized"}, status=401)
 
-    from core.models import Member, Raid, Team, Enemy
-    member = Member.objects.get(pk=member_id)
+    from core.models import Raid, Team, Enemy
 
     raid_id = request.POST.get('raid_id')
     team_id = request.POST.get('team_id')
@@ -746,6 +654,14 @@ def api_raid_solo_start(request):
             team = None
             if team_id:
                 team = Team.objects.get(pk=int(team_id), owner=member)
+            if request.POST.get('auto') in ('1', 'true'):
+                # Auto-batalla: la raid se resuelve entera en esta petición
+                from core.services.auto_battle import auto_battle_solo
+                room, result = auto_battle_solo(member, raid, team=team)
+                return JsonResponse({"ok": True, "room_id": room.id, "winner": result.winner,
+                                     "waves_cleared": result.waves_cleared,
+                                     "hero_hp": {str(k): v for k, v in result.hero_hp.items()},
+                                     "actions": len(result.actions)})
             room = start_solo_raid(member, raid=raid, team=team)
         elif enemy_id:
             # Raid legacy con enemigo simple
@@ -762,23 +678,89 @@ def api_raid_solo_start(request):
         return JsonResponse({"ok": False, "error": str(e)}, status=400)
 
 
+@csrf_exempt
+@require_POST
+def api_raid_sweep(request):
+    """
+    Barrido de una raid ya completada: raid_id, times (1-100) y simulated=1 para simular cada
+    victoria en vez de conceder el resultado esperado.
+    """
+    member = request.member
+    if not member:
+        return JsonResponse({"ok": False, "error": "unauthorized"}, status=401)
+    from core.models import Raid
+    from core.services.raid_rewards import sweep_raid
+    try:
+        raid = Raid.objects.get(pk=int(request.POST.get('raid_id', '')))
+        times = int(request.POST.get('times', '1'))
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "invalid_params"}, status=400)
+    except Raid.DoesNotExist:
+        return JsonResponse({"ok": False, "error": "resource_not_found"}, status=404)
+    try:
+        result = sweep_raid(member, raid, times, simulated=request.POST.get('simulated') in ('1', 'true'))
+        return JsonResponse({"ok": True, **result})
+    except RaidError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+
+
 @csrf_exempt
 @require_POST
 def api_raid_decision(request):
-    member_id = request.session.get('member_id')
-    if not member_id:
+    member = request.member
+    if not member:
         return JsonResponse({"ok": False, "error": "unauthorized"}, status=401)
-    from core.models import Member, RaidRoom
-    member = Member.objects.get(pk=member_id)
+    from core.models import RaidRoom
     room_id = request.POST.get('room_id')
     try:
         room = RaidRoom.objects.get(pk=room_id)
     except RaidRoom.DoesNotExist:
         return JsonResponse({"ok": False, "error": "not_found"}, status=404)
     target_enemy_id = request.POST.get('target_enemy_id')
+    ability_id = request.POST.get('ability_id')
     try:
-        submit_player_decision(member, room, ability_id=None, target_enemy_id=int(target_enemy_id) if target_enemy_id else None)
+        submit_player_decision(member, room,
+                               ability_id=int(ability_id) if ability_id else None,
+                               target_enemy_id=int(target_enemy_id) if target_enemy_id else None)
         return JsonResponse({"ok": True})
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "invalid_params"}, status=400)
+    except RaidError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+
+
+@csrf_exempt
+@require_POST
+def api_raid_decision_batch(request):
+    """
+    Encola las acciones de todos los héroes del jugador para el ciclo de turnos actual.
+    Cuerpo JSON: {"room_id": 1, "actions": [{"hero_id": 5, "target_enemy_id": 9}, ...]}
+    (una acción sin hero_id vale para el resto de héroes).
+    """
+    member = request.member
+    if not member:
+        return JsonResponse({"ok": False, "error": "unauthorized"}, status=401)
+    import json
+    from core.models import RaidRoom
+    from core.services.raid_service import queue_player_decisions
+    try:
+        data = json.loads(request.body or b"{}")
+        actions = [
+            {
+                "hero_id": int(a["hero_id"]) if a.get("hero_id") is not None else None,
+                "target_enemy_id": int(a["target_enemy_id"]) if a.get("target_enemy_id") else None,
+                "ability_id": int(a["ability_id"]) if a.get("ability_id") else None,
+            } for a in data.get("actions", [])
+        ]
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({"ok": False, "error": "invalid_body"}, status=400)
+    try:
+        room = RaidRoom.objects.get(pk=data.get("room_id"))
+    except (RaidRoom.DoesNotExist, ValueError, TypeError):
+        return JsonResponse({"ok": False, "error": "not_found"}, status=404)
+    try:
+        result = queue_player_decisions(member, room, actions)
+        return JsonResponse({"ok": True, **result})
     except RaidError as e:
         return JsonResponse({"ok": False, "error": str(e)}, status=400)
 
@@ -787,11 +769,10 @@ def api_raid_decision(request):
 @require_POST
 def api_hero_heal(request):
     """Cura un PlayerHero del miembro autenticado al máximo HP escalado (s_hp)."""
-    member_id = request.session.get('member_id')
-    if not member_id:
+    member = request.member
+    if not member:
         return JsonResponse({"ok": False, "error": "unauthorized"}, status=401)
-    from core.models import Member, PlayerHero
-    member = Member.objects.get(pk=member_id)
+    from core.models import PlayerHero
     hero_id = request.POST.get('player_hero_id')
     if not hero_id:
         return JsonResponse({"ok": False, "error": "missing_player_hero_id"}, status=400)
@@ -799,36 +780,26 @@ def api_hero_heal(request):
     if not ph:
         return JsonResponse({"ok": False, "error": "not_found"}, status=404)
     max_hp = ph.s_hp()
-    ph.current_hp = max_hp
-    ph.save(update_fields=["current_hp"])
+    ph.current_hp, ph.hp_updated_at = max_hp, tz_now()
+    ph.save(update_fields=["current_hp", "hp_updated_at"])
     return JsonResponse({"ok": True, "player_hero_id": ph.id, "current_hp": ph.current_hp, "max_hp": max_hp})
 
 
 @csrf_exempt
 @require_POST
 def api_hero_heal_all(request):
-    """Cura todos los PlayerHero del miembro autenticado al máximo HP."""
-    member_id = request.session.get('member_id')
-    if not member_id:
+    """Cura todos los PlayerHero del miembro autenticado al máximo HP (un único UPDATE)."""
+    member = request.member
+    if not member:
         return JsonResponse({"ok": False, "error": "unauthorized"}, status=401)
 
     try:
-        from core.models import Member, PlayerHero
-        member = Member.objects.get(pk=member_id)
-        heroes = PlayerHero.objects.filter(member=member).select_related('hero')
-
-        healed_count = 0
-        for hero in heroes:
-            max_hp = hero.s_hp()
-            if hero.current_hp < max_hp:
-                hero.current_hp = max_hp
-                hero.save(update_fields=["current_hp"])
-                healed_count += 1
-
+        from core.services.hero_hp import heal_all
+        healed_count, total = heal_all(member)
         return JsonResponse({
             "ok": True,
             "healed_count": healed_count,
-            "total_heroes": heroes.count()
+            "total_heroes": total
         })
     except Exception as e:
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
@@ -840,23 +811,25 @@ from core.models import Team, TeamSlot
 
 @require_GET
 def api_team_get(request):
-    member_id = request.session.get('member_id')
-    if not member_id:
+    member = request.member
+    if not member:
         return JsonResponse({"ok": False, "error": "unauthorized"}, status=401)
-    member = Member.objects.get(pk=member_id)
     team = Team.objects.filter(owner=member, is_active=True).first()
+    from core.services.hero_hp import hp_and_max
 
     def ph_info(ph: PlayerHero):
+        hp, max_hp = hp_and_max(ph)
         return {
             "id": ph.id,
             "name": ph.hero.name,
-            "hp": ph.current_hp,
-            "max_hp": ph.s_hp(),
+            "hp": hp,
+            "max_hp": max_hp,
             "base_hero_id": ph.hero_id,
             "image": (ph.hero.image.url if getattr(ph.hero, 'image', None) else None),
         }
 
-    heroes_qs = PlayerHero.objects.filter(member=member).select_related('hero').order_by('id')
+    heroes_qs = list(PlayerHero.objects.filter(member=member).select_related('hero').order_by('id'))
+    PlayerHero.prime_level_caps(heroes_qs)
     heroes = [ph_info(ph) for ph in heroes_qs]
 
     team_payload = None
@@ -873,10 +846,9 @@ def api_team_get(request):
 @csrf_exempt
 @require_POST
 def api_team_create(request):
-    member_id = request.session.get('member_id')
-    if not member_id:
+    member = request.member
+    if not member:
         return JsonResponse({"ok": False, "error": "unauthorized"}, status=401)
-    member = Member.objects.get(pk=member_id)
     team = Team.objects.filter(owner=member, is_active=True).first()
     if not team:
         team = Team.objects.create(owner=member, name=(request.POST.get('name') or 'Equipo'), is_active=True)
@@ -886,10 +858,9 @@ def api_team_create(request):
 @csrf_exempt
 @require_POST
 def api_team_add(request):
-    member_id = request.session.get('member_id')
-    if not member_id:
+    member = request.member
+    if not member:
         return JsonResponse({"ok": False, "error": "unauthorized"}, status=401)
-    member = Member.objects.get(pk=member_id)
     ph_id = request.POST.get('player_hero_id')
     if not ph_id:
         return JsonResponse({"ok": False, "error": "missing_player_hero_id"}, status=400)
@@ -912,10 +883,9 @@ def api_team_add(request):
 @csrf_exempt
 @require_POST
 def api_team_remove(request):
-    member_id = request.session.get('member_id')
-    if not member_id:
+    member = request.member
+    if not member:
         return JsonResponse({"ok": False, "error": "unauthorized"}, status=401)
-    member = Member.objects.get(pk=member_id)
     ph_id = request.POST.get('player_hero_id')
     team = Team.objects.filter(owner=member, is_active=True).first()
     if not team:
@@ -950,10 +920,14 @@ def api_raids_available(request):
 def api_raid_rooms_available(request):
     """Obtener salas de raid disponibles para matchmaking"""
     from core.models import RaidRoom
-    rooms = RaidRoom.objects.filter(state="waiting").select_related('raid', 'owner').order_by('created_at')
+    from core.services.raid_service import LOBBY_STATES
+    rooms = (RaidRoom.objects
+             .filter(state__in=LOBBY_STATES, closed=False)
+             .select_related('raid', 'owner')
+             .order_by('created_at'))
     rooms_data = []
     for room in rooms:
-        current_players = room.participants.count()
+        current_players = room.max_players - room.open_seats
         rooms_data.append({
             "id": room.id,
             "name": room.name,
@@ -965,7 +939,7 @@ def api_raid_rooms_available(request):
             "owner": room.owner.name if room.owner else "Sistema",
             "current_players": current_players,
             "max_players": room.max_players,
-            "can_join": current_players < room.max_players,
+            "can_join": room.open_seats > 0,
         })
     return JsonResponse({"ok": True, "rooms": rooms_data})
 
@@ -974,29 +948,46 @@ def api_raid_rooms_available(request):
 @require_POST
 def api_team_update(request):
     """Actualizar equipo completo"""
-    member_id = request.session.get('member_id')
-    if not member_id:
+    member = request.member
+    if not member:
         return JsonResponse({"ok": False, "error": "unauthorized"}, status=401)
 
-    member = Member.objects.get(pk=member_id)
-    team = Team.objects.filter(owner=member, is_active=True).first()
-
-    if not team:
+    if not Team.objects.filter(owner=member, is_active=True).exists():
         return JsonResponse({"ok": False, "error": "no_active_team"}, status=404)
 
-    # Limpiar slots existentes
-    team.slots.all().delete()
-
-    # Añadir nuevos héroes
     hero_ids = request.POST.getlist('hero_ids[]')
     if not hero_ids:
         hero_ids = [request.POST.get('hero_ids')] if request.POST.get('hero_ids') else []
 
-    for i, hero_id in enumerate(hero_ids[:4]):  # Máximo 4 héroes
-        try:
-            player_hero = PlayerHero.objects.get(pk=int(hero_id), member=member)
-            TeamSlot.objects.create(team=team, player_hero=player_hero, position=i)
-        except (PlayerHero.DoesNotExist, ValueError):
-            continue
+    from core.services.teams import TeamError, set_lineup
+    try:
+        result = set_lineup(member, hero_ids)
+    except TeamError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+    return JsonResponse({"ok": True, "team_id": result["team_id"]})
 
-    return JsonResponse({"ok": True, "team_id": team.id})
+
+@csrf_exempt
+@require_POST
+def api_team_edit(request):
+    """
+    Fija la alineación completa del equipo activo (lo crea si no existe).
+    Cuerpo JSON: {"player_hero_ids": [5, 9, 12]} (en orden de posición, máximo 4).
+    Se valida entera antes de tocar nada y se aplica solo la diferencia con el equipo actual.
+    """
+    member = request.member
+    if not member:
+        return JsonResponse({"ok": False, "error": "unauthorized"}, status=401)
+    import json
+    from core.services.teams import TeamError, set_lineup
+    try:
+        hero_ids = json.loads(request.body or b"{}").get("player_hero_ids")
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({"ok": False, "error": "invalid_body"}, status=400)
+    # Solo una lista de enteros: una cadena o un dict se iterarían como ids
+    if not isinstance(hero_ids, list) or not all(type(pk) is int for pk in hero_ids):
+        return JsonResponse({"ok": False, "error": "invalid_body"}, status=400)
+    try:
+        return JsonResponse({"ok": True, **set_lineup(member, hero_ids)})
+    except TeamError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)